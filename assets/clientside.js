@@ -0,0 +1,171 @@
+//   ------------------------------------------------------------------------------------------------------------
+//   ---     clientside mode of cgd-dashboard.py (CLIENTSIDE_MODE)
+//   ---     the per-day rollup shipped in the clientside_rollup store answers the slider in the browser;
+//   ---     a range covers every day it touches. Distinct readers are the union of the days' reader bitsets,
+//   ---     distinct notebooks the HyperLogLog estimate of the days' registers merged
+//   ------------------------------------------------------------------------------------------------------------
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    cgd: {
+        show_info: function(date_slider_value, rollup) {
+            if (!date_slider_value || !rollup) {
+                throw window.dash_clientside.PreventUpdate;
+            }
+
+            var start = date_slider_value[0];
+            var end = date_slider_value[1];
+
+            var totalReadings = 0;
+            var totalUnsuccessfulReadings = 0;
+            var readers = null;
+            var notebooks = null;
+            var selected = [];
+
+            for (var i = 0; i < rollup.day_starts.length; i++) {
+                if (rollup.day_starts[i] > end || rollup.day_ends[i] <= start) {
+                    continue;
+                }
+
+                selected.push(i);
+                totalReadings += rollup.nr_readings[i];
+                totalUnsuccessfulReadings += rollup.nr_unsuccessful_readings[i];
+                readers = merge(readers, decode(rollup.readers[i]), function(a, b) { return a | b; });
+                notebooks = merge(notebooks, decode(rollup.notebooks[i]), Math.max);
+            }
+
+            // day, week or month bars, as get_adaptive_readings picks them on the server
+            var buckets = rollup.days;
+            if (selected.length > 0) {
+                var nrDays = Math.round((rollup.day_starts[selected[selected.length - 1]] - rollup.day_starts[selected[0]]) / 86400) + 1;
+
+                if (nrDays > 7 * rollup.max_bars) {
+                    buckets = rollup.months;
+                } else if (nrDays > rollup.max_bars) {
+                    buckets = rollup.weeks;
+                }
+            }
+
+            var x = [];
+            var nrReadings = [];
+            var nrUnsuccessfulReadings = [];
+            var nrNotebookReaders = [];
+
+            selected.forEach(function(i) {
+                if (x.length === 0 || x[x.length - 1] !== buckets[i]) {
+                    x.push(buckets[i]);
+                    nrReadings.push(0);
+                    nrUnsuccessfulReadings.push(0);
+                    nrNotebookReaders.push(0);
+                }
+
+                var last = x.length - 1;
+                nrReadings[last] += rollup.nr_readings[i];
+                nrUnsuccessfulReadings[last] += rollup.nr_unsuccessful_readings[i];
+                nrNotebookReaders[last] += rollup.nr_notebook_readers[i];
+            });
+
+            // bars without errors get no error bar, as on the server
+            var averageReadings = x.map(function(_, b) { return round(nrReadings[b] / nrNotebookReaders[b], 2); });
+            var averageErrors = x.map(function(_, b) {
+                return nrUnsuccessfulReadings[b] > 0 ? round(nrUnsuccessfulReadings[b] / nrNotebookReaders[b], 2) : null;
+            });
+
+            var fig = window.dash_clientside.no_update;
+
+            if (totalReadings > 0) {
+                fig = JSON.parse(JSON.stringify(rollup.figure));
+                fig.data[0].x = x;
+                fig.data[0].y = averageReadings;
+                fig.data[0].text = averageReadings;
+                fig.data[1].x = x;
+                fig.data[1].y = averageErrors;
+                fig.data[1].text = averageErrors;
+            }
+
+            var percentReadingErrors = '0%';
+            if (totalReadings > 0) {
+                percentReadingErrors = round((totalUnsuccessfulReadings / totalReadings) * 100, 1).toFixed(1) + '%';
+            }
+
+            return [fig,
+                    fill(rollup.kpis.nr_notebook_readers, readers ? countBits(readers) : 0),
+                    fill(rollup.kpis.total_readings, totalReadings),
+                    fill(rollup.kpis.percent_reading_errors, percentReadingErrors),
+                    fill(rollup.kpis.unique_notebooks, notebooks ? estimate(notebooks) : 0)];
+
+            // the bytes of a base64 text
+            function decode(text) {
+                var binary = atob(text);
+                var bytes = new Uint8Array(binary.length);
+
+                for (var j = 0; j < binary.length; j++) {
+                    bytes[j] = binary.charCodeAt(j);
+                }
+
+                return bytes;
+            }
+
+            // byte by byte into merged, the first day's bytes as they are
+            function merge(merged, bytes, combine) {
+                if (merged === null) {
+                    return bytes;
+                }
+
+                for (var j = 0; j < bytes.length; j++) {
+                    merged[j] = combine(merged[j], bytes[j]);
+                }
+
+                return merged;
+            }
+
+            function countBits(bytes) {
+                var count = 0;
+
+                for (var j = 0; j < bytes.length; j++) {
+                    for (var bits = bytes[j]; bits; bits &= bits - 1) {
+                        count++;
+                    }
+                }
+
+                return count;
+            }
+
+            // as estimate_registers in cgd/sketch.py: linear counting while registers are empty
+            function estimate(registers) {
+                var m = registers.length;
+                var alpha = 0.7213 / (1 + 1.079 / m);
+                var sum = 0;
+                var nrEmpty = 0;
+
+                for (var j = 0; j < m; j++) {
+                    sum += Math.pow(2, -registers[j]);
+                    nrEmpty += registers[j] === 0 ? 1 : 0;
+                }
+
+                var value = alpha * m * m / sum;
+                if (value <= 2.5 * m && nrEmpty > 0) {
+                    value = m * Math.log(m / nrEmpty);
+                }
+
+                return round(value, 0);
+            }
+
+            // ties to even, like python's round
+            function round(value, digits) {
+                var factor = Math.pow(10, digits);
+                var scaled = value * factor;
+                var rounded = Math.round(scaled);
+
+                if (Math.abs(scaled % 1) === 0.5) {
+                    rounded = 2 * Math.round(scaled / 2);
+                }
+
+                return rounded / factor;
+            }
+
+            // the kpi components come with a placeholder where the value goes
+            function fill(template, value) {
+                return JSON.parse(JSON.stringify(template).replace(JSON.stringify(rollup.placeholder), JSON.stringify(value)));
+            }
+        }
+    }
+});
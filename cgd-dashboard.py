@@ -4,26 +4,41 @@
 #   ------------------------------------------------------------------------------------------------------------
 #   ---     import dependencies
 #   ------------------------------------------------------------------------------------------------------------
-import json
+import base64
 import datetime
+import threading
 from datetime import datetime
+from functools import partial
 
 import dash
 import numpy as np
-import pandas as pd
 from dash import Dash
 from dash import html
 from dash import dcc
-from dash import dash_table
 import dash_bootstrap_components as dbc
-from dash import Output, Input
+from dash import Output, Input, State, ClientsideFunction
 from dash.exceptions import PreventUpdate
-import plotly.express as px
 import plotly.graph_objects as go
-import matplotlib.pyplot as plt
-
-from os import listdir, path
-from os.path import isfile, join
+import plotly.io
+from flask import Response, request
+
+from cgd.aggregate import MAX_BARS, get_adaptive_readings
+from cgd.artifacts import ArtifactReader
+from cgd.export import (encode_frames, get_content_type, get_day_readings, get_period_readings, iter_reader_readings,
+                        iter_readings, parse_time)
+from cgd.ingest import list_files_to_process, read_dataset, index_dataset
+from cgd.metrics import CONTENT_TYPE, Metrics
+from cgd.ranges import get_period_positions, to_wall_clock_ns
+from cgd.readers import (REGISTRY_COLUMNS, count_by_reader_attribute, filter_by_readers, select_readers,
+                         update_reader_registry)
+from cgd.reply_data import get_error_breakdown
+from cgd.results import ResultCache
+from cgd.rollup import DailyCube
+from cgd.schema import get_memory_report
+from cgd.sessions import build_sessions, get_session_metrics, get_reader_session_metrics
+from cgd.timestamps import NS_PER_DAY, floor_to_day
+from cgd.tail import DatasetWatcher
+from cgd.event_store import EventStoreReader
 from dateutil.relativedelta import relativedelta
 
 
@@ -46,68 +61,107 @@ app = Dash(__name__,
 server = app.server
 
 FILES_TO_PROCESS_FOLDER = 'FILES_TO_PROCESS'
+DATASET_CACHE_FOLDER = 'DATASET_CACHE'
 
-#   ------------------------------------------------------------------------------------------------------------
-#   ---     types, constants & variables
-#   ------------------------------------------------------------------------------------------------------------
+# seconds between checks for appended lines and new files, None turns live tailing off
+LIVE_TAIL_INTERVAL = 60
 
-#   **************************************************************************************
-#   split file name
-#   **************************************************************************************
-def split_file_name(file_name):
-    first_file_token = file_name[:file_name.find('-')]
-    rest_of_str = file_name[file_name.find('-') + 1:]
+# categorical readers and notebooks, small integer codes, no time/hour copies (see cgd.schema)
+COMPACT_SCHEMA = True
 
-    second_file_token = rest_of_str[:rest_of_str.find('-')]
-    third_file_token = rest_of_str[rest_of_str.find('-') + 1:]
-    third_file_token = third_file_token[:-4]
+# print the bytes per column of the parsed rows and of the compact dataset at load; counting
+# the strings of the parsed rows takes a pass over them
+PRINT_MEMORY_REPORT = True
 
-    return first_file_token, second_file_token, third_file_token
+# folder of the shared event store written by python -m cgd.event_store; when set, the workers
+# map it read-only instead of parsing FILES_TO_PROCESS themselves
+EVENT_STORE_FOLDER = None
 
+# folder of the artifacts built by python -m cgd.artifacts (the nightly batch); when set, the
+# workers load the dataset, daily cube, sessions and slider marks from it instead of computing
+# them at boot, and pick up each new version the batch makes current
+ARTIFACTS_FOLDER = None
 
-#   **************************************************************************************
-def get_dataset():
-    onlyfiles = [f for f in listdir(FILES_TO_PROCESS_FOLDER) if isfile(join(FILES_TO_PROCESS_FOLDER, f))]
+# distinct readers and notebooks: 'exact' hash sets per day, or 'hll' (HyperLogLog, 2**precision
+# registers per day, about 1.04 / sqrt(2**precision) relative error) for multi-year histories
+DISTINCT_COUNT_MODE = 'exact'
+DISTINCT_COUNT_PRECISION = 14
 
-    dataset = None
+# show_info results kept per selected range, dropped whenever the dataset changes
+RESULT_CACHE_ENTRIES = 256
+RESULT_CACHE_BYTES = 64 * 2**20
 
-    for file_name in onlyfiles:
-        first_file_token, second_file_token, third_file_token = split_file_name(file_name)
+# widen every selected range to whole days: the answers are then per whole day and dragging the
+# slider within a day hits the same cache entry
+SNAP_PERIOD_TO_DAYS = False
 
-        print(f'Processing file: {file_name}')
+# ship a per-day rollup to the browser once per page load and answer the slider there
+# (assets/clientside.js), without a server round trip; a range then covers every day it touches
+CLIENTSIDE_MODE = False
 
-        # read file
-        df = pd.read_csv(join(FILES_TO_PROCESS_FOLDER, file_name), sep='|', header=None)
-        df.columns = ['date', 'time', 'nr_try', 'reply_data', 'reply_code']
+# the rollup's distinct notebooks are 2**precision HyperLogLog registers per day (about 2.3%
+# error at 11), its distinct readers one bit per reader and day (exact)
+CLIENTSIDE_SKETCH_PRECISION = 11
 
-        # set new column for notebook reader id
-        notebook_reader = third_file_token
-        df['notebook_reader'] = notebook_reader
+KPI_PLACEHOLDER = '__KPI_VALUE__'
 
-        # make nr_try start at 1
-        df['nr_try'] = df['nr_try'] + 1
+# load the dataset on a background thread: the server answers (and serves a loading layout) at
+# once, the slider, figure and KPIs fill in when the data is in
+FAST_START = False
+LOADING_POLL_INTERVAL = 1000
 
-        # datetime features
-        df['date_time'] = pd.to_datetime(df['date'] + ' ' + df['time'])
-        df['date'] = df['date'].astype('datetime64[ns]')
-        df['hour'] = df['date_time'].astype('datetime64[ns]')
+LOADING_TEXT = '...'
 
-        # reorder columns
-        df = df[['date_time', 'date', 'time', 'hour', 'notebook_reader', 'nr_try', 'reply_data', 'reply_code']]
+# callback and ingest timers, dataset and cache gauges on /metrics (prometheus text format);
+# off, the timers cost nothing and /metrics is empty
+METRICS_ENABLED = True
 
-        if dataset is None:
-            # print('dataset created')
-            dataset = df
+# print the selected period, its readings and the slider marks on every request
+PRINT_REQUESTS = False
 
-        else:
-            # print('appending to dataset')
-            dataset = pd.concat([dataset, df])
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+
+metrics = Metrics(enabled=METRICS_ENABLED)
+
+# location, terminal, branch and model of each reader, rows carry its reader_id (see cgd.readers)
+reader_registry = None
+
+
+#   **************************************************************************************
+#   the registry only grows, so rows prepared earlier keep valid reader_ids
+#   **************************************************************************************
+@metrics.timed('ingest_stage_seconds', stage='prepare_dataset')
+def prepare_dataset(dataset):
+    global reader_registry
+    reader_registry = update_reader_registry(reader_registry, list_files_to_process(FILES_TO_PROCESS_FOLDER))
+
+    metrics.inc('ingest_rows_total', len(dataset))
+
+    return index_dataset(dataset, compact=COMPACT_SCHEMA, registry=reader_registry)
+
+
+#   **************************************************************************************
+#   returns the dataset and the per-file timings, which carry the offsets to tail from
+#   **************************************************************************************
+def get_dataset():
+    with metrics.time('ingest_stage_seconds', stage='read_dataset'):
+        dataset, timings = read_dataset(FILES_TO_PROCESS_FOLDER, cache_folder=DATASET_CACHE_FOLDER)
+
+    for timing in timings:
+        source = 'cache' if timing['cached'] else 'parsed'
+        metrics.observe('ingest_file_seconds', timing['seconds'], source=source)
+        metrics.inc('ingest_files_total', source=source)
+        metrics.inc('ingest_bytes_total', timing['bytes'], source=source)
+
+    prepared = prepare_dataset(dataset)
 
-    dataset = dataset.set_index('date_time')
-    dataset.index = dataset.index.floor('S')
-    dataset = dataset.sort_index()
+    if PRINT_MEMORY_REPORT and COMPACT_SCHEMA:
+        report = get_memory_report(dataset, prepared).to_string(float_format='%.1f')
+        print(f'MEMORY USAGE:\n{report}')
 
-    return dataset
+    return prepared, timings
 
 
 #   **************************************************************************************
@@ -115,7 +169,8 @@ def get_monthly_marks(df):
     # extract unique year/month/day combinations as a PeriodIndex
     df = df.sort_index()
     months = df.index.to_period("M").unique()
-    print(f'MONTHS: {months}')
+    if PRINT_REQUESTS:
+        print(f'MONTHS: {months}')
 
     # convert PeriodIndex to epoch series and YYYY-MM string series
     epochs = months.to_timestamp().astype(np.int64) // 10**9
@@ -144,7 +199,8 @@ def get_daily_marks(df):
     # extract unique year/month/day combinations as a PeriodIndex
     df = df.sort_index()
     days = df.index.to_period("D").unique()
-    print(f'DAYS: {days}')
+    if PRINT_REQUESTS:
+        print(f'DAYS: {days}')
 
     # convert PeriodIndex to epoch series and YYYY-MM-DD string series
     epochs = days.to_timestamp().astype(np.int64) // 10**9
@@ -164,7 +220,12 @@ def get_ticks(df_in):
 
 
 def get_slider_marks(df_in):
-    ticks = get_ticks(df_in)
+    artifacts = get_artifacts(df_in)
+    if artifacts is not None:
+        return artifacts.slider_marks
+
+    # only the first and last ticks are shown, the index is sorted: format those two rows only
+    ticks = get_ticks(df_in.iloc[[0, -1]])
     marks_keys = [list(ticks)[0], list(ticks)[-1]]
     marks_labels = [ticks[list(ticks)[0]], ticks[list(ticks)[-1]]]
 
@@ -180,38 +241,199 @@ def get_msg_initial_period():
     return msg_initial_period
 
 
+# ArtifactReader when ARTIFACTS_FOLDER is set
+artifact_reader = None
+
+
 #   **************************************************************************************
-def get_notebook_readers_per_day(df_in):
-    notebook_readers_per_day = pd.DataFrame(df_in.groupby(by='date').agg('notebook_reader').unique().sort_index())
-    notebook_readers_per_day.index = notebook_readers_per_day.index.astype('datetime64[ns]')
+#   the loaded artifacts when df_in is their dataset, None otherwise
+#   **************************************************************************************
+def get_artifacts(df_in):
+    if artifact_reader is None:
+        return None
+
+    artifacts = artifact_reader.artifacts
+    if artifacts.dataset is not df_in:
+        return None
+
+    return artifacts
 
-    notebook_readers_per_day['nr_notebook_readers'] = [len(notebook_reader) for notebook_reader in notebook_readers_per_day['notebook_reader']]
 
-    return notebook_readers_per_day
+# (dataset version, daily cube) of the latest snapshot, replaced as a whole once the cube
+# has the watcher's new rows; callbacks read it once and answer from the cube's dataset
+daily_cube = None
+daily_cube_lock = threading.Lock()
 
 
 #   **************************************************************************************
-def get_readings_per_day(df_in):
-    readings_per_day = df_in.groupby(by='date').agg(nr_readings=('notebook_reader', 'count'))
+#   runs on the watcher's thread after each swap (and once at load), never on a request:
+#   takes the artifacts' cube, or extends the current cube with the new rows, or builds one
+#   **************************************************************************************
+def update_daily_cube(watcher, new_rows=None):
+    global daily_cube
+
+    with daily_cube_lock:
+        version = watcher.version
+        df_in = watcher.dataset
+
+        artifacts = get_artifacts(df_in)
+        cube = None if artifacts is None else artifacts.get_daily_cube(DISTINCT_COUNT_MODE, DISTINCT_COUNT_PRECISION)
 
-    return readings_per_day
+        if cube is None and daily_cube is not None and new_rows is not None:
+            with metrics.time('ingest_stage_seconds', stage='daily_cube_extend'):
+                cube = daily_cube[1].extend(df_in, new_rows)
 
+        if cube is None:
+            with metrics.time('ingest_stage_seconds', stage='daily_cube'):
+                cube = DailyCube(df_in, distinct_mode=DISTINCT_COUNT_MODE, precision=DISTINCT_COUNT_PRECISION)
 
-def get_unsuccessful_readings_per_day(df_in):
-    unsuccessful_readings_per_day = df_in[df_in['reply_code'] == 1]
-    unsuccessful_readings_per_day = unsuccessful_readings_per_day.groupby(by='date').agg(nr_unsuccessful_readings=('notebook_reader', 'count'))
+        daily_cube = (version, cube)
 
-    return unsuccessful_readings_per_day
 
+#   **************************************************************************************
+def get_daily_cube():
+    return daily_cube[1]
+
+
+reading_sessions = None
 
+
+#   **************************************************************************************
+#   sessions of every reader, rebuilt when the watcher swaps in a new dataset
 #   **************************************************************************************
-def get_plot_readings_per_period(df_in):
-    notebook_readers_per_day = get_notebook_readers_per_day(df_in)
-    readings_per_day = get_readings_per_day(df_in)
-    unsuccessful_readings_per_day = get_unsuccessful_readings_per_day(df_in)
+def get_reading_sessions(df_in):
+    global reading_sessions
+
+    sessions = reading_sessions
+    if sessions is None or sessions[0] is not df_in:
+        artifacts = get_artifacts(df_in)
+
+        if artifacts is not None:
+            sessions = (df_in, artifacts.reading_sessions)
+        else:
+            with metrics.time('ingest_stage_seconds', stage='reading_sessions'):
+                sessions = (df_in, build_sessions(df_in))
+        reading_sessions = sessions
+
+    return sessions[1]
 
-    readings_per_day = readings_per_day.join(notebook_readers_per_day['nr_notebook_readers'])
-    readings_per_day = readings_per_day.join(unsuccessful_readings_per_day['nr_unsuccessful_readings'])
+
+#   **************************************************************************************
+#   figure and KPIs of a period (ns, inclusive)
+#   **************************************************************************************
+@metrics.timed('callback_stage_seconds', stage='period_info')
+def get_period_info(cube, interval_start, interval_end):
+    # reading and error counts straight from the prefix sums
+    total_readings, total_unsuccessful_readings = cube.prefix.count(interval_start, interval_end)
+    if PRINT_REQUESTS:
+        print(f'TOTAL READINGS: {total_readings}')
+
+    # the rest from the daily cube, only the partial days at the ends touch raw rows
+    if total_readings > 0:
+        readings_per_day, totals = cube.summarise(interval_start, interval_end)
+        fig = get_plot_readings_per_period(readings_per_day)
+    else:
+        totals = {'nr_notebook_readers': 0, 'nr_notebooks': 0}
+        fig = dash.no_update
+
+    kpi_nr_notebooks = get_kpi_nr_notebook_readers(totals['nr_notebook_readers'])
+    kpi_total_readings = get_kpi_total_readings(total_readings)
+    kpi_percent_reading_errors = get_kpi_percent_reading_errors(total_readings, total_unsuccessful_readings)
+    kpi_unique_notebooks = get_kpi_unique_notebooks(totals['nr_notebooks'])
+
+    return fig, kpi_nr_notebooks, kpi_total_readings, kpi_percent_reading_errors, kpi_unique_notebooks
+
+
+#   **************************************************************************************
+#   one base64 text per row of a uint8 matrix
+#   **************************************************************************************
+def encode_rows(matrix):
+    return [base64.b64encode(row.tobytes()).decode('ascii') for row in matrix]
+
+
+#   **************************************************************************************
+#   a bitset of the codes of each day, packed 8 codes a byte
+#   **************************************************************************************
+def get_day_bitsets(days, codes, day_values, nr_codes):
+    known = codes >= 0
+
+    bits = np.zeros((len(day_values), max(nr_codes, 1)), dtype=bool)
+    bits[np.searchsorted(day_values, days[known]), codes[known]] = True
+
+    return encode_rows(np.packbits(bits, axis=1))
+
+
+#   **************************************************************************************
+#   HyperLogLog registers of each day, all zero on days without any
+#   **************************************************************************************
+def get_day_registers(sketches, day_values, precision):
+    registers = np.zeros((len(day_values), 1 << precision), dtype=np.uint8)
+    registers[np.searchsorted(day_values, sketches.days)] = sketches.get_registers(precision)
+
+    return encode_rows(registers)
+
+
+# (cube, rollup) of the last clientside rollup, built once per cube rather than per page load
+clientside_rollup = None
+
+
+#   **************************************************************************************
+#   the clientside mode's store: per-day counts, reader bitsets and notebook registers,
+#   each day's bounds in the slider's epoch seconds, and the figure and KPI components to
+#   fill in
+#   **************************************************************************************
+def get_clientside_rollup(cube):
+    global clientside_rollup
+
+    rollup = clientside_rollup
+    if rollup is None or rollup[0] is not cube:
+        rollup = (cube, build_clientside_rollup(cube))
+        clientside_rollup = rollup
+
+    return rollup[1]
+
+
+#   **************************************************************************************
+def build_clientside_rollup(cube):
+    readings_per_day, _ = cube.summarise(cube.index[0], cube.index[-1])
+
+    day_values = readings_per_day.index.asi8
+    days = readings_per_day.index.to_pydatetime()
+
+    figure = get_plot_readings_per_period(readings_per_day).to_plotly_json()
+    for trace in figure['data']:
+        trace.update(x=[], y=[], text=[])
+
+    weeks = readings_per_day.index.to_period('W').to_timestamp().to_pydatetime()
+    months = readings_per_day.index.to_period('M').to_timestamp().to_pydatetime()
+
+    return {'days': [day.strftime('%Y-%m-%dT%H:%M:%S') for day in days],
+            'weeks': [week.strftime('%Y-%m-%dT%H:%M:%S') for week in weeks],
+            'months': [month.strftime('%Y-%m-%dT%H:%M:%S') for month in months],
+            'max_bars': MAX_BARS,
+            'day_starts': [datetime.timestamp(day) for day in days],
+            'day_ends': [datetime.timestamp(day + relativedelta(days=1)) for day in days],
+            'nr_readings': readings_per_day['nr_readings'].tolist(),
+            'nr_unsuccessful_readings': readings_per_day['nr_unsuccessful_readings'].tolist(),
+            'nr_notebook_readers': readings_per_day['nr_notebook_readers'].tolist(),
+            'readers': get_day_bitsets(cube.cells['day'], cube.cells['reader'], day_values, len(cube.reader_names)),
+            'notebooks': get_day_registers(cube.notebook_sketches, day_values, CLIENTSIDE_SKETCH_PRECISION),
+            'figure': figure,
+            'placeholder': KPI_PLACEHOLDER,
+            'kpis': {'nr_notebook_readers': get_kpi_nr_notebook_readers(KPI_PLACEHOLDER),
+                     'total_readings': get_kpi_total_readings(KPI_PLACEHOLDER),
+                     'percent_reading_errors': get_kpi_reading_errors(KPI_PLACEHOLDER),
+                     'unique_notebooks': get_kpi_unique_notebooks(KPI_PLACEHOLDER)}}
+
+
+#   **************************************************************************************
+def get_plot_readings_per_period(readings_per_day):
+    # week or month bars over long ranges, summed from the per-day series
+    readings_per_day = get_adaptive_readings(readings_per_day)
+
+    # days without errors get no error bar
+    readings_per_day = readings_per_day.assign(
+        nr_unsuccessful_readings=readings_per_day['nr_unsuccessful_readings'].where(readings_per_day['nr_unsuccessful_readings'] > 0))
 
     readings_per_day['average_readings_per_day'] = round(readings_per_day['nr_readings'] / readings_per_day['nr_notebook_readers'], 2)
     readings_per_day['average_unsuccessful_readings_per_day'] = round(readings_per_day['nr_unsuccessful_readings'] / readings_per_day['nr_notebook_readers'], 2)
@@ -264,15 +486,10 @@ def get_plot_readings_per_period(df_in):
 
 
 #   **************************************************************************************
-def count_total_notebook_readers(df_in):
-    return df_in['notebook_reader'].nunique()
-
-
-#   **************************************************************************************
-def get_kpi_nr_notebook_readers(df_in):
+def get_kpi_nr_notebook_readers(nr_notebook_readers):
 
     kpi = html.Div([
-        html.Div(html.P(count_total_notebook_readers(df_in), style={'font-size':'5.0em','color':'#5CAEDF', 'text-align':'center',
+        html.Div(html.P(nr_notebook_readers, style={'font-size':'5.0em','color':'#5CAEDF', 'text-align':'center',
                                                       'font-weight':'750', 'padding':0, 'margin-top':-10})),
         html.Div('LEITORES', style={'font-size':'1.5em','color':'#2067DC', 'text-align':'center', 'font-weight':'750',
                                    'padding':0, 'margin-top':-40, 'width':'100%'})
@@ -281,16 +498,10 @@ def get_kpi_nr_notebook_readers(df_in):
 
 
 #   **************************************************************************************
-def count_total_readings(df_in):
-    print(f'TOTAL READINGS: min date {df_in.index.min()}  max date {df_in.index.max()}')
-    return len(df_in)
-
-
-#   **************************************************************************************
-def get_kpi_total_readings(df_in):
+def get_kpi_total_readings(total_readings):
 
     kpi = html.Div([
-        html.Div(html.P(count_total_readings(df_in), style={'font-size':'5.0em','color':'#5CAEDF', 'align':'center',
+        html.Div(html.P(total_readings, style={'font-size':'5.0em','color':'#5CAEDF', 'align':'center',
                                                       'font-weight':'750', 'padding':0, 'margin-top':-10})),
         html.Div('LEITURAS', style={'font-size':'1.5em','color':'#2067DC', 'align':'center', 'font-weight':'750',
                                    'padding':0, 'margin-top':-40, 'width':'100%'})
@@ -299,15 +510,7 @@ def get_kpi_total_readings(df_in):
 
 
 #   **************************************************************************************
-def count_unsuccessful_readings(df_in):
-    return len(df_in[df_in['reply_code'] == 1])
-
-
-#   **************************************************************************************
-def get_kpi_percent_reading_errors(df_in):
-    total_readings = count_total_readings(df_in)
-    total_unsuccessful_readings = count_unsuccessful_readings(df_in)
-
+def get_kpi_percent_reading_errors(total_readings, total_unsuccessful_readings):
     if total_readings > 0:
         kpi_percent_reading_errors = str(round(((total_unsuccessful_readings / total_readings) * 100), 1))
 
@@ -315,6 +518,11 @@ def get_kpi_percent_reading_errors(df_in):
     else:
         kpi_percent_reading_errors = '0%'
 
+    return get_kpi_reading_errors(kpi_percent_reading_errors)
+
+
+#   **************************************************************************************
+def get_kpi_reading_errors(kpi_percent_reading_errors):
     kpi = html.Div([
         html.Div(html.P(kpi_percent_reading_errors, style={'font-size': '5.0em', 'color':'#F54A4A', 'align': 'center',
                                                             'font-weight': '750', 'padding': 0, 'margin-top': -10})),
@@ -327,14 +535,9 @@ def get_kpi_percent_reading_errors(df_in):
 
 
 #   **************************************************************************************
-def count_unique_notebooks(df_in):
-    return df_in[df_in['reply_code'] == 0]['reply_data'].nunique()
-
-
-#   **************************************************************************************
-def get_kpi_unique_notebooks(df_in):
+def get_kpi_unique_notebooks(nr_notebooks):
     kpi = html.Div([
-        html.Div(html.P(count_unique_notebooks(df_in), style={'font-size':'5.0em','color':'#5CAEDF', 'align':'center',
+        html.Div(html.P(nr_notebooks, style={'font-size':'5.0em','color':'#5CAEDF', 'align':'center',
                                                       'font-weight':'750', 'padding':0, 'margin-top':-10})),
         html.Div('CADERNETAS', style={'font-size':'1.5em','color':'#2067DC', 'align':'center', 'font-weight':'750',
                                    'padding':0, 'margin-top':-40, 'width':'100%'})
@@ -353,13 +556,92 @@ def get_kpi_unique_notebooks(df_in):
 #   ++++++++++++++++++++++++++++++++++++++++++++++++++++
 #   get data
 #   ++++++++++++++++++++++++++++++++++++++++++++++++++++
-df = get_dataset()
-print(f'DATASET PERIOD: {df.index.min()} - {df.index.max()}')
-print(f'SLIDER MARKS: {get_slider_marks(df)}')
+# the watcher swaps in a new dataset as readers append lines (or as the ingest process
+# commits them to the event store); callbacks read daily_cube once and use its dataset
+# rather than the frozen df below. None until the dataset is loaded
+dataset_watcher = None
+dataset_loading_error = None
+
+result_cache = ResultCache(max_entries=RESULT_CACHE_ENTRIES, max_bytes=RESULT_CACHE_BYTES)
+
+
+#   **************************************************************************************
+#   reads the dataset and builds the daily cube and sessions, so the first request does
+#   not; dataset_watcher is only set once all of it is done
+#   **************************************************************************************
+def load_dataset():
+    global dataset_watcher, dataset_loading_error, df, artifact_reader, reader_registry
+
+    try:
+        if ARTIFACTS_FOLDER is not None:
+            watcher = artifact_reader = ArtifactReader(ARTIFACTS_FOLDER, interval=LIVE_TAIL_INTERVAL)
+            reader_registry = watcher.artifacts.registry
+        elif EVENT_STORE_FOLDER is not None:
+            watcher = EventStoreReader(EVENT_STORE_FOLDER, interval=LIVE_TAIL_INTERVAL)
+        else:
+            dataset, ingest_timings = get_dataset()
+            watcher = DatasetWatcher(FILES_TO_PROCESS_FOLDER, dataset, ingest_timings, prepare_dataset,
+                                     interval=LIVE_TAIL_INTERVAL)
+
+        # the cube follows every swap on the watcher's thread, requests never build it
+        update_daily_cube(watcher)
+        watcher.listeners.append(partial(update_daily_cube, watcher))
+
+        if LIVE_TAIL_INTERVAL is not None:
+            watcher.start()
+
+        df = watcher.dataset
+
+        print(f'DATASET PERIOD: {df.index.min()} - {df.index.max()}')
+        print(f'READING SESSIONS: {get_session_metrics(get_reading_sessions(df))}')
+        print(f'READING ERRORS: {get_error_breakdown(df["reply_data"]).to_dict()}')
+        print(f'SLIDER MARKS: {get_slider_marks(df)}')
+
+        dataset_watcher = watcher
+
+    except Exception as e:
+        if not FAST_START:
+            raise
+
+        dataset_loading_error = repr(e)
+        print(f'Dataset loading failed: {e!r}')
+
+
+if FAST_START:
+    threading.Thread(target=load_dataset, name='dataset-loader', daemon=True).start()
+else:
+    load_dataset()
+
 #   ++++++++++++++++++++++++++++++++++++++++++++++++++++
 #   +++     layout
 #   ++++++++++++++++++++++++++++++++++++++++++++++++++++
-app.layout = html.Div([
+# built on every page load, so the slider covers whatever the watcher has merged so far
+@metrics.timed('callback_seconds', callback='serve_layout')
+def serve_layout():
+    watcher = dataset_watcher
+
+    if watcher is None:
+        # still loading (FAST_START), fill_loaded_layout sets the slider once the data is in
+        kpis = [get_kpi_nr_notebook_readers(LOADING_TEXT), get_kpi_total_readings(LOADING_TEXT),
+                get_kpi_reading_errors(LOADING_TEXT), get_kpi_unique_notebooks(LOADING_TEXT)]
+        fig = go.Figure(layout={'title': 'A carregar dados...'})
+        slider = {'min': 0, 'max': 1, 'marks': None, 'disabled': True}
+        rollup = None
+    else:
+        cube = get_daily_cube()
+        df = cube.dataset
+        readings_per_day, totals = cube.summarise(df.index[0], df.index[-1])
+
+        kpis = [get_kpi_nr_notebook_readers(totals['nr_notebook_readers']),
+                get_kpi_total_readings(totals['nr_readings']),
+                get_kpi_percent_reading_errors(totals['nr_readings'], totals['nr_unsuccessful_readings']),
+                get_kpi_unique_notebooks(totals['nr_notebooks'])]
+        fig = get_plot_readings_per_period(readings_per_day)
+        slider = {'min': datetime.timestamp(df.index[0]), 'max': datetime.timestamp(df.index[-1]),
+                  'marks': get_slider_marks(df)}
+        rollup = get_clientside_rollup(cube) if CLIENTSIDE_MODE else None
+
+    return html.Div([
         # DASHBOARD TITLE
         html.Div([
             html.Div(children='CGD - CADERNETAS',
@@ -374,21 +656,21 @@ app.layout = html.Div([
 
         # KPIs
         html.Div([
-            html.Div(id='kpi_nr_notebook_readers', children=get_kpi_nr_notebook_readers(df),
+            html.Div(id='kpi_nr_notebook_readers', children=kpis[0],
                      style={'float':'left', 'width':'20%', 'margin-left':100, 'text-align':'right'}),
 
-            html.Div(id='kpi_total_readings', children=get_kpi_total_readings(df),
+            html.Div(id='kpi_total_readings', children=kpis[1],
                      style={'float':'left', 'width':'20%', 'margin-left':50}),
 
-            html.Div(id='kpi_percent_reading_errors', children=get_kpi_percent_reading_errors(df),
+            html.Div(id='kpi_percent_reading_errors', children=kpis[2],
                      style={'float': 'left', 'width': '20%', 'margin-left': 50, 'text-align':'right'}),
 
-            html.Div(id='kpi_unique_notebooks', children=get_kpi_unique_notebooks(df),
+            html.Div(id='kpi_unique_notebooks', children=kpis[3],
                      style={'float': 'left', 'width': '20%', 'margin-left': 50})
         ], style={'margin-top':10}),
 
         html.Div([
-            dcc.Graph(id='plot_readings_per_period', figure=get_plot_readings_per_period(df))
+            dcc.Graph(id='plot_readings_per_period', figure=fig)
         ], style={'margin-top':165, 'margin-left':10, 'padding':-10, 'float':'top'}),
 
         html.Div([
@@ -399,62 +681,283 @@ app.layout = html.Div([
                 updatemode='mouseup',
                 allowCross=False,
                 id="date_slider",
-                min=datetime.timestamp(df.index[0]),
-                max=datetime.timestamp(df.index[-1]),
                 # marks=get_weekly_marks(df)
 
                 # marks = {1666341207: '2022-10-21 08:33:27', 1668464936: '2022-11-14 22:28:56'}
                 # marks = {1666341207: '2022-10-21', 1668464936: '2022-11-14'}
                 # marks = {1666341207: '', 1668464936: ''}
-                marks = get_slider_marks(df)
+                **slider
 
                 # tooltip={"placement": "bottom", "always_visible": True}
             )
 
-        ],style={"width": "92%", 'margin-top':5, 'margin-left':80})
+        ],style={"width": "92%", 'margin-top':5, 'margin-left':80}),
+
+        *([dcc.Store(id='clientside_rollup', data=rollup)] if CLIENTSIDE_MODE else []),
 
-])
+        *([dcc.Interval(id='loading_interval', interval=LOADING_POLL_INTERVAL, disabled=watcher is not None)]
+          if FAST_START else [])
+
+    ])
+
+
+app.layout = serve_layout
 
 
 #   ++++++++++++++++++++++++++++++++++++++++++++++++++++
 #   +++     callbacks
 #   ++++++++++++++++++++++++++++++++++++++++++++++++++++
-@app.callback(
+SHOW_INFO_OUTPUTS = [
     # Output('msg_selected_period', 'children'),
     Output('plot_readings_per_period', 'figure'),
     Output('kpi_nr_notebook_readers', 'children'),
     Output('kpi_total_readings', 'children'),
     Output('kpi_percent_reading_errors', 'children'),
-    Output('kpi_unique_notebooks', 'children'),
-    Input('date_slider', 'value')
-)
+    Output('kpi_unique_notebooks', 'children')
+]
 
+
+@metrics.timed('callback_seconds', callback='show_info')
 def show_info(date_slider_value):
-    if date_slider_value is None:
+    if date_slider_value is None or dataset_watcher is None:
         raise PreventUpdate
 
     interval_start_date = datetime.fromtimestamp(date_slider_value[0])
     interval_end_date = datetime.fromtimestamp(date_slider_value[1])
 
-    print(f'SELECTED PERIOD: {interval_start_date} - {interval_end_date}')
+    if PRINT_REQUESTS:
+        print(f'SELECTED PERIOD: {interval_start_date} - {interval_end_date}')
+
+    # one snapshot for the whole callback, the watcher may swap in a newer one meanwhile;
+    # the version comes with the cube, results are cached under the version of their data
+    version, cube = daily_cube
 
     # msg_selected_period = f'de {interval_start_date} a {interval_end_date}'
 
-    df_selected_period = df[(df.index >= interval_start_date) & (df.index <= interval_end_date)]
-    # print(f'Readings: {len(df_selected_period)}')
+    interval_start = to_wall_clock_ns(date_slider_value[0])
+    interval_end = to_wall_clock_ns(date_slider_value[1])
 
-    if len(df_selected_period) > 0:
-        fig = get_plot_readings_per_period(df_selected_period)
-    else:
-        fig = dash.no_update
+    if SNAP_PERIOD_TO_DAYS:
+        interval_start = floor_to_day(interval_start)
+        interval_end = floor_to_day(interval_end) + NS_PER_DAY - 1
+
+    # ranges selecting the same readings have the same answer
+    first, last = get_period_positions(cube.index, interval_start, interval_end)
+    key = (first, last) if first < last else None
+
+    info = result_cache.get(version, key)
+    if PRINT_REQUESTS:
+        print(f'RESULT CACHE: {"hit" if info is not None else "miss"} {result_cache.get_stats()}')
 
-    kpi_nr_notebooks = get_kpi_nr_notebook_readers(df_selected_period)
-    kpi_total_readings = get_kpi_total_readings(df_selected_period)
-    kpi_percent_reading_errors = get_kpi_percent_reading_errors(df_selected_period)
-    kpi_unique_notebooks = get_kpi_unique_notebooks(df_selected_period)
+    if info is None:
+        info = get_period_info(cube, interval_start, interval_end)
+
+        fig = info[0]
+        nr_bytes = len(plotly.io.to_json(fig)) if fig is not dash.no_update else 0
+        result_cache.put(version, key, info, nr_bytes + 4096)
 
     # return msg_selected_period, fig, kpi_nr_notebooks, kpi_total_readings, kpi_percent_reading_errors
-    return fig, kpi_nr_notebooks, kpi_total_readings, kpi_percent_reading_errors, kpi_unique_notebooks
+    return info
+
+
+#   **************************************************************************************
+#   FAST_START: polls until the dataset is in, then sets the slider to the whole period,
+#   which has show_info fill in the figure and KPIs
+#   **************************************************************************************
+@metrics.timed('callback_seconds', callback='fill_loaded_layout')
+def fill_loaded_layout(n_intervals):
+    watcher = dataset_watcher
+    if watcher is None:
+        raise PreventUpdate
+
+    cube = get_daily_cube()
+    df = cube.dataset
+    slider_min = datetime.timestamp(df.index[0])
+    slider_max = datetime.timestamp(df.index[-1])
+
+    outputs = [slider_min, slider_max, get_slider_marks(df), [slider_min, slider_max], False, True]
+    if CLIENTSIDE_MODE:
+        outputs.append(get_clientside_rollup(cube))
+
+    return outputs
+
+
+if FAST_START:
+    app.callback(Output('date_slider', 'min'), Output('date_slider', 'max'), Output('date_slider', 'marks'),
+                 Output('date_slider', 'value'), Output('date_slider', 'disabled'),
+                 Output('loading_interval', 'disabled'),
+                 *([Output('clientside_rollup', 'data')] if CLIENTSIDE_MODE else []),
+                 Input('loading_interval', 'n_intervals'))(fill_loaded_layout)
+
+if CLIENTSIDE_MODE:
+    app.clientside_callback(ClientsideFunction(namespace='cgd', function_name='show_info'),
+                            *SHOW_INFO_OUTPUTS, Input('date_slider', 'value'), State('clientside_rollup', 'data'))
+else:
+    app.callback(*SHOW_INFO_OUTPUTS, Input('date_slider', 'value'))(show_info)
+
+
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+#   result cache counters, e.g. under the morning load
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+@server.route('/result-cache')
+@metrics.timed('route_seconds', route='result_cache')
+def show_result_cache_stats():
+    return result_cache.get_stats()
+
+
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+#   time-to-success, attempts and abandonment of the reading sessions, overall and per reader
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+@server.route('/reading-sessions')
+@metrics.timed('route_seconds', route='reading_sessions')
+def show_reading_session_metrics():
+    if dataset_watcher is None:
+        return {'status': 'loading'}, 503
+
+    sessions = get_reading_sessions(dataset_watcher.dataset)
+
+    return {'all': get_session_metrics(sessions), 'readers': get_reader_session_metrics(sessions)}
+
+
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+#   readings of a period per reader attribute (location, branch, model, ...), of the readers
+#   matching the other attributes given: /readers/model?branch=557&start=&end=, start and end
+#   as in the exports
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+@server.route('/readers/<attribute>')
+@metrics.timed('route_seconds', route='readers')
+def show_readings_by_reader_attribute(attribute):
+    if attribute not in REGISTRY_COLUMNS:
+        return {'error': f'Unknown reader attribute {attribute!r}, expected one of {", ".join(REGISTRY_COLUMNS)}'}, 404
+
+    if dataset_watcher is None:
+        return {'status': 'loading'}, 503
+
+    # the registry of the loaded version, which knows every reader_id of its rows
+    registry = artifact_reader.artifacts.registry if artifact_reader is not None else reader_registry
+    cube = get_daily_cube()
+    df = cube.dataset
+
+    if registry is None or 'reader_id' not in df.columns:
+        return {'error': 'No reader registry for this dataset'}, 404
+
+    try:
+        start = parse_time(request.args.get('start'), df.index[0])
+        end = parse_time(request.args.get('end'), df.index[-1])
+
+        filters = {column: [int(value) if registry[column].dtype.kind in 'iu' else value
+                            for value in request.args.getlist(column)]
+                   for column in REGISTRY_COLUMNS if column in request.args}
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    first, last = get_period_positions(cube.index, start, end)
+    rows = df.iloc[first:last]
+
+    # integer reader_id matches, no string compared per row
+    if filters:
+        rows = filter_by_readers(rows, select_readers(registry, **filters))
+
+    readings = count_by_reader_attribute(rows, registry, attribute)
+    readings = readings[readings > 0]
+
+    return {'attribute': attribute, 'readings': {str(value): int(count) for value, count in readings.items()}}
+
+
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+#   exports for reporting: /export/<kind>?start=&end=&format=csv|json|arrow, start and end
+#   in epoch seconds (like the slider) or timestamps, inclusive, the whole dataset by default;
+#   days also takes granularity=D|W|M. Raw readings are streamed a chunk of rows at a time,
+#   the timer stops once the response starts
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+EXPORT_KINDS = ['readings', 'days', 'readers', 'period']
+
+
+@server.route('/export/<kind>')
+@metrics.timed('route_seconds', route='export')
+def export_data(kind):
+    if kind not in EXPORT_KINDS:
+        return {'error': f'Unknown export {kind!r}, expected one of {", ".join(EXPORT_KINDS)}'}, 404
+
+    if dataset_watcher is None:
+        return {'status': 'loading'}, 503
+
+    # one snapshot for the whole export, streaming goes on after a newer one is swapped in
+    cube = get_daily_cube()
+    df = cube.dataset
+    export_format = request.args.get('format', 'csv')
+
+    try:
+        content_type = get_content_type(export_format)
+        start = parse_time(request.args.get('start'), df.index[0])
+        end = parse_time(request.args.get('end'), df.index[-1])
+
+        if kind == 'readings':
+            frames = iter_readings(df, cube.index, start, end)
+        elif kind == 'days':
+            frames = [get_day_readings(cube, start, end, granularity=request.args.get('granularity', 'D'))]
+        elif kind == 'readers':
+            frames = iter_reader_readings(cube, start, end)
+        else:
+            frames = [get_period_readings(cube, start, end)]
+
+        chunks = encode_frames(frames, export_format)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    except ImportError as e:
+        return {'error': f'{export_format} export unavailable: {e}'}, 501
+
+    metrics.inc('export_requests_total', kind=kind, format=export_format)
+
+    return Response(chunks, content_type=content_type,
+                    headers={'Content-Disposition': f'attachment; filename={kind}.{export_format}'})
+
+
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+#   dataset and result cache gauges, read on every scrape
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+def collect_metrics(metrics_in):
+    metrics_in.set_gauge('dataset_loaded', int(dataset_watcher is not None))
+    if dataset_watcher is None:
+        return
+
+    df = dataset_watcher.dataset
+
+    metrics_in.set_gauge('dataset_rows', len(df))
+    metrics_in.set_gauge('dataset_bytes', int(df.memory_usage(index=True).sum()))
+    metrics_in.set_gauge('dataset_version', dataset_watcher.version)
+    metrics_in.set_gauge('dataset_last_reading_timestamp_seconds',
+                         df.index[-1].to_pydatetime().timestamp() if len(df) else 0)
+
+    if reader_registry is not None:
+        metrics_in.set_gauge('readers', len(reader_registry))
+
+    stats = result_cache.get_stats()
+    for name in ['hits', 'misses', 'evictions', 'invalidations']:
+        metrics_in.set_counter(f'result_cache_{name}_total', stats[name])
+    metrics_in.set_gauge('result_cache_entries', stats['entries'])
+    metrics_in.set_gauge('result_cache_bytes', stats['bytes'])
+    metrics_in.set_gauge('result_cache_hit_ratio', stats['hit_ratio'] or 0.0)
+
+
+metrics.add_collector(collect_metrics)
+
+
+@server.route('/metrics')
+def show_metrics():
+    return metrics.render(), 200, {'Content-Type': CONTENT_TYPE}
+
+
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+#   up as soon as the server is, whether the dataset is in yet or not
+#   ++++++++++++++++++++++++++++++++++++++++++++++++++++
+@server.route('/health')
+@metrics.timed('route_seconds', route='health')
+def show_health():
+    if dataset_loading_error is not None:
+        return {'status': 'failed', 'error': dataset_loading_error}, 500
+
+    return {'status': 'ready' if dataset_watcher is not None else 'loading'}
 
 
 #   ++++++++++++++++++++++++++++++++++++++++++++++++++++
@@ -0,0 +1,3 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     shared data layer for the CGD - CADERNETAS dashboards
+#   ------------------------------------------------------------------------------------------------------------
@@ -0,0 +1,141 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     single-pass aggregation of a period
+#   ---     the per-day readings, unsuccessful readings and readers and the four KPI values, counted with
+#   ---     bincount / unique on integer keys instead of one groupby per figure series and KPI
+#   ------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from cgd.timestamps import NS_PER_DAY, to_datetime64
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+UNSUCCESSFUL_REPLY_CODE = 1
+
+READ_REPLY_CODE = 0
+
+# day, week (starting on monday) and month buckets, the finest one that keeps the figure within MAX_BARS
+GRANULARITIES = [('D', 1), ('W', 7), ('M', 31)]
+
+MAX_BARS = 62
+
+
+#   **************************************************************************************
+#   integer codes of a column, the categorical codes when there are any; -1 for missing
+#   **************************************************************************************
+def get_codes(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(), series.cat.categories
+
+    codes, uniques = pd.factorize(series)
+
+    return codes, uniques
+
+
+#   **************************************************************************************
+#   number of distinct non-negative codes
+#   **************************************************************************************
+def count_distinct(codes):
+    codes = codes[codes >= 0]
+
+    if len(codes) == 0:
+        return 0
+
+    return int(np.count_nonzero(np.bincount(codes)))
+
+
+#   **************************************************************************************
+#   days (ns at midnight), reader codes and reply codes of readings or of counted cells
+#   (counts then holds the readings per cell); notebooks are codes of the notebooks read,
+#   -1 where there is none. Returns the per-day frame indexed by date and the totals
+#   **************************************************************************************
+def aggregate_readings(days, readers, reply_codes, counts=None, notebooks=None):
+    day_values, day_positions = np.unique(days, return_inverse=True)
+    nr_days = len(day_values)
+
+    if counts is None:
+        counts = np.ones(len(days), dtype=np.int64)
+
+    unsuccessful = reply_codes == UNSUCCESSFUL_REPLY_CODE
+
+    nr_readings = np.bincount(day_positions, weights=counts, minlength=nr_days).astype(np.int64)
+    nr_unsuccessful_readings = np.bincount(day_positions[unsuccessful], weights=counts[unsuccessful],
+                                           minlength=nr_days).astype(np.int64)
+
+    # distinct (day, reader) pairs, then pairs per day
+    known = readers >= 0
+    nr_readers = int(readers.max()) + 1 if known.any() else 1
+    day_readers = np.unique(day_positions[known].astype(np.int64) * nr_readers + readers[known])
+    nr_notebook_readers = np.bincount(day_readers // nr_readers, minlength=nr_days)
+
+    readings_per_day = pd.DataFrame({'nr_readings': nr_readings,
+                                     'nr_unsuccessful_readings': nr_unsuccessful_readings,
+                                     'nr_notebook_readers': nr_notebook_readers},
+                                    index=pd.DatetimeIndex(to_datetime64(day_values), name='date'))
+
+    totals = {'nr_readings': int(nr_readings.sum()),
+              'nr_unsuccessful_readings': int(nr_unsuccessful_readings.sum()),
+              'nr_notebook_readers': count_distinct(readers),
+              'nr_notebooks': 0 if notebooks is None else count_distinct(notebooks)}
+
+    return readings_per_day, totals
+
+
+#   **************************************************************************************
+#   aggregate_readings over the rows of a dataset (date, notebook_reader, reply_code and
+#   reply_data columns, compact schema or not)
+#   **************************************************************************************
+def aggregate_dataset(df):
+    days = df['date'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    readers, _ = get_codes(df['notebook_reader'])
+    notebooks, _ = get_codes(df['reply_data'])
+    reply_codes = df['reply_code'].to_numpy()
+
+    notebooks = np.where(reply_codes == READ_REPLY_CODE, notebooks, -1)
+
+    return aggregate_readings(days, readers, reply_codes, notebooks=notebooks)
+
+
+#   **************************************************************************************
+#   finest granularity with at most max_bars buckets between two days (ns)
+#   **************************************************************************************
+def get_granularity(first_day, last_day, max_bars=MAX_BARS):
+    nr_days = (last_day - first_day) // NS_PER_DAY + 1
+
+    for granularity, bucket_days in GRANULARITIES:
+        if nr_days <= max_bars * bucket_days:
+            return granularity
+
+    return GRANULARITIES[-1][0]
+
+
+#   **************************************************************************************
+#   the per-day frame summed into week or month buckets labelled by their first day;
+#   nr_notebook_readers then counts reader-days, so readings / readers stays the
+#   average per reader and day
+#   **************************************************************************************
+def get_readings_per_bucket(readings_per_day, granularity):
+    if granularity == 'D' or len(readings_per_day) == 0:
+        return readings_per_day
+
+    buckets = readings_per_day.index.to_period(granularity).to_timestamp()
+
+    readings_per_bucket = readings_per_day.groupby(buckets).sum()
+    readings_per_bucket.index.name = 'date'
+
+    return readings_per_bucket
+
+
+#   **************************************************************************************
+#   the per-day frame in the buckets that fit its range
+#   **************************************************************************************
+def get_adaptive_readings(readings_per_day, max_bars=MAX_BARS):
+    if len(readings_per_day) == 0:
+        return readings_per_day
+
+    days = readings_per_day.index.asi8
+    granularity = get_granularity(days[0], days[-1], max_bars=max_bars)
+
+    return get_readings_per_bucket(readings_per_day, granularity)
@@ -0,0 +1,34 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     named numpy arrays on disk
+#   ---     one .npy file per array in a folder, loaded memory-mapped read-only, so every dashboard worker
+#   ---     on the host shares the pages (like the event store) and no class layout is pickled
+#   ------------------------------------------------------------------------------------------------------------
+import os
+
+import numpy as np
+
+from os.path import join
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+ARRAY_SUFFIX = '.npy'
+
+
+#   **************************************************************************************
+#   arrays is a dict name -> array; names become file names
+#   **************************************************************************************
+def save_arrays(arrays, folder):
+    os.makedirs(folder, exist_ok=True)
+
+    for name, values in arrays.items():
+        np.save(join(folder, f'{name}{ARRAY_SUFFIX}'), np.ascontiguousarray(values), allow_pickle=False)
+
+
+#   **************************************************************************************
+#   dict name -> read-only memmap
+#   **************************************************************************************
+def load_arrays(folder):
+    return {file_name[:-len(ARRAY_SUFFIX)]: np.load(join(folder, file_name), mmap_mode='r', allow_pickle=False)
+            for file_name in sorted(os.listdir(folder)) if file_name.endswith(ARRAY_SUFFIX)}
@@ -0,0 +1,323 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     precomputed dashboard artifacts
+#   ---     python -m cgd.artifacts FILES_TO_PROCESS ARTIFACTS ingests the reader files once (the nightly
+#   ---     batch) into a versioned folder: the typed dataset (an event store, mapped read-only), reader
+#   ---     registry, daily cube, retry histograms, reading sessions and slider marks. The dashboards load
+#   ---     the newest version at boot instead of computing all of it in the web process
+#   ------------------------------------------------------------------------------------------------------------
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+
+from datetime import datetime
+from os.path import isdir, isfile, join
+
+import numpy as np
+
+from cgd.aggregate import aggregate_dataset
+from cgd.event_store import EventStoreWriter, load_event_store
+from cgd.files import write_json
+from cgd.ingest import list_files_to_process, read_dataset, index_dataset
+from cgd.readers import load_reader_registry, save_reader_registry, update_reader_registry
+from cgd.retries import RetryHistograms, load_retry_histograms, save_retry_histograms
+from cgd.rollup import DailyCube, load_daily_cube, save_daily_cube
+from cgd.sessions import build_sessions, load_sessions, save_sessions
+from cgd.sketch import DEFAULT_PRECISION, EXACT_MODE
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# bump whenever what is written changes, dashboards refuse versions they cannot read
+# (3: the daily cube and sessions as mapped arrays instead of pickles)
+ARTIFACTS_VERSION = 3
+
+# names the version the dashboards load, rewritten once a new version is complete
+CURRENT_FILE_NAME = 'CURRENT'
+
+MANIFEST_FILE_NAME = 'manifest.json'
+DATASET_FOLDER_NAME = 'dataset'
+READERS_FILE_NAME = 'readers.json'
+DAILY_CUBE_FOLDER_NAME = 'daily_cube'
+RETRY_HISTOGRAMS_FILE_NAME = 'retry_histograms.npz'
+READING_SESSIONS_FOLDER_NAME = 'reading_sessions'
+
+# older versions kept next to the current one, for workers still mapping them
+KEEP_VERSIONS = 2
+
+# a version being written, .{version}.{pid}.tmp until it is renamed into place
+TMP_FOLDER_SUFFIX = '.tmp'
+
+
+#   **************************************************************************************
+#   first and last second of a sorted index, labelled by day (cgd-dashboard's slider)
+#   **************************************************************************************
+def get_range_marks(index):
+    ticks = index[[0, -1]].to_period('S').unique()
+
+    epochs = ticks.to_timestamp().astype(np.int64) // 10**9
+
+    return {str(epoch): label for epoch, label in zip(epochs, ticks.strftime('%Y-%m-%d'))}
+
+
+#   **************************************************************************************
+#   first day of every month, labelled by month (the v1.3 slider)
+#   **************************************************************************************
+def get_monthly_marks(index):
+    months = index.to_period('M').unique().sort_values()
+
+    epochs = months.to_timestamp().astype(np.int64) // 10**9
+
+    return {str(epoch): label for epoch, label in zip(epochs, months.strftime('%Y-%m'))}
+
+
+#   **************************************************************************************
+#   the version the dashboards load, None before the first build
+#   **************************************************************************************
+def get_current_version(artifacts_folder):
+    path = join(artifacts_folder, CURRENT_FILE_NAME)
+    if not isfile(path):
+        return None
+
+    with open(path) as f:
+        return json.load(f)['version']
+
+
+#   **************************************************************************************
+#   a new version name, in build order
+#   **************************************************************************************
+def _get_version_name(artifacts_folder):
+    version = datetime.now().strftime('%Y%m%dT%H%M%S')
+
+    name = version
+    suffix = 1
+    while isdir(join(artifacts_folder, name)):
+        name = f'{version}-{suffix}'
+        suffix += 1
+
+    return name
+
+
+#   **************************************************************************************
+def _is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+#   **************************************************************************************
+#   drops all but the newest keep versions besides the current one, and the versions a
+#   build that died left half-written
+#   **************************************************************************************
+def prune_versions(artifacts_folder, keep=KEEP_VERSIONS):
+    for name in os.listdir(artifacts_folder):
+        if name.startswith('.') and name.endswith(TMP_FOLDER_SUFFIX) and isdir(join(artifacts_folder, name)):
+            pid = name[:-len(TMP_FOLDER_SUFFIX)].rsplit('.', 1)[-1]
+
+            if pid.isdigit() and not _is_running(int(pid)):
+                shutil.rmtree(join(artifacts_folder, name), ignore_errors=True)
+
+    current = get_current_version(artifacts_folder)
+
+    versions = sorted(name for name in os.listdir(artifacts_folder)
+                      if isdir(join(artifacts_folder, name)) and not name.startswith('.') and name != current)
+
+    for name in versions[:max(0, len(versions) - keep)]:
+        shutil.rmtree(join(artifacts_folder, name), ignore_errors=True)
+
+
+#   **************************************************************************************
+#   ingests files_folder into a new version under artifacts_folder and makes it the
+#   current one; reader ids carry on from the current version. Returns the version name
+#   **************************************************************************************
+def build_artifacts(files_folder, artifacts_folder, distinct_mode=EXACT_MODE, precision=DEFAULT_PRECISION,
+                    keep=KEEP_VERSIONS):
+    started = time.perf_counter()
+    os.makedirs(artifacts_folder, exist_ok=True)
+
+    current = get_current_version(artifacts_folder)
+    registry = None if current is None else load_reader_registry(join(artifacts_folder, current, READERS_FILE_NAME))
+
+    file_names = list_files_to_process(files_folder)
+    dataset, timings = read_dataset(files_folder)
+
+    registry = update_reader_registry(registry, file_names)
+    dataset = index_dataset(dataset, compact=True, registry=registry)
+
+    daily_cube = DailyCube(dataset, distinct_mode=distinct_mode, precision=precision)
+
+    retry_histograms = RetryHistograms()
+    retry_histograms.add(dataset)
+
+    reading_sessions = build_sessions(dataset)
+
+    _, totals = aggregate_dataset(dataset)
+
+    # written aside, then renamed into place: a dashboard never sees half a version
+    version = _get_version_name(artifacts_folder)
+    tmp_folder = join(artifacts_folder, f'.{version}.{os.getpid()}{TMP_FOLDER_SUFFIX}')
+    os.makedirs(tmp_folder)
+
+    EventStoreWriter(join(tmp_folder, DATASET_FOLDER_NAME)).write(dataset)
+    save_reader_registry(registry, join(tmp_folder, READERS_FILE_NAME))
+    save_retry_histograms(retry_histograms, join(tmp_folder, RETRY_HISTOGRAMS_FILE_NAME))
+    save_daily_cube(daily_cube, join(tmp_folder, DAILY_CUBE_FOLDER_NAME))
+    save_sessions(reading_sessions, join(tmp_folder, READING_SESSIONS_FOLDER_NAME))
+
+    manifest = {'artifacts_version': ARTIFACTS_VERSION,
+                'version': version,
+                'built': datetime.now().isoformat(timespec='seconds'),
+                'files': [{'file_name': timing['file_name'], 'rows': timing['rows'], 'bytes': timing['bytes']}
+                          for timing in timings],
+                'nr_rows': len(dataset),
+                'first': str(dataset.index[0]) if len(dataset) else None,
+                'last': str(dataset.index[-1]) if len(dataset) else None,
+                'distinct_mode': distinct_mode,
+                'precision': precision,
+                'totals': totals,
+                'slider_marks': get_range_marks(dataset.index) if len(dataset) else {},
+                'monthly_marks': get_monthly_marks(dataset.index)}
+    write_json(join(tmp_folder, MANIFEST_FILE_NAME), manifest)
+
+    os.rename(tmp_folder, join(artifacts_folder, version))
+    write_json(join(artifacts_folder, CURRENT_FILE_NAME), {'version': version})
+
+    prune_versions(artifacts_folder, keep=keep)
+
+    print(f'Artifacts {artifacts_folder}/{version}: {len(dataset)} rows, {len(registry)} readers '
+          f'in {time.perf_counter() - started:.3f}s')
+
+    return version
+
+
+#   **************************************************************************************
+#   one version, loaded; the dataset, daily cube and sessions are mapped (shared by the
+#   workers on the host), the registry and retry histograms are small and read into memory
+#   **************************************************************************************
+class Artifacts:
+
+    def __init__(self, folder):
+        self.folder = folder
+
+        with open(join(folder, MANIFEST_FILE_NAME)) as f:
+            self.manifest = json.load(f)
+
+        if self.manifest['artifacts_version'] != ARTIFACTS_VERSION:
+            raise ValueError(f'Artifacts {folder} are version {self.manifest["artifacts_version"]}, '
+                             f'expected {ARTIFACTS_VERSION}: run python -m cgd.artifacts again')
+
+        self.version = self.manifest['version']
+        self.totals = self.manifest['totals']
+        self.slider_marks = self.manifest['slider_marks']
+        self.monthly_marks = self.manifest['monthly_marks']
+
+        self.dataset, _ = load_event_store(join(folder, DATASET_FOLDER_NAME))
+        self.registry = load_reader_registry(join(folder, READERS_FILE_NAME))
+        self.retry_histograms = load_retry_histograms(join(folder, RETRY_HISTOGRAMS_FILE_NAME))
+        self.reading_sessions = load_sessions(join(folder, READING_SESSIONS_FOLDER_NAME), self.dataset)
+        self.daily_cube = load_daily_cube(join(folder, DAILY_CUBE_FOLDER_NAME), self.dataset)
+
+    #   **************************************************************************************
+    #   the daily cube when it counts distinct values the way the caller does, None otherwise
+    #   **************************************************************************************
+    def get_daily_cube(self, distinct_mode=EXACT_MODE, precision=DEFAULT_PRECISION):
+        if self.manifest['distinct_mode'] != distinct_mode:
+            return None
+        if distinct_mode != EXACT_MODE and self.manifest['precision'] != precision:
+            return None
+
+        return self.daily_cube
+
+
+#   **************************************************************************************
+#   the current version (or the one given)
+#   **************************************************************************************
+def load_artifacts(artifacts_folder, version=None):
+    version = version or get_current_version(artifacts_folder)
+    if version is None:
+        raise FileNotFoundError(f'No artifacts in {artifacts_folder}: run python -m cgd.artifacts first')
+
+    return Artifacts(join(artifacts_folder, version))
+
+
+#   **************************************************************************************
+#   the dashboard side: same dataset / version / start / listeners interface as
+#   DatasetWatcher, loads each new version the nightly batch makes current; listeners
+#   get None, a version is not a set of new rows
+#   **************************************************************************************
+class ArtifactReader:
+
+    def __init__(self, folder, interval=60, listeners=None):
+        self.folder = folder
+        self.interval = interval
+        self.listeners = list(listeners or [])
+
+        self.artifacts = load_artifacts(folder)
+        self.dataset = self.artifacts.dataset
+        self.version = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    #   **************************************************************************************
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='artifact-reader', daemon=True)
+            self._thread.start()
+
+    #   **************************************************************************************
+    def stop(self):
+        self._stop.set()
+
+    #   **************************************************************************************
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f'Artifact reader failed: {e!r}')
+
+    #   **************************************************************************************
+    #   returns whether a new version was loaded
+    #   **************************************************************************************
+    def poll(self):
+        current = get_current_version(self.folder)
+        if current is None or current == self.artifacts.version:
+            return False
+
+        artifacts = load_artifacts(self.folder, current)
+
+        # artifacts first, so whoever sees the new dataset finds its artifacts
+        self.artifacts = artifacts
+        self.dataset = artifacts.dataset
+        self.version += 1
+
+        for listener in self.listeners:
+            try:
+                listener(None)
+            except Exception as e:
+                print(f'Artifact reader: listener {listener!r} failed: {e!r}')
+
+        print(f'Artifact reader: loaded {self.folder}/{current} ({len(self.dataset)} rows)')
+
+        return True
+
+
+#   **************************************************************************************
+#   python -m cgd.artifacts FILES_TO_PROCESS ARTIFACTS [distinct_mode] [precision]
+#   **************************************************************************************
+if __name__ == '__main__':
+    files_folder = sys.argv[1] if len(sys.argv) > 1 else 'FILES_TO_PROCESS'
+    artifacts_folder = sys.argv[2] if len(sys.argv) > 2 else 'ARTIFACTS'
+    mode = sys.argv[3] if len(sys.argv) > 3 else EXACT_MODE
+    precision = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_PRECISION
+
+    build_artifacts(files_folder, artifacts_folder, distinct_mode=mode, precision=precision)
@@ -0,0 +1,240 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     benchmark suite
+#   ---     synthetic logs at a chosen scale (see cgd.synthetic), then a dashboard's startup, get_dataset,
+#   ---     slider marks, figure, KPI builders and show_info timed over ranges from an hour to the whole
+#   ---     dataset; timings, throughput, memory per stage and the values computed go to a json report, so runs
+#   ---     can be compared for regressions and hardware sized per region
+#   ------------------------------------------------------------------------------------------------------------
+import argparse
+import json
+import os
+import platform
+import runpy
+import shutil
+import time
+
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cgd.aggregate import aggregate_dataset
+from cgd.ranges import get_row_epoch_ns, slice_period, to_wall_clock_ns
+from cgd.streaming import get_peak_rss_mb
+from cgd.synthetic import NR_DAYS, generate_files
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+DASHBOARD = 'cgd-dashboard.py'
+
+WORK_FOLDER = 'BENCHMARK'
+
+REPEATS = 3
+
+# slider ranges ending at the last reading; None is the whole dataset
+RANGES = [('hour', 3600), ('day', 86400), ('week', 7 * 86400), ('month', 31 * 86400), ('quarter', 92 * 86400),
+          ('all', None)]
+
+
+#   **************************************************************************************
+def get_environment():
+    return {'python': platform.python_version(),
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'nr_cpus': os.cpu_count(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'started': datetime.now().isoformat(timespec='seconds')}
+
+
+#   **************************************************************************************
+#   resident set size now, from /proc (linux); None where there is none
+#   **************************************************************************************
+def get_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+
+
+#   **************************************************************************************
+#   runs function repeats times with the dashboard's prints silenced, records the fastest
+#   and mean run, the rows per second and the stage's memory: how much it grew the RSS
+#   (what it keeps) and raised the peak RSS (its transient high-water mark, 0 when it
+#   stayed below an earlier stage's); returns the last result
+#   **************************************************************************************
+def time_call(report, name, function, repeats=REPEATS, nr_rows=None, range_name=None):
+    seconds = []
+
+    rss_before = get_rss_mb()
+    peak_rss_before = get_peak_rss_mb()
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        for _ in range(repeats):
+            started = time.perf_counter()
+            result = function()
+            seconds.append(time.perf_counter() - started)
+
+    rss_after = get_rss_mb()
+
+    timing = {'name': name,
+              'range': range_name,
+              'repeats': repeats,
+              'seconds': min(seconds),
+              'mean_seconds': sum(seconds) / len(seconds),
+              'nr_rows': nr_rows,
+              'rows_per_second': nr_rows / min(seconds) if nr_rows and min(seconds) > 0 else None,
+              'rss_increase_mb': None if rss_after is None else round(rss_after - rss_before, 1),
+              'peak_rss_increase_mb': round(get_peak_rss_mb() - peak_rss_before, 1)}
+    report['timings'].append(timing)
+
+    rows_per_second = f'{timing["rows_per_second"]:14.0f} rows/s' if timing['rows_per_second'] else ' ' * 21
+    rss_increase = f'{timing["rss_increase_mb"]:+8.1f} MB' if timing['rss_increase_mb'] is not None else ' ' * 11
+    print(f'{name:<32} {range_name or "":<8} {timing["seconds"]:10.4f}s  {rows_per_second}  {rss_increase}  '
+          f'peak {timing["peak_rss_increase_mb"]:+8.1f} MB')
+
+    return result
+
+
+#   **************************************************************************************
+#   slider values (epoch seconds, as the dashboards compute them) of a range ending at
+#   the last reading
+#   **************************************************************************************
+def get_slider_value(first_ns, last_ns, seconds):
+    first = int(pd.Timestamp(first_ns).to_pydatetime().timestamp())
+    last = int(pd.Timestamp(last_ns).to_pydatetime().timestamp())
+
+    return [first if seconds is None else max(first, last - seconds), last]
+
+
+#   **************************************************************************************
+#   the figure, the KPI builders and show_info of one range
+#   **************************************************************************************
+def run_range(report, namespace, df, range_name, slider_value, repeats):
+    period = slice_period(df, to_wall_clock_ns(slider_value[0]), to_wall_clock_ns(slider_value[1]))
+    readings_per_day, totals = aggregate_dataset(period)
+
+    report['results'][range_name] = dict(slider_value=slider_value, nr_rows=len(period), **totals)
+
+    if len(readings_per_day) > 0:
+        time_call(report, 'get_plot_readings_per_period',
+                  lambda: namespace['get_plot_readings_per_period'](readings_per_day),
+                  repeats=repeats, nr_rows=len(period), range_name=range_name)
+
+    time_call(report, 'kpi_builders',
+              lambda: (namespace['get_kpi_nr_notebook_readers'](totals['nr_notebook_readers']),
+                       namespace['get_kpi_total_readings'](totals['nr_readings']),
+                       namespace['get_kpi_percent_reading_errors'](totals['nr_readings'],
+                                                                   totals['nr_unsuccessful_readings']),
+                       namespace['get_kpi_unique_notebooks'](totals['nr_notebooks'])),
+              repeats=repeats, range_name=range_name)
+
+    # uncached first, the repeats then hit the result cache where the dashboard has one
+    if 'result_cache' in namespace:
+        namespace['result_cache'].clear()
+
+    time_call(report, 'show_info', lambda: namespace['show_info'](slider_value),
+              repeats=1, nr_rows=len(period), range_name=range_name)
+    time_call(report, 'show_info_repeat', lambda: namespace['show_info'](slider_value),
+              repeats=repeats, nr_rows=len(period), range_name=range_name)
+
+
+#   **************************************************************************************
+#   generates the logs into work_folder, loads the dashboard there and times it; returns
+#   the report
+#   **************************************************************************************
+def run_benchmark(dashboard, nr_readers, nr_rows, nr_days=NR_DAYS, seed=0, work_folder=WORK_FOLDER,
+                  repeats=REPEATS):
+    dashboard = os.path.abspath(dashboard)
+
+    report = {'config': {'dashboard': os.path.basename(dashboard), 'nr_readers': nr_readers, 'nr_rows': nr_rows,
+                         'nr_days': nr_days, 'seed': seed, 'repeats': repeats},
+              'environment': get_environment(),
+              'timings': [],
+              'results': {}}
+
+    files_folder = os.path.join(work_folder, 'FILES_TO_PROCESS')
+    shutil.rmtree(files_folder, ignore_errors=True)
+
+    file_names, nr_bytes = time_call(report, 'generate_files',
+                                     lambda: generate_files(files_folder, nr_readers, nr_rows, nr_days=nr_days,
+                                                            seed=seed),
+                                     repeats=1, nr_rows=nr_rows)
+    report['config']['nr_bytes'] = nr_bytes
+
+    working_directory = os.getcwd()
+    os.chdir(work_folder)
+
+    try:
+        # the dashboard reads FILES_TO_PROCESS and DATASET_CACHE relative to the working directory
+        cache_folder = 'DATASET_CACHE'
+        shutil.rmtree(cache_folder, ignore_errors=True)
+
+        namespace = time_call(report, 'startup', lambda: runpy.run_path(dashboard, run_name='benchmark'),
+                              repeats=1, nr_rows=nr_rows)
+
+        # no live tail while timing
+        if 'dataset_watcher' in namespace:
+            namespace['dataset_watcher'].stop()
+            df = namespace['dataset_watcher'].dataset
+        else:
+            df = namespace['df']
+
+        cache_folder = namespace.get('DATASET_CACHE_FOLDER', cache_folder)
+        if cache_folder is not None:
+            shutil.rmtree(cache_folder, ignore_errors=True)
+            time_call(report, 'get_dataset_uncached', namespace['get_dataset'], repeats=1, nr_rows=nr_rows)
+
+        time_call(report, 'get_dataset', namespace['get_dataset'], repeats=repeats, nr_rows=nr_rows)
+
+        if 'get_slider_marks' in namespace:
+            time_call(report, 'get_slider_marks', lambda: namespace['get_slider_marks'](df),
+                      repeats=repeats, nr_rows=len(df))
+
+        # the per-range stages replay the slider callback; dashboards without one (v1.0) stop here
+        if 'show_info' not in namespace:
+            print(f'{os.path.basename(dashboard)} has no show_info, per-range stages skipped')
+        else:
+            epoch_ns = get_row_epoch_ns(df)
+            for range_name, seconds in RANGES:
+                slider_value = get_slider_value(epoch_ns.min(), epoch_ns.max(), seconds)
+                run_range(report, namespace, df, range_name, slider_value, repeats)
+
+    finally:
+        os.chdir(working_directory)
+
+    report['peak_rss_mb'] = round(get_peak_rss_mb(), 1)
+
+    return report
+
+
+#   **************************************************************************************
+#   python -m cgd.benchmark --readers 1000 --rows 1e8 --output results.json
+#   **************************************************************************************
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='times a dashboard over synthetic reader logs')
+    parser.add_argument('--dashboard', default=DASHBOARD)
+    parser.add_argument('--readers', type=int, default=23)
+    parser.add_argument('--rows', type=float, default=45685)
+    parser.add_argument('--days', type=int, default=NR_DAYS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=REPEATS)
+    parser.add_argument('--work-folder', default=WORK_FOLDER)
+    parser.add_argument('--output', default=None)
+    arguments = parser.parse_args()
+
+    benchmark_report = run_benchmark(arguments.dashboard, arguments.readers, int(arguments.rows),
+                                     nr_days=arguments.days, seed=arguments.seed,
+                                     work_folder=arguments.work_folder, repeats=arguments.repeats)
+
+    output = arguments.output or os.path.join(arguments.work_folder, 'results.json')
+    with open(output, 'w') as file:
+        json.dump(benchmark_report, file, indent=2, default=str)
+
+    print(f'Benchmark report: {output}')
@@ -0,0 +1,129 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     on-disk columnar cache of the parsed reader files
+#   ---     one NumPy .npz per source file, stamped with the file size and mtime it was parsed from and the
+#   ---     bytes parsed (up to the last complete line)
+#   ------------------------------------------------------------------------------------------------------------
+import os
+
+import numpy as np
+import pandas as pd
+
+from os import listdir
+from os.path import isfile, join
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# bump whenever parse_file changes what it produces, so old entries are parsed again
+# (2: the terminal_id column, 3: the bytes parsed)
+CACHE_VERSION = 3
+
+CACHE_FILE_SUFFIX = '.npz'
+
+
+#   **************************************************************************************
+def get_file_fingerprint(folder, file_name):
+    stat = os.stat(join(folder, file_name))
+
+    return int(stat.st_size), int(stat.st_mtime_ns)
+
+
+#   **************************************************************************************
+def get_cache_path(cache_folder, file_name):
+    return join(cache_folder, file_name + CACHE_FILE_SUFFIX)
+
+
+#   **************************************************************************************
+#   object columns are stored as fixed-width unicode, which only round-trips plain strings
+#   **************************************************************************************
+def _to_array(column):
+    if column.dtype != object:
+        return column.to_numpy()
+
+    if pd.api.types.infer_dtype(column, skipna=False) != 'string':
+        return None
+
+    return column.to_numpy().astype(str)
+
+
+#   **************************************************************************************
+def _from_array(array):
+    if array.dtype.kind == 'U':
+        return array.astype(object)
+
+    return array
+
+
+#   **************************************************************************************
+#   returns the cached frame and the bytes it was parsed from, or None when missing,
+#   stale or unreadable
+#   **************************************************************************************
+def load_cached_file(cache_folder, file_name, fingerprint):
+    cache_path = get_cache_path(cache_folder, file_name)
+
+    if not isfile(cache_path):
+        return None
+
+    try:
+        with np.load(cache_path, allow_pickle=False) as data:
+            if int(data['version']) != CACHE_VERSION:
+                return None
+
+            if (int(data['size']), int(data['mtime_ns'])) != fingerprint:
+                return None
+
+            columns = [str(column) for column in data['columns']]
+            df = pd.DataFrame({column: _from_array(data[f'column_{i}']) for i, column in enumerate(columns)})
+            nr_bytes = int(data['nr_bytes'])
+
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return df, nr_bytes
+
+
+#   **************************************************************************************
+#   returns False when the frame holds values the cache cannot represent
+#   **************************************************************************************
+def store_cached_file(cache_folder, file_name, fingerprint, df, nr_bytes):
+    arrays = {}
+
+    for i, column in enumerate(df.columns):
+        array = _to_array(df[column])
+
+        if array is None:
+            return False
+
+        arrays[f'column_{i}'] = array
+
+    cache_path = get_cache_path(cache_folder, file_name)
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+
+    # several workers may boot at once, so write aside and swap in atomically
+    with open(tmp_path, 'wb') as f:
+        np.savez(f,
+                 version=np.int64(CACHE_VERSION),
+                 size=np.int64(fingerprint[0]),
+                 mtime_ns=np.int64(fingerprint[1]),
+                 nr_bytes=np.int64(nr_bytes),
+                 columns=np.array(df.columns, dtype=str),
+                 **arrays)
+
+    os.replace(tmp_path, cache_path)
+
+    return True
+
+
+#   **************************************************************************************
+#   drop entries whose source file is gone
+#   **************************************************************************************
+def prune_cache(cache_folder, file_names):
+    expected = {file_name + CACHE_FILE_SUFFIX for file_name in file_names}
+
+    for cache_file_name in listdir(cache_folder):
+        if cache_file_name.endswith(CACHE_FILE_SUFFIX) and cache_file_name not in expected:
+            try:
+                os.remove(join(cache_folder, cache_file_name))
+            except OSError:
+                pass
@@ -0,0 +1,460 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     append-only memory-mapped event store
+#   ---     one fixed-width binary file per column plus a meta.json; the ingest process writes it, every
+#   ---     dashboard worker maps it read-only, so the pages are shared by all workers on the host.
+#   ---     A rewritten column goes to a new file that only meta.json names, so a worker never maps a
+#   ---     file under a dtype or categories it was not written with. Rows stay sorted by date_time: late
+#   ---     rows are merged into a new generation of the files, which every worker maps as it is
+#   ------------------------------------------------------------------------------------------------------------
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from os.path import isfile, join
+
+from cgd.files import write_json
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# 2: file names per column in meta.json (1 had one fixed name per column)
+STORE_VERSION = 2
+
+META_FILE_NAME = 'meta.json'
+
+INDEX_COLUMN = 'date_time'
+
+
+#   **************************************************************************************
+#   the codes dtype pandas itself picks for a categorical, so mapped codes are not copied
+#   **************************************************************************************
+def get_codes_dtype(nr_categories):
+    for dtype in (np.int8, np.int16, np.int32):
+        if nr_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+
+    return np.dtype(np.int64)
+
+
+#   **************************************************************************************
+#   files of a column, as named in meta.json (the fixed names of version 1 stores otherwise)
+#   **************************************************************************************
+def _get_column_path(folder, column):
+    return join(folder, column.get('file', f'{column["name"]}.bin'))
+
+
+#   **************************************************************************************
+def _get_categories_path(folder, column):
+    return join(folder, column.get('categories_file', f'{column["name"]}.categories.json'))
+
+
+#   **************************************************************************************
+#   a column's values under one generation and dtype; every rewrite gets a name of its own
+#   **************************************************************************************
+def _get_column_file(name, generation, dtype):
+    dtype = np.dtype(dtype)
+
+    return f'{name}.{generation}.{dtype.kind}{dtype.itemsize * 8}.bin'
+
+
+#   **************************************************************************************
+def _get_store_files(meta):
+    files = {META_FILE_NAME}
+
+    for column in meta['columns']:
+        files.add(os.path.basename(_get_column_path('', column)))
+        if column['categorical']:
+            files.add(os.path.basename(_get_categories_path('', column)))
+
+    return files
+
+
+#   **************************************************************************************
+def _remove_files(folder, file_names):
+    for file_name in file_names:
+        try:
+            os.remove(join(folder, file_name))
+        except FileNotFoundError:
+            pass
+
+
+#   **************************************************************************************
+def read_meta(folder):
+    with open(join(folder, META_FILE_NAME)) as f:
+        return json.load(f)
+
+
+#   **************************************************************************************
+#   writes the store; used by the ingest process only
+#   **************************************************************************************
+class EventStoreWriter:
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.meta = read_meta(folder) if isfile(join(folder, META_FILE_NAME)) else None
+        self.categories = {}
+
+        # files replaced by the last commit, removed by the next one: a worker that read the
+        # meta.json before has had a commit interval to map them
+        self.replaced_files = set()
+
+        if self.meta is not None:
+            for column in self.meta['columns']:
+                if column['categorical']:
+                    with open(_get_categories_path(folder, column)) as f:
+                        self.categories[column['name']] = json.load(f)
+
+            # bytes written past the committed row count belong to an append that never finished
+            for column in self.meta['columns']:
+                with open(_get_column_path(folder, column), 'r+b') as f:
+                    f.truncate(self.meta['nr_rows'] * np.dtype(column['dtype']).itemsize)
+
+            # and files meta.json does not name to a write or widen that never committed
+            _remove_files(folder, set(os.listdir(folder)) - _get_store_files(self.meta))
+
+    #   **************************************************************************************
+    #   replaces the store with the dataset (indexed by date_time, compact schema); the
+    #   files of the new generation are only named by meta.json once they are complete,
+    #   workers mapping the old ones keep them
+    #   **************************************************************************************
+    def write(self, dataset):
+        os.makedirs(self.folder, exist_ok=True)
+
+        if not dataset.index.is_monotonic_increasing:
+            dataset = dataset.sort_index(kind='stable')
+
+        generation = 0 if self.meta is None else self.meta.get('generation', 0) + 1
+        replaced_files = set() if self.meta is None else _get_store_files(self.meta) - {META_FILE_NAME}
+
+        columns = []
+        self.categories = {}
+
+        for name in [INDEX_COLUMN] + list(dataset.columns):
+            series = pd.Series(dataset.index) if name == INDEX_COLUMN else dataset[name]
+            categorical = series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype)
+
+            # codes start narrow and are widened as categories come in
+            if categorical:
+                self.categories[name] = []
+                dtype = get_codes_dtype(0)
+            else:
+                dtype = series.dtype
+
+            column = {'name': name, 'dtype': str(dtype), 'categorical': categorical,
+                      'file': _get_column_file(name, generation, dtype)}
+            if categorical:
+                column['categories_file'] = f'{name}.{generation}.categories.json'
+
+            columns.append(column)
+
+        self.meta = {'version': STORE_VERSION, 'generation': generation, 'nr_rows': 0, 'sorted': True, 'last': None,
+                     'columns': columns}
+
+        for column, values in zip(self.meta['columns'], self._encode(dataset).values()):
+            values.tofile(_get_column_path(self.folder, column))
+
+        self._commit(dataset, replaced_files)
+
+    #   **************************************************************************************
+    #   appends the rows and then commits the new row count in meta.json; rows older than
+    #   the last stored one are merged in instead
+    #   **************************************************************************************
+    def append(self, dataset):
+        if self.meta is None:
+            return self.write(dataset)
+
+        if len(dataset) == 0:
+            return
+
+        index = dataset.index.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        last = self.meta['last']
+
+        in_order = bool((np.diff(index) >= 0).all()) and (last is None or bool(index[0] >= last))
+        if not (in_order and self.meta['sorted']):
+            return self._merge(dataset)
+
+        replaced_files = set()
+
+        for column, values in zip(self.meta['columns'], self._encode(dataset, replaced_files).values()):
+            with open(_get_column_path(self.folder, column), 'ab') as f:
+                f.write(values.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+        self._commit(dataset, replaced_files)
+
+    #   **************************************************************************************
+    #   stored and new rows merged by date_time (new rows after stored ones of the same
+    #   time) into the files of a new generation, committed like an append; the two runs
+    #   are sorted, so the rows are inserted, not sorted again
+    #   **************************************************************************************
+    def _merge(self, dataset):
+        dataset = dataset.sort_index(kind='stable')
+        nr_rows = self.meta['nr_rows']
+
+        # the stored files as they are, before encoding widens any column
+        stored = [(_get_column_path(self.folder, column), column['dtype']) for column in self.meta['columns']]
+        encoded = self._encode(dataset)
+
+        generation = self.meta.get('generation', 0) + 1
+        self.meta['generation'] = generation
+
+        stored_index = np.fromfile(stored[0][0], dtype=stored[0][1], count=nr_rows).view(np.int64)
+
+        # stores of version 1 could be left unsorted, they are sorted once here
+        order = None if self.meta['sorted'] else np.argsort(stored_index, kind='stable')
+        if order is not None:
+            stored_index = stored_index[order]
+
+        positions = np.searchsorted(stored_index, encoded[INDEX_COLUMN].view(np.int64), side='right')
+
+        replaced_files = set()
+
+        for column, (path, dtype), values in zip(self.meta['columns'], stored, encoded.values()):
+            stored_values = np.fromfile(path, dtype=dtype, count=nr_rows)
+            if order is not None:
+                stored_values = stored_values[order]
+
+            column['file'] = _get_column_file(column['name'], generation, column['dtype'])
+
+            with open(_get_column_path(self.folder, column), 'wb') as f:
+                f.write(np.insert(stored_values.astype(column['dtype']), positions, values).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+            replaced_files.add(os.path.basename(path))
+
+        self.meta['sorted'] = True
+
+        print(f'Event store {self.folder}: merged {len(dataset)} late rows into generation {generation}')
+
+        self._commit(dataset, replaced_files)
+
+    #   **************************************************************************************
+    #   fixed-width values per column, categoricals as codes against the store's categories
+    #   **************************************************************************************
+    def _encode(self, dataset, replaced_files=None):
+        names = [column['name'] for column in self.meta['columns']]
+        if names != [INDEX_COLUMN] + list(dataset.columns):
+            raise ValueError(f'Columns {list(dataset.columns)} do not match the store columns {names[1:]}')
+
+        encoded = {}
+
+        for column in self.meta['columns']:
+            name = column['name']
+
+            if name == INDEX_COLUMN:
+                values = dataset.index.to_numpy(dtype='datetime64[ns]')
+            elif column['categorical']:
+                values = self._get_codes(column, dataset[name], replaced_files)
+            else:
+                values = dataset[name].to_numpy()
+
+            encoded[name] = np.ascontiguousarray(values, dtype=column['dtype'])
+
+        return encoded
+
+    #   **************************************************************************************
+    #   categories first (they only grow, older codes stay valid), meta.json last: a reader
+    #   never maps rows it cannot decode, nor a file under another dtype
+    #   **************************************************************************************
+    def _commit(self, dataset, replaced_files):
+        for column in self.meta['columns']:
+            if column['categorical']:
+                write_json(_get_categories_path(self.folder, column), self.categories[column['name']])
+
+        index = dataset.index.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        last = self.meta['last']
+
+        if len(index) > 0:
+            self.meta['last'] = int(index.max()) if last is None else max(last, int(index.max()))
+            self.meta['nr_rows'] += len(index)
+
+        write_json(join(self.folder, META_FILE_NAME), self.meta)
+
+        _remove_files(self.folder, self.replaced_files)
+        self.replaced_files = replaced_files
+
+    #   **************************************************************************************
+    #   codes against the store's categories; new categories go at the end
+    #   **************************************************************************************
+    def _get_codes(self, column, series, replaced_files):
+        name = column['name']
+        categories = self.categories[name]
+
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype('category')
+
+        labels = [str(category) for category in series.cat.categories]
+        known = set(categories)
+        categories.extend(label for label in labels if label not in known)
+
+        mapping = pd.Index(categories).get_indexer(labels)
+        codes = series.cat.codes.to_numpy()
+        codes = np.where(codes >= 0, mapping[codes], -1)
+
+        dtype = get_codes_dtype(len(categories))
+        if dtype != np.dtype(column['dtype']):
+            self._widen(column, dtype, replaced_files)
+
+        return codes
+
+    #   **************************************************************************************
+    #   more categories than the codes dtype holds: the column is written again in the
+    #   wider dtype to a new file, which the commit names in meta.json; until then workers
+    #   map the old file under the old dtype, and keep it until they reload
+    #   **************************************************************************************
+    def _widen(self, column, dtype, replaced_files):
+        path = _get_column_path(self.folder, column)
+        old_dtype = column['dtype']
+
+        column['dtype'] = str(dtype)
+        column['file'] = _get_column_file(column['name'], self.meta.get('generation', 0), dtype)
+
+        # None while write() lays out a new store, which has no file yet
+        if replaced_files is None:
+            return
+
+        codes = np.fromfile(path, dtype=old_dtype, count=self.meta['nr_rows'])
+
+        with open(_get_column_path(self.folder, column), 'wb') as f:
+            f.write(codes.astype(dtype).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+        replaced_files.add(os.path.basename(path))
+
+
+#   **************************************************************************************
+#   maps the store read-only, returns the dataset indexed by date_time
+#   **************************************************************************************
+def load_event_store(folder):
+    meta = read_meta(folder)
+    nr_rows = meta['nr_rows']
+
+    columns = {}
+    for column in meta['columns']:
+        dtype = np.dtype(column['dtype'])
+
+        if nr_rows == 0:
+            values = np.empty(0, dtype=dtype)
+        else:
+            values = np.memmap(_get_column_path(folder, column), dtype=dtype, mode='r', shape=(nr_rows,))
+
+        if column['categorical']:
+            with open(_get_categories_path(folder, column)) as f:
+                categories = json.load(f)
+
+            values = pd.Categorical.from_codes(values, categories=categories, validate=False)
+
+        columns[column['name']] = values
+
+    index = pd.DatetimeIndex(np.asarray(columns.pop(INDEX_COLUMN)).view('datetime64[ns]'), name=INDEX_COLUMN)
+    dataset = pd.DataFrame(columns, index=index, copy=False)
+
+    # only stores of version 1 can be unsorted
+    if not meta['sorted']:
+        print(f'Event store {folder} is not sorted, sorting a private copy')
+        dataset = dataset.sort_index(kind='stable')
+
+    return dataset, meta
+
+
+#   **************************************************************************************
+#   the dashboard side: same dataset / version / start / listeners interface as
+#   DatasetWatcher, remaps the store whenever the ingest process commits more rows;
+#   listeners get the new rows, or None when late rows were merged in (a new generation)
+#   **************************************************************************************
+class EventStoreReader:
+
+    def __init__(self, folder, interval=60, listeners=None):
+        self.folder = folder
+        self.interval = interval
+        self.listeners = list(listeners or [])
+
+        self.dataset, meta = load_event_store(folder)
+        self.nr_rows = meta['nr_rows']
+        self.generation = meta.get('generation', 0)
+        self.version = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    #   **************************************************************************************
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='event-store-reader', daemon=True)
+            self._thread.start()
+
+    #   **************************************************************************************
+    def stop(self):
+        self._stop.set()
+
+    #   **************************************************************************************
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                print(f'Event store reader failed: {e!r}')
+
+    #   **************************************************************************************
+    #   returns the number of new rows
+    #   **************************************************************************************
+    def poll(self):
+        if read_meta(self.folder)['nr_rows'] == self.nr_rows:
+            return 0
+
+        dataset, meta = load_event_store(self.folder)
+        nr_new_rows = meta['nr_rows'] - self.nr_rows
+
+        # appended in order, the new rows are the last ones
+        generation = meta.get('generation', 0)
+        new_rows = dataset.iloc[self.nr_rows:] if generation == self.generation and meta['sorted'] else None
+
+        self.dataset = dataset
+        self.nr_rows = meta['nr_rows']
+        self.generation = generation
+        self.version += 1
+
+        for listener in self.listeners:
+            try:
+                listener(new_rows)
+            except Exception as e:
+                print(f'Event store reader: listener {listener!r} failed: {e!r}')
+
+        return nr_new_rows
+
+
+#   **************************************************************************************
+#   python -m cgd.event_store FILES_TO_PROCESS EVENT_STORE [interval]
+#   builds the store and, with an interval, keeps appending what the readers write
+#   **************************************************************************************
+if __name__ == '__main__':
+    from cgd.ingest import read_dataset, index_dataset
+    from cgd.tail import DatasetWatcher
+
+    files_folder = sys.argv[1] if len(sys.argv) > 1 else 'FILES_TO_PROCESS'
+    store_folder = sys.argv[2] if len(sys.argv) > 2 else 'EVENT_STORE'
+    interval = float(sys.argv[3]) if len(sys.argv) > 3 else None
+
+    dataset, timings = read_dataset(files_folder)
+    dataset = index_dataset(dataset)
+
+    writer = EventStoreWriter(store_folder)
+    writer.write(dataset)
+    print(f'Event store {store_folder}: {writer.meta["nr_rows"]} rows')
+
+    if interval is not None:
+        watcher = DatasetWatcher(files_folder, dataset, timings, index_dataset, interval=interval,
+                                 listeners=[writer.append])
+
+        while True:
+            time.sleep(interval)
+            watcher.poll()
@@ -0,0 +1,198 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     data export
+#   ---     per-day (or per-week / per-month), per-reader and per-period aggregates and the raw readings of a
+#   ---     time range, as CSV, JSON or Arrow IPC; frames are produced chunk by chunk from row ranges of the
+#   ---     sorted index and encoded as they go, so a long range never sits in memory as a whole
+#   ------------------------------------------------------------------------------------------------------------
+import io
+
+import numpy as np
+import pandas as pd
+
+from cgd.aggregate import GRANULARITIES, get_readings_per_bucket
+from cgd.ranges import get_period_positions, to_ns, to_wall_clock_ns
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# readings per chunk of a raw export or per pass of the per-reader counts
+EXPORT_CHUNK_ROWS = 2**16
+
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8',
+                 'json': 'application/json',
+                 'arrow': 'application/vnd.apache.arrow.stream'}
+
+READER_COLUMNS = ['notebook_reader', 'nr_readings', 'nr_unsuccessful_readings', 'nr_tries', 'nr_notebooks']
+
+
+#   **************************************************************************************
+#   a period end from a request: epoch seconds (as the slider sends them) or a timestamp
+#   text; default when missing, ValueError when unreadable or out of range (inf, nan)
+#   **************************************************************************************
+def parse_time(value, default):
+    if value is None or value == '':
+        return to_ns(default)
+
+    try:
+        try:
+            ns = to_wall_clock_ns(float(value))
+        except ValueError:
+            ns = pd.Timestamp(value).value
+    except (OverflowError, OSError) as e:
+        raise ValueError(f'Time {value!r} is out of range') from e
+
+    if ns == pd.NaT.value:
+        raise ValueError(f'Time {value!r} is not a time')
+
+    return ns
+
+
+#   **************************************************************************************
+def get_content_type(export_format):
+    if export_format not in CONTENT_TYPES:
+        raise ValueError(f'Unknown export format {export_format!r}, expected one of {", ".join(CONTENT_TYPES)}')
+
+    return CONTENT_TYPES[export_format]
+
+
+#   **************************************************************************************
+#   the raw readings between start and end (inclusive) of a dataset sorted by date_time,
+#   in chunks of positional slices; at least one (maybe empty) frame
+#   **************************************************************************************
+def iter_readings(dataset, epoch_ns, start, end, chunk_rows=EXPORT_CHUNK_ROWS):
+    first, last = get_period_positions(epoch_ns, start, end)
+
+    yield dataset.iloc[first:min(last, first + chunk_rows)].reset_index()
+
+    for position in range(first + chunk_rows, last, chunk_rows):
+        yield dataset.iloc[position:min(last, position + chunk_rows)].reset_index()
+
+
+#   **************************************************************************************
+#   per day readings, errors and readers of a period from the daily cube, summed into
+#   weeks ('W') or months ('M') when asked
+#   **************************************************************************************
+def get_day_readings(cube, start, end, granularity='D'):
+    if granularity not in [name for name, _ in GRANULARITIES]:
+        raise ValueError(f'Unknown granularity {granularity!r}, expected D, W or M')
+
+    readings_per_day, _ = cube.summarise(start, end)
+
+    return get_readings_per_bucket(readings_per_day, granularity).reset_index()
+
+
+#   **************************************************************************************
+#   the totals of a period (the dashboard KPIs) as a one-row frame
+#   **************************************************************************************
+def get_period_readings(cube, start, end):
+    _, totals = cube.summarise(start, end)
+
+    return pd.DataFrame([dict(start=pd.Timestamp(to_ns(start)), end=pd.Timestamp(to_ns(end)), **totals)])
+
+
+#   **************************************************************************************
+#   readings, errors, tries and distinct notebooks read per reader over a period; the
+#   counts come from the cube's cells, the (reader, notebook) pairs of the reads from its
+#   row codes a chunk at a time, made distinct once at the end
+#   **************************************************************************************
+def get_reader_readings(cube, start, end, chunk_rows=EXPORT_CHUNK_ROWS):
+    nr_readings, nr_unsuccessful_readings, nr_tries = cube.count_readers(start, end)
+
+    first, last = get_period_positions(cube.index, start, end)
+    nr_readers = len(cube.reader_names)
+    nr_notebooks = max(len(cube.notebook_names), 1)
+
+    pairs = [np.empty(0, dtype=np.int64)]
+    for position in range(first, last, chunk_rows):
+        rows = slice(position, min(last, position + chunk_rows))
+        readers = cube.readers[rows]
+        notebooks = cube.get_read_notebooks(rows)
+
+        read = (readers >= 0) & (notebooks >= 0)
+        pairs.append(readers[read].astype(np.int64) * nr_notebooks + notebooks[read])
+
+    reader_notebooks = np.unique(np.concatenate(pairs))
+
+    readings = pd.DataFrame({'notebook_reader': np.asarray(cube.reader_names, dtype=object),
+                             'nr_readings': nr_readings,
+                             'nr_unsuccessful_readings': nr_unsuccessful_readings,
+                             'nr_tries': nr_tries,
+                             'nr_notebooks': np.bincount(reader_notebooks // nr_notebooks, minlength=nr_readers)},
+                            columns=READER_COLUMNS)
+
+    return readings[readings['nr_readings'] > 0].reset_index(drop=True)
+
+
+#   **************************************************************************************
+#   get_reader_readings as the frames to encode: counted once the response is streamed,
+#   not before it starts
+#   **************************************************************************************
+def iter_reader_readings(cube, start, end):
+    yield get_reader_readings(cube, start, end)
+
+
+#   **************************************************************************************
+def _iter_csv(frames):
+    header = True
+
+    for frame in frames:
+        yield frame.to_csv(index=False, header=header, date_format='%Y-%m-%d %H:%M:%S')
+        header = False
+
+
+#   **************************************************************************************
+#   one json array of records, written a chunk of records at a time
+#   **************************************************************************************
+def _iter_json(frames):
+    separator = '['
+
+    for frame in frames:
+        if len(frame) == 0:
+            continue
+
+        records = frame.to_json(orient='records', date_format='iso')
+        yield separator + records[1:-1]
+        separator = ','
+
+    yield '[]' if separator == '[' else ']'
+
+
+#   **************************************************************************************
+#   an arrow ipc stream, the schema from the first frame and one record batch per frame
+#   **************************************************************************************
+def _iter_arrow(frames, pa):
+    sink = io.BytesIO()
+    writer = None
+
+    for frame in frames:
+        if writer is None:
+            schema = pa.Schema.from_pandas(frame, preserve_index=False)
+            writer = pa.ipc.new_stream(sink, schema)
+
+        writer.write_batch(pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False))
+
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+
+    writer.close()
+    yield sink.getvalue()
+
+
+#   **************************************************************************************
+#   the frames encoded as they are produced; arrow needs pyarrow, which is only imported
+#   here (ImportError before anything is written when it is missing)
+#   **************************************************************************************
+def encode_frames(frames, export_format):
+    get_content_type(export_format)
+
+    if export_format == 'csv':
+        return _iter_csv(frames)
+
+    if export_format == 'json':
+        return _iter_json(frames)
+
+    import pyarrow as pa
+
+    return _iter_arrow(frames, pa)
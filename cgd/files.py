@@ -0,0 +1,16 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     files the dashboards read while they are rewritten
+#   ---     written aside and renamed into place, a reader sees the old content or the new, never half of it
+#   ------------------------------------------------------------------------------------------------------------
+import json
+import os
+
+
+#   **************************************************************************************
+def write_json(path, content):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+
+    with open(tmp_path, 'w') as f:
+        json.dump(content, f)
+
+    os.replace(tmp_path, path)
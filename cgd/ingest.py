@@ -0,0 +1,244 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     ingestion engine: parses the reader files in parallel and assembles the dataset in one concat
+#   ------------------------------------------------------------------------------------------------------------
+import multiprocessing
+import os
+import re
+import threading
+import time
+from io import BytesIO
+from itertools import repeat
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from cgd.cache import get_file_fingerprint, load_cached_file, store_cached_file, prune_cache
+from cgd.readers import split_file_name, get_reader_ids
+from cgd.schema import compact_dataset
+from cgd.timestamps import parse_timestamps, to_datetime64
+
+from os import listdir
+from os.path import isfile, join
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+FILE_COLUMNS = ['date', 'time', 'nr_try', 'reply_data', 'reply_code']
+
+# what read_csv makes of the columns, for a file with no complete line yet
+FILE_DTYPES = {'date': object, 'time': object, 'nr_try': 'int64', 'reply_data': object, 'reply_code': 'int64'}
+
+DATASET_COLUMNS = ['date_time', 'date', 'time', 'hour', 'notebook_reader', 'terminal_id', 'nr_try', 'reply_data',
+                   'reply_code']
+
+# below this many files the pool start-up costs more than it saves
+PARALLEL_MIN_FILES = 4
+
+# date|time|nr_try|reply_data|reply_code, what an appended line must look like to be parsed
+LINE_PATTERN = re.compile(rb'[^|]+\|[^|]+\|\d+\|[^|]*\|-?\d+\r?')
+
+
+#   **************************************************************************************
+def list_files_to_process(folder):
+    return [f for f in listdir(folder) if isfile(join(folder, f))]
+
+
+#   **************************************************************************************
+#   turns the raw lines of one reader file into the typed frame
+#   **************************************************************************************
+def parse_lines(data, file_name):
+    first_file_token, second_file_token, third_file_token = split_file_name(file_name)
+
+    # read file; reply_data stays text even when a chunk only holds error codes (-31)
+    if data.strip():
+        df = pd.read_csv(BytesIO(data), sep='|', header=None, dtype={3: str})
+        df.columns = FILE_COLUMNS
+    else:
+        df = pd.DataFrame({column: pd.Series(dtype=dtype) for column, dtype in FILE_DTYPES.items()})
+
+    # set new column for notebook reader id
+    df['notebook_reader'] = third_file_token
+
+    # the device that wrote the file, the key of the reader registry (a location can have several)
+    df['terminal_id'] = second_file_token
+
+    # make nr_try start at 1
+    df['nr_try'] = df['nr_try'] + 1
+
+    # datetime features, parsed once into epoch nanoseconds
+    date_time, day = parse_timestamps(df['date'].to_numpy(), df['time'].to_numpy())
+    df['date_time'] = to_datetime64(date_time)
+    df['date'] = to_datetime64(day)
+    df['hour'] = to_datetime64(date_time.copy())
+
+    # reorder columns
+    df = df[DATASET_COLUMNS]
+
+    return df
+
+
+#   **************************************************************************************
+#   parse one reader file, returns the typed frame, the seconds it took and the bytes read
+#   up to its last complete line, where the watcher resumes
+#   **************************************************************************************
+def parse_file(folder, file_name):
+    started = time.perf_counter()
+
+    with open(join(folder, file_name), 'rb') as f:
+        data = f.read()
+
+    # a line still being written is left for the watcher, as in parse_appended_lines
+    end = data.rfind(b'\n') + 1
+
+    df = parse_lines(data[:end], file_name)
+
+    return df, time.perf_counter() - started, end
+
+
+#   **************************************************************************************
+#   parse the complete lines written after offset, returns the frame (None when there
+#   are none yet) and the offset to resume from. Blank and malformed lines are skipped,
+#   so they never hold back the lines written after them
+#   **************************************************************************************
+def parse_appended_lines(folder, file_name, offset):
+    with open(join(folder, file_name), 'rb') as f:
+        f.seek(offset)
+        data = f.read()
+
+    # a line still being written is left for the next pass
+    end = data.rfind(b'\n') + 1
+    if end == 0:
+        return None, offset
+
+    lines = [line for line in data[:end].split(b'\n')[:-1] if line.strip()]
+    valid_lines = [line for line in lines if LINE_PATTERN.fullmatch(line)]
+
+    if len(valid_lines) < len(lines):
+        print(f'Skipped {len(lines) - len(valid_lines)} malformed lines of {file_name}')
+
+    if not valid_lines:
+        return None, offset + end
+
+    try:
+        df = parse_lines(b'\n'.join(valid_lines) + b'\n', file_name)
+    except ValueError:
+        # a value the line pattern lets through (e.g. 2022-02-30), parsed line by line to drop it
+        frames = []
+        for line in valid_lines:
+            try:
+                frames.append(parse_lines(line + b'\n', file_name))
+            except ValueError as e:
+                print(f'Skipped a malformed line of {file_name}: {e}')
+
+        df = pd.concat(frames) if frames else None
+
+    return df, offset + end
+
+
+#   **************************************************************************************
+#   fork keeps the pool independent of how the dashboard script was started (spawn and
+#   forkserver import the script again, which loads the dataset); the files are parsed
+#   in-process where fork is not available, and off the main thread (FAST_START's
+#   loader), where forking could copy a lock another thread holds
+#   **************************************************************************************
+def _get_pool_context():
+    if threading.current_thread() is not threading.main_thread():
+        return None
+
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+
+    return None
+
+
+#   **************************************************************************************
+def parse_files(folder, file_names, max_workers=None):
+    context = _get_pool_context()
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    max_workers = min(max_workers, len(file_names))
+
+    if context is None or max_workers < 2 or len(file_names) < PARALLEL_MIN_FILES:
+        return [parse_file(folder, file_name) for file_name in file_names]
+
+    chunksize = max(1, len(file_names) // (max_workers * 4))
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+        # map keeps the listdir order, so the concat below matches the sequential one
+        return list(pool.map(parse_file, repeat(folder), file_names, chunksize=chunksize))
+
+
+#   **************************************************************************************
+#   processes all files, returns the concatenated dataframe and the per-file timings
+#   with a cache folder, only files whose size or mtime changed are parsed again
+#   **************************************************************************************
+def read_dataset(folder, max_workers=None, cache_folder=None):
+    started = time.perf_counter()
+
+    file_names = list_files_to_process(folder)
+    results = {}
+
+    if cache_folder is not None:
+        os.makedirs(cache_folder, exist_ok=True)
+
+        # fingerprint before parsing, so a file written meanwhile is picked up next time
+        fingerprints = {file_name: get_file_fingerprint(folder, file_name) for file_name in file_names}
+
+        for file_name in file_names:
+            load_started = time.perf_counter()
+            cached = load_cached_file(cache_folder, file_name, fingerprints[file_name])
+
+            if cached is not None:
+                df, nr_bytes = cached
+                results[file_name] = (df, time.perf_counter() - load_started, True, nr_bytes)
+
+    files_to_parse = [file_name for file_name in file_names if file_name not in results]
+    parsed = parse_files(folder, files_to_parse, max_workers=max_workers)
+
+    for file_name, (df, seconds, nr_bytes) in zip(files_to_parse, parsed):
+        results[file_name] = (df, seconds, False, nr_bytes)
+
+        if cache_folder is not None and not store_cached_file(cache_folder, file_name, fingerprints[file_name], df,
+                                                              nr_bytes):
+            print(f'Not cached: {file_name} has values the cache cannot store')
+
+    if cache_folder is not None:
+        prune_cache(cache_folder, file_names)
+
+    timings = []
+    for file_name in file_names:
+        df, seconds, cached, nr_bytes = results[file_name]
+        source = 'cache' if cached else 'parsed'
+        print(f'Processed file: {file_name} ({len(df)} rows {source} in {seconds:.3f}s)')
+        timings.append({'file_name': file_name, 'rows': len(df), 'bytes': nr_bytes, 'seconds': seconds,
+                        'cached': cached})
+
+    # single allocation for the whole dataset
+    dataset = pd.concat([results[file_name][0] for file_name in file_names])
+
+    print(f'Processed {len(file_names)} files ({len(dataset)} rows, {len(files_to_parse)} parsed) '
+          f'in {time.perf_counter() - started:.3f}s')
+
+    return dataset, timings
+
+
+#   **************************************************************************************
+#   the dashboards' indexed form: date_time index floored to the second and sorted,
+#   optionally in the compact schema and, given the reader registry, with the reader_id
+#   of each row
+#   **************************************************************************************
+def index_dataset(dataset, compact=True, registry=None):
+    dataset = dataset.set_index('date_time')
+    dataset.index = dataset.index.floor('S')
+    dataset = dataset.sort_index()
+
+    if compact:
+        dataset = compact_dataset(dataset)
+
+    if registry is not None:
+        dataset['reader_id'] = get_reader_ids(dataset['terminal_id'], registry)
+
+    return dataset
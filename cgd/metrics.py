@@ -0,0 +1,201 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     instrumentation
+#   ---     counters, gauges and latency histograms kept in memory and rendered in the prometheus text
+#   ---     format; disabled, timers are a shared no-op and decorators hand back the function unchanged
+#   ------------------------------------------------------------------------------------------------------------
+import threading
+import time
+
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# upper bounds (seconds) of the latency buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = 'cgd_'
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+NO_TIMER = nullcontext()
+
+
+#   **************************************************************************************
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+#   **************************************************************************************
+def _format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+#   **************************************************************************************
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+#   **************************************************************************************
+class _Timer:
+
+    def __init__(self, metrics, name, labels):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.name, time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+#   **************************************************************************************
+#   metrics of one process; values are keyed by name and labels, collectors are called
+#   with the metrics just before rendering (gauges of the dataset, totals counted elsewhere)
+#   **************************************************************************************
+class Metrics:
+
+    def __init__(self, enabled=True, prefix=PREFIX, buckets=LATENCY_BUCKETS):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.collectors = []
+
+        self._lock = threading.Lock()
+
+    #   **************************************************************************************
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    #   **************************************************************************************
+    #   a total counted elsewhere, e.g. the result cache's hits
+    #   **************************************************************************************
+    def set_counter(self, name, value, **labels):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.counters[(name, tuple(sorted(labels.items())))] = value
+
+    #   **************************************************************************************
+    def set_gauge(self, name, value, **labels):
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    #   **************************************************************************************
+    #   one value (seconds) into the histogram of name and labels
+    #   **************************************************************************************
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # per-bucket counts (the last one past every bound), then the sum
+                histogram = self.histograms[key] = [0] * (len(self.buckets) + 1) + [0.0]
+
+            histogram[bisect_left(self.buckets, value)] += 1
+            histogram[-1] += value
+
+    #   **************************************************************************************
+    #   with metrics.time('ingest_stage_seconds', stage='read_dataset'): ...
+    #   **************************************************************************************
+    def time(self, name, **labels):
+        if not self.enabled:
+            return NO_TIMER
+
+        return _Timer(self, name, labels)
+
+    #   **************************************************************************************
+    #   decorator timing every call of a function
+    #   **************************************************************************************
+    def timed(self, name, **labels):
+        def decorate(function):
+            if not self.enabled:
+                return function
+
+            @wraps(function)
+            def timed_function(*args, **kwargs):
+                with _Timer(self, name, labels):
+                    return function(*args, **kwargs)
+
+            return timed_function
+
+        return decorate
+
+    #   **************************************************************************************
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    #   **************************************************************************************
+    #   the prometheus text exposition of every metric
+    #   **************************************************************************************
+    def render(self):
+        if not self.enabled:
+            return ''
+
+        for collector in self.collectors:
+            collector(self)
+
+        with self._lock:
+            counters = sorted(self.counters.items())
+            gauges = sorted(self.gauges.items())
+            histograms = sorted((key, list(histogram)) for key, histogram in self.histograms.items())
+
+        lines = []
+        typed = set()
+
+        def add_type(name, metric_type):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {self.prefix}{name} {metric_type}')
+
+        for (name, labels), value in counters:
+            add_type(name, 'counter')
+            lines.append(f'{self.prefix}{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for (name, labels), value in gauges:
+            add_type(name, 'gauge')
+            lines.append(f'{self.prefix}{name}{_format_labels(labels)} {_format_value(value)}')
+
+        for (name, labels), histogram in histograms:
+            add_type(name, 'histogram')
+
+            count = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), histogram[:-1]):
+                count += bucket_count
+                lines.append(f'{self.prefix}{name}_bucket{_format_labels(labels, [("le", _format_value(bound))])} {count}')
+
+            lines.append(f'{self.prefix}{name}_sum{_format_labels(labels)} {_format_value(histogram[-1])}')
+            lines.append(f'{self.prefix}{name}_count{_format_labels(labels)} {count}')
+
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,119 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     prefix-sum index of the readings
+#   ---     cumulative unsuccessful readings per row of the time-sorted dataset and per reader, so the
+#   ---     count over any range is two lookups and a subtraction; the sorted index is itself the prefix
+#   ---     sum of the readings (a row's position is the count before it)
+#   ------------------------------------------------------------------------------------------------------------
+import copy
+
+import numpy as np
+
+from cgd.aggregate import UNSUCCESSFUL_REPLY_CODE
+from cgd.ranges import get_period_positions, to_ns
+from cgd.timestamps import NS_PER_SECOND
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# reader seconds are counted from the first reading, 136 years fit
+MAX_READER_SECOND = np.iinfo(np.uint32).max
+
+
+#   **************************************************************************************
+#   leading zero, then the running total; int32 while the rows fit
+#   **************************************************************************************
+def _get_cumulative(values):
+    dtype = np.int32 if len(values) < np.iinfo(np.int32).max else np.int64
+
+    cumulative = np.zeros(len(values) + 1, dtype=dtype)
+    np.cumsum(values, out=cumulative[1:])
+
+    return cumulative
+
+
+#   **************************************************************************************
+#   epoch_ns sorted (a view of the dataset's index, kept, not copied); readers are integer
+#   codes (-1 unknown)
+#   **************************************************************************************
+class PrefixCounts:
+
+    def __init__(self, epoch_ns, readers, reply_codes):
+        self.epoch_ns = epoch_ns
+        self.unsuccessful = _get_cumulative(reply_codes == UNSUCCESSFUL_REPLY_CODE)
+
+        # rows grouped by reader, still in time order within each reader
+        self.first_second = int(epoch_ns[0]) // NS_PER_SECOND if len(epoch_ns) else 0
+
+        order = np.argsort(readers, kind='stable')
+        self.reader_seconds = (epoch_ns[order] // NS_PER_SECOND - self.first_second).astype(np.uint32)
+        self.reader_bounds = np.searchsorted(readers[order], np.arange(int(readers.max(initial=-1)) + 2))
+        self.reader_unsuccessful = _get_cumulative(reply_codes[order] == UNSUCCESSFUL_REPLY_CODE)
+
+    #   **************************************************************************************
+    #   the prefix counts of epoch_ns, readers and reply_codes, which are this one's rows
+    #   followed by nr_new_rows newer ones: the new rows are inserted at the end of their
+    #   readers' runs instead of sorting every row again. This one is not modified
+    #   **************************************************************************************
+    def extend(self, epoch_ns, readers, reply_codes, nr_new_rows):
+        nr_rows = len(epoch_ns) - nr_new_rows
+        if nr_rows == 0:
+            return PrefixCounts(epoch_ns, readers, reply_codes)
+
+        prefix = copy.copy(self)
+        prefix.epoch_ns = epoch_ns
+        prefix.unsuccessful = _get_cumulative(reply_codes == UNSUCCESSFUL_REPLY_CODE)
+
+        order = np.argsort(readers[nr_rows:], kind='stable')
+        new_readers = readers[nr_rows:][order]
+
+        # readers seen for the first time start empty runs at the end
+        nr_bounds = max(len(self.reader_bounds), int(readers.max(initial=-1)) + 2)
+        bounds = np.append(self.reader_bounds, np.full(nr_bounds - len(self.reader_bounds), nr_rows))
+        positions = bounds[new_readers + 1]
+
+        new_seconds = (epoch_ns[nr_rows:][order] // NS_PER_SECOND - self.first_second).astype(np.uint32)
+        prefix.reader_seconds = np.insert(self.reader_seconds, positions, new_seconds)
+        prefix.reader_bounds = bounds + np.searchsorted(new_readers, np.arange(nr_bounds))
+
+        unsuccessful = np.insert(np.diff(self.reader_unsuccessful) > 0, positions,
+                                 reply_codes[nr_rows:][order] == UNSUCCESSFUL_REPLY_CODE)
+        prefix.reader_unsuccessful = _get_cumulative(unsuccessful)
+
+        return prefix
+
+    #   **************************************************************************************
+    #   readings and unsuccessful readings between start and end (inclusive), of one
+    #   reader when given its code
+    #   **************************************************************************************
+    def count(self, start, end, reader=None):
+        start = to_ns(start)
+        end = to_ns(end)
+
+        if reader is not None:
+            return self._count_reader(reader, start, end)
+
+        first, last = get_period_positions(self.epoch_ns, start, end)
+
+        return last - first, int(self.unsuccessful[last] - self.unsuccessful[first])
+
+    #   **************************************************************************************
+    #   the index is floored to the second, so a range keeps the whole seconds it covers
+    #   **************************************************************************************
+    def _count_reader(self, reader, start, end):
+        if reader < 0 or reader + 1 >= len(self.reader_bounds):
+            return 0, 0
+
+        start_second = max(-(-start // NS_PER_SECOND) - self.first_second, 0)
+        end_second = min(end // NS_PER_SECOND - self.first_second, MAX_READER_SECOND)
+        if end_second < start_second:
+            return 0, 0
+
+        reader_start = self.reader_bounds[reader]
+        reader_end = self.reader_bounds[reader + 1]
+        seconds = self.reader_seconds[reader_start:reader_end]
+
+        first = reader_start + np.searchsorted(seconds, np.uint32(start_second), side='left')
+        last = max(first, reader_start + np.searchsorted(seconds, np.uint32(end_second), side='right'))
+
+        return int(last - first), int(self.reader_unsuccessful[last] - self.reader_unsuccessful[first])
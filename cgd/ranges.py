@@ -0,0 +1,69 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     time-range queries on the date_time index
+#   ---     binary search on the int64 epoch view of a sorted index, periods come back as positional
+#   ---     slices (views) instead of full-length boolean masks and copies
+#   ------------------------------------------------------------------------------------------------------------
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+#   **************************************************************************************
+#   slider value (epoch seconds) -> the index's naive local wall-clock time in ns, the
+#   conversion datetime.fromtimestamp does; the slider ends come from datetime.timestamp
+#   of index values, which reads them as local time, so the round trip is exact
+#   **************************************************************************************
+def to_wall_clock_ns(epoch_seconds):
+    return pd.Timestamp(datetime.fromtimestamp(epoch_seconds)).value
+
+
+#   **************************************************************************************
+#   ns since the epoch of a timestamp, a datetime or a value already in ns
+#   **************************************************************************************
+def to_ns(value):
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+
+    return pd.Timestamp(value).value
+
+
+#   **************************************************************************************
+#   int64 view of the index, no copy
+#   **************************************************************************************
+def get_epoch_ns(index):
+    return index.asi8
+
+
+#   **************************************************************************************
+#   epoch ns of each row, from a date_time index or a date_time column
+#   **************************************************************************************
+def get_row_epoch_ns(dataset):
+    if isinstance(dataset.index, pd.DatetimeIndex):
+        return get_epoch_ns(dataset.index)
+
+    return dataset['date_time'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+#   **************************************************************************************
+#   first and past-the-end positions of the readings between start and end (inclusive)
+#   **************************************************************************************
+def get_period_positions(epoch_ns, start, end):
+    first = np.searchsorted(epoch_ns, to_ns(start), side='left')
+    last = np.searchsorted(epoch_ns, to_ns(end), side='right')
+
+    return int(first), int(max(first, last))
+
+
+#   **************************************************************************************
+#   readings between start and end (inclusive); a positional slice of a sorted index,
+#   the boolean mask otherwise
+#   **************************************************************************************
+def slice_period(df, start, end):
+    if not df.index.is_monotonic_increasing:
+        epoch_ns = get_epoch_ns(df.index)
+        return df[(epoch_ns >= to_ns(start)) & (epoch_ns <= to_ns(end))]
+
+    first, last = get_period_positions(get_epoch_ns(df.index), start, end)
+
+    return df.iloc[first:last]
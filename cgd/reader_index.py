@@ -0,0 +1,55 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     per-reader row index
+#   ---     the rows sorted by reader (then time) once, each reader a contiguous range of positions; reader
+#   ---     drilldowns over a period are lookups instead of string scans. Retry histograms are cgd.retries'
+#   ------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from cgd.aggregate import get_codes
+from cgd.ranges import get_row_epoch_ns, to_ns
+
+
+#   **************************************************************************************
+class ReaderIndex:
+
+    def __init__(self, dataset):
+        codes, names = get_codes(dataset['notebook_reader'])
+        self.names = pd.Index(names)
+
+        epoch_ns = get_row_epoch_ns(dataset)
+
+        # rows by reader, in time order within a reader; unknown readers (-1) first
+        positions = np.lexsort((epoch_ns, codes))
+        self.bounds = np.searchsorted(codes[positions], np.arange(len(self.names) + 1))
+
+        self.epoch_ns = epoch_ns[positions]
+
+    #   **************************************************************************************
+    #   sorted positions of one reader, between start and end (inclusive) when given
+    #   **************************************************************************************
+    def _get_range(self, notebook_reader, start=None, end=None):
+        code = self.names.get_indexer([notebook_reader])[0]
+        if code < 0:
+            return 0, 0
+
+        first = self.bounds[code]
+        last = self.bounds[code + 1]
+
+        if start is not None:
+            first += np.searchsorted(self.epoch_ns[first:last], to_ns(start), side='left')
+        if end is not None:
+            last = first + np.searchsorted(self.epoch_ns[first:last], to_ns(end), side='right')
+
+        return first, last
+
+    #   **************************************************************************************
+    #   first and last reading time of one reader, between start and end (inclusive) when
+    #   given; None when it has no readings there
+    #   **************************************************************************************
+    def get_period(self, notebook_reader, start=None, end=None):
+        first, last = self._get_range(notebook_reader, start, end)
+        if first == last:
+            return None
+
+        return pd.Timestamp(self.epoch_ns[first]), pd.Timestamp(self.epoch_ns[last - 1])
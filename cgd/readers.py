@@ -0,0 +1,149 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     reader dimension registry
+#   ---     built from the file names (10098783-CGD0557MACTLL25-OLIVAIS-LX.txt: job id, terminal id, location),
+#   ---     one reader per terminal; rows refer to it through the small integer reader_id of their file's terminal
+#   ------------------------------------------------------------------------------------------------------------
+import json
+
+import numpy as np
+import pandas as pd
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+REGISTRY_COLUMNS = ['location', 'terminal_id', 'branch', 'model', 'job_id', 'nr_files']
+
+READER_ID_DTYPE = np.int16
+
+# the terminal id is bank, 4-digit branch, then the device type ending in the model
+MODEL_LENGTH = 4
+
+
+#   **************************************************************************************
+#   split file name
+#   **************************************************************************************
+def split_file_name(file_name):
+    first_file_token = file_name[:file_name.find('-')]
+    rest_of_str = file_name[file_name.find('-') + 1:]
+
+    second_file_token = rest_of_str[:rest_of_str.find('-')]
+    third_file_token = rest_of_str[rest_of_str.find('-') + 1:]
+    third_file_token = third_file_token[:-4]
+
+    return first_file_token, second_file_token, third_file_token
+
+
+#   **************************************************************************************
+#   CGD0557MACTLL25 -> (557, 'LL25'); branch -1 when it is not numeric
+#   **************************************************************************************
+def parse_terminal_id(terminal_id):
+    branch = terminal_id[3:7]
+    branch = int(branch) if branch.isdigit() else -1
+
+    return branch, terminal_id[-MODEL_LENGTH:]
+
+
+#   **************************************************************************************
+#   returns the registry extended with the readers of file_names, indexed by reader_id
+#   readers are keyed by terminal id (the terminal_id of the rows), so two terminals at
+#   one location are two readers with their own branch and model; ids already given
+#   never change, new readers are added at the end; job id and location are the ones
+#   of the reader's latest file
+#   **************************************************************************************
+def update_reader_registry(registry, file_names):
+    readers = {}
+
+    for file_name in file_names:
+        job_id, terminal_id, location = split_file_name(file_name)
+        job_id = int(job_id) if job_id.isdigit() else -1
+
+        reader = readers.setdefault(terminal_id, {'terminal_id': terminal_id, 'job_id': job_id, 'location': location,
+                                                  'nr_files': 0})
+        reader['nr_files'] += 1
+
+        if job_id >= reader['job_id']:
+            reader['job_id'] = job_id
+            reader['location'] = location
+
+    terminal_ids = [] if registry is None else list(registry['terminal_id'])
+    known = set(terminal_ids)
+
+    # new readers in job order, so a folder listing order does not decide the ids
+    terminal_ids += sorted((terminal_id for terminal_id in readers if terminal_id not in known),
+                           key=lambda terminal_id: (readers[terminal_id]['job_id'], terminal_id))
+
+    rows = []
+    for reader_id, terminal_id in enumerate(terminal_ids):
+        if terminal_id in readers:
+            reader = readers[terminal_id]
+        else:
+            reader = registry.loc[reader_id].to_dict()
+
+        branch, model = parse_terminal_id(terminal_id)
+        rows.append({'location': reader['location'], 'terminal_id': terminal_id, 'branch': branch, 'model': model,
+                     'job_id': reader['job_id'], 'nr_files': reader['nr_files']})
+
+    registry = pd.DataFrame(rows, columns=REGISTRY_COLUMNS)
+    registry.index = pd.RangeIndex(len(registry), name='reader_id')
+    registry = registry.astype({'branch': np.int16, 'model': 'category', 'job_id': np.int64, 'nr_files': np.int32})
+
+    return registry
+
+
+#   **************************************************************************************
+#   reader_id of each row, -1 for a terminal_id the registry does not know
+#   **************************************************************************************
+def get_reader_ids(terminal_id, registry):
+    terminal_ids = pd.Index(registry['terminal_id'])
+
+    if isinstance(terminal_id.dtype, pd.CategoricalDtype):
+        # one lookup per category (per file), then an integer take per row
+        mapping = np.append(terminal_ids.get_indexer(terminal_id.cat.categories), -1)
+        return mapping[terminal_id.cat.codes.to_numpy()].astype(READER_ID_DTYPE)
+
+    return terminal_ids.get_indexer(terminal_id).astype(READER_ID_DTYPE)
+
+
+#   **************************************************************************************
+#   reader_ids matching every given attribute, e.g. select_readers(registry, model='LL25')
+#   **************************************************************************************
+def select_readers(registry, **attributes):
+    mask = np.ones(len(registry), dtype=bool)
+
+    for column, value in attributes.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        mask &= registry[column].isin(values).to_numpy()
+
+    return registry.index.to_numpy()[mask]
+
+
+#   **************************************************************************************
+def filter_by_readers(dataset, reader_ids):
+    return dataset[np.isin(dataset['reader_id'].to_numpy(), reader_ids)]
+
+
+#   **************************************************************************************
+#   row counts per registry attribute, grouping on the integer key only
+#   **************************************************************************************
+def count_by_reader_attribute(dataset, registry, column):
+    counts = np.bincount(dataset['reader_id'].to_numpy()[dataset['reader_id'].to_numpy() >= 0],
+                         minlength=len(registry))
+
+    return pd.Series(counts, index=registry.index).groupby(registry[column], observed=True).sum()
+
+
+#   **************************************************************************************
+def save_reader_registry(registry, path):
+    with open(path, 'w') as f:
+        json.dump(registry.reset_index().astype({'model': str}).to_dict(orient='records'), f)
+
+
+#   **************************************************************************************
+def load_reader_registry(path):
+    with open(path) as f:
+        registry = pd.DataFrame(json.load(f))
+
+    registry = registry.set_index('reader_id')[REGISTRY_COLUMNS]
+
+    return registry.astype({'branch': np.int16, 'model': 'category', 'job_id': np.int64, 'nr_files': np.int32})
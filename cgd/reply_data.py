@@ -0,0 +1,165 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     structured decoding of reply_data
+#   ---     an error reply is just the code (-31), a read notebook is a masked record such as
+#   ---     :0557*********=0=00=0000000000009=9=  (branch, masked account, then four numeric fields).
+#   ---     Each distinct value is decoded once into a lookup table keyed by its reply_data code; rows
+#   ---     refer to it by that code, the dataset carries no decoded columns
+#   ------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# the layout almost every reader writes; B branch, * masked account, 1/2/N/4 the numeric fields
+RECORD_LAYOUT = ':BBBB*********=1=22=NNNNNNNNNNNNN=4='
+
+# anything else that still looks like a record; no more digits than the field's dtype holds,
+# a record with longer fields is not decoded
+RECORD_PATTERN = (r'^:(?P<branch>\d{1,4})(?!\d)(?P<account>[^=]*)=(?P<field_1>\d{1,4})=(?P<field_2>\d{1,4})='
+                  r'(?P<number>\d{1,18})(?!\d)[=:]?(?P<field_4>\d{0,4})(?![=:]?\d)')
+
+# typed fields of the lookup table; reply_error is 0 and the record fields -1 where they do not apply
+REPLY_COLUMNS = {'reply_error': np.int16,
+                 'reply_branch': np.int16,
+                 'reply_field_1': np.int16,
+                 'reply_field_2': np.int16,
+                 'reply_number': np.int64,
+                 'reply_field_4': np.int16}
+
+# the masked account key, '' where it does not apply
+REPLY_ACCOUNT_COLUMN = 'reply_account'
+
+
+#   **************************************************************************************
+def _get_number(characters, symbol):
+    number = np.zeros(len(characters), dtype=np.int64)
+
+    for position, layout_symbol in enumerate(RECORD_LAYOUT):
+        if layout_symbol == symbol:
+            number = number * 10 + (characters[:, position].astype(np.int64) - 48)
+
+    return number
+
+
+#   **************************************************************************************
+#   fixed-width records straight from their bytes, returns the mask of values decoded
+#   **************************************************************************************
+def _decode_fixed_records(values, fields, accounts):
+    width = len(RECORD_LAYOUT)
+
+    try:
+        encoded = values.astype(f'S{width + 1}')
+    except UnicodeEncodeError:
+        return np.zeros(len(values), dtype=bool)
+
+    characters = np.frombuffer(encoded.tobytes(), dtype=np.uint8).reshape(len(values), width + 1)
+
+    # one spare byte shows up longer values
+    is_record = characters[:, width] == 0
+
+    for position, symbol in enumerate(RECORD_LAYOUT):
+        column = characters[:, position]
+
+        if symbol in 'B124N':
+            is_record &= (column >= 48) & (column <= 57)
+        elif symbol != '*':
+            is_record &= column == ord(symbol)
+
+    rows = characters[is_record]
+
+    fields['reply_branch'][is_record] = _get_number(rows, 'B')
+    fields['reply_field_1'][is_record] = _get_number(rows, '1')
+    fields['reply_field_2'][is_record] = _get_number(rows, '2')
+    fields['reply_number'][is_record] = _get_number(rows, 'N')
+    fields['reply_field_4'][is_record] = _get_number(rows, '4')
+
+    account_start = RECORD_LAYOUT.index('*')
+    account_end = RECORD_LAYOUT.rindex('*') + 1
+    account = np.ascontiguousarray(rows[:, account_start:account_end])
+    accounts[is_record] = account.view(f'S{account_end - account_start}').ravel().astype(str)
+
+    return is_record
+
+
+#   **************************************************************************************
+#   the few records off the fixed layout go through the regular expression
+#   **************************************************************************************
+def _decode_other_records(values, fields, accounts, pending):
+    if not pending.any():
+        return
+
+    parts = pd.Series(values[pending]).str.extract(RECORD_PATTERN)
+    matched = parts['branch'].notna().to_numpy()
+    positions = np.flatnonzero(pending)[matched]
+    parts = parts[matched]
+
+    fields['reply_branch'][positions] = parts['branch'].astype(np.int64)
+    fields['reply_field_1'][positions] = parts['field_1'].astype(np.int64)
+    fields['reply_field_2'][positions] = parts['field_2'].astype(np.int64)
+    fields['reply_number'][positions] = parts['number'].astype(np.int64)
+    fields['reply_field_4'][positions] = pd.to_numeric(parts['field_4'], errors='coerce').fillna(-1).astype(np.int64)
+    accounts[positions] = parts['account'].to_numpy(dtype=str)
+
+
+#   **************************************************************************************
+#   decodes each distinct value once, returns a frame of typed fields aligned with values
+#   **************************************************************************************
+def decode_reply_values(values):
+    values = np.asarray(values).astype(str)
+
+    fields = {column: np.full(len(values), -1, dtype=np.int64) for column in REPLY_COLUMNS}
+    accounts = np.full(len(values), '', dtype=object)
+
+    # error replies are plain integers, those beyond reply_error's dtype are not decoded
+    errors = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=float)
+    limits = np.iinfo(REPLY_COLUMNS['reply_error'])
+    is_error = ~np.isnan(errors) & (errors >= limits.min) & (errors <= limits.max)
+    fields['reply_error'] = np.where(is_error, errors, 0).astype(np.int64)
+
+    is_record = _decode_fixed_records(values, fields, accounts)
+    _decode_other_records(values, fields, accounts, ~is_error & ~is_record)
+
+    decoded = pd.DataFrame({column: fields[column].astype(dtype) for column, dtype in REPLY_COLUMNS.items()})
+    decoded[REPLY_ACCOUNT_COLUMN] = pd.Categorical(accounts)
+
+    return decoded
+
+
+#   **************************************************************************************
+#   integer code per row, equal codes for equal reply_data, -1 for missing values
+#   **************************************************************************************
+def get_reply_codes(reply_data):
+    if isinstance(reply_data.dtype, pd.CategoricalDtype):
+        return reply_data.cat.codes.to_numpy(), reply_data.cat.categories.to_numpy()
+
+    codes, uniques = pd.factorize(reply_data)
+
+    return codes, np.asarray(uniques)
+
+
+#   **************************************************************************************
+#   the row codes of reply_data and its lookup table: one row of typed fields per code
+#   **************************************************************************************
+def get_reply_table(reply_data):
+    codes, uniques = get_reply_codes(reply_data)
+
+    return codes, decode_reply_values(uniques)
+
+
+#   **************************************************************************************
+#   readings per error code (-31, ...): the rows are counted per reply_data code, then
+#   summed per error code of the table, no per-row decoding
+#   **************************************************************************************
+def get_error_breakdown(reply_data):
+    codes, table = get_reply_table(reply_data)
+
+    nr_readings = np.bincount(codes[codes >= 0], minlength=len(table))
+    errors = table['reply_error'].to_numpy()
+    is_error = (errors != 0) & (nr_readings > 0)
+
+    breakdown = pd.Series(nr_readings[is_error], index=pd.Index(errors[is_error], name='reply_error'),
+                          name='nr_readings')
+
+    return breakdown.groupby(level=0).sum()
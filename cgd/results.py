@@ -0,0 +1,105 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     bounded LRU cache of computed callback results
+#   ---     entries are tied to a dataset version: the first lookup with a new version drops them all
+#   ------------------------------------------------------------------------------------------------------------
+import threading
+
+from collections import OrderedDict
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+MAX_ENTRIES = 256
+
+MAX_BYTES = 64 * 2**20
+
+
+#   **************************************************************************************
+#   evicts the least recently used entries past max_entries or past max_bytes (as sized
+#   by the caller); safe to share between the server's threads
+#   **************************************************************************************
+class ResultCache:
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.entries = OrderedDict()
+        self.nr_bytes = 0
+        self.version = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+
+    #   **************************************************************************************
+    #   the cached value, None on a miss
+    #   **************************************************************************************
+    def get(self, version, key):
+        with self._lock:
+            self._check_version(version)
+
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[0]
+
+    #   **************************************************************************************
+    def put(self, version, key, value, nr_bytes):
+        with self._lock:
+            self._check_version(version)
+
+            # a result computed on an older dataset is not kept
+            if version != self.version or nr_bytes > self.max_bytes:
+                return
+
+            if key in self.entries:
+                self.nr_bytes -= self.entries.pop(key)[1]
+
+            self.entries[key] = (value, nr_bytes)
+            self.nr_bytes += nr_bytes
+
+            while len(self.entries) > self.max_entries or self.nr_bytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.nr_bytes -= evicted_bytes
+                self.evictions += 1
+
+    #   **************************************************************************************
+    #   versions only move forward, an older one (a callback that started before the reload)
+    #   leaves the cache alone
+    #   **************************************************************************************
+    def _check_version(self, version):
+        if self.version is None or version > self.version:
+            if self.entries:
+                self.invalidations += 1
+
+            self.entries.clear()
+            self.nr_bytes = 0
+            self.version = version
+
+    #   **************************************************************************************
+    #   drops every entry, e.g. to time uncached results
+    #   **************************************************************************************
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.nr_bytes = 0
+
+    #   **************************************************************************************
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {'entries': len(self.entries), 'bytes': self.nr_bytes, 'version': self.version,
+                    'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'invalidations': self.invalidations,
+                    'hit_ratio': round(self.hits / lookups, 3) if lookups else None}
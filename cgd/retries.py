@@ -0,0 +1,185 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     retry analytics
+#   ---     readings counted per day x reader x reply_code x nr_try in one integer array, grown as rows
+#   ---     come in (days by doubling, so an append costs its rows, not the array); retry distributions
+#   ---     and rates of any reader and period are sums over slices of it
+#   ------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from cgd.ranges import get_row_epoch_ns, to_ns
+from cgd.timestamps import floor_to_day, to_datetime64
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+COUNTS_DTYPE = np.int32
+
+# a reading that needed more than the first try
+FIRST_TRY = 1
+
+
+#   **************************************************************************************
+#   values merged into an axis, sorted unless it keeps insertion order; returns the new
+#   axis and where the old positions moved to
+#   **************************************************************************************
+def _extend_axis(axis, values, keep_order=False):
+    new_values = pd.Index(values).unique().difference(axis, sort=False)
+
+    if keep_order:
+        extended = axis.append(new_values)
+    else:
+        extended = axis.append(new_values).sort_values()
+
+    return extended, extended.get_indexer(axis)
+
+
+#   **************************************************************************************
+class RetryHistograms:
+
+    def __init__(self):
+        self.days = pd.Index([], dtype=np.int64)
+        self.readers = pd.Index([], dtype=object)
+        self.reply_codes = pd.Index([], dtype=np.int64)
+        self.nr_tries = pd.Index([], dtype=np.int64)
+
+        # allocated for more days than there are, counts is the part in use
+        self._counts = np.zeros((0, 0, 0, 0), dtype=COUNTS_DTYPE)
+
+    #   **************************************************************************************
+    @property
+    def counts(self):
+        return self._counts[:len(self.days)]
+
+    #   **************************************************************************************
+    #   counts the readings of a frame (the initial dataset or rows appended later) into the
+    #   histograms, growing the axes for new days, readers, reply codes and tries
+    #   **************************************************************************************
+    def add(self, df):
+        if len(df) == 0:
+            return
+
+        days = floor_to_day(get_row_epoch_ns(df))
+        readers = df['notebook_reader'].astype(str).to_numpy()
+        reply_codes = df['reply_code'].to_numpy().astype(np.int64)
+        nr_tries = df['nr_try'].to_numpy().astype(np.int64)
+
+        self._grow(days, readers, reply_codes, nr_tries)
+
+        positions = np.ravel_multi_index((self.days.get_indexer(days), self.readers.get_indexer(readers),
+                                          self.reply_codes.get_indexer(reply_codes), self.nr_tries.get_indexer(nr_tries)),
+                                         self.counts.shape)
+
+        # only the cells the rows fall in are touched
+        positions, counts = np.unique(positions, return_counts=True)
+        self._counts.reshape(-1)[positions] += counts.astype(COUNTS_DTYPE)
+
+    #   **************************************************************************************
+    #   days after the last one go into the spare rows of the array; other new values (a
+    #   day before the last, a reader, a code, a try) move the counts into a new one
+    #   **************************************************************************************
+    def _grow(self, days, readers, reply_codes, nr_tries):
+        axes = [_extend_axis(self.days, days),
+                _extend_axis(self.readers, readers, keep_order=True),
+                _extend_axis(self.reply_codes, reply_codes),
+                _extend_axis(self.nr_tries, nr_tries)]
+
+        shape = tuple(len(axis) for axis, _ in axes)
+        if shape == self.counts.shape:
+            return
+
+        nr_days = len(self.days)
+        appended = shape[1:] == self.counts.shape[1:] and (axes[0][1] == np.arange(nr_days)).all()
+
+        if not appended or shape[0] > len(self._counts):
+            capacity = len(self._counts) if shape[0] <= len(self._counts) else max(shape[0], 2 * len(self._counts))
+
+            counts = np.zeros((capacity,) + shape[1:], dtype=COUNTS_DTYPE)
+            counts[np.ix_(*(moved for _, moved in axes))] = self.counts
+            self._counts = counts
+
+        self.days, self.readers, self.reply_codes, self.nr_tries = (axis for axis, _ in axes)
+
+    #   **************************************************************************************
+    #   the days x reply_code x nr_try slice of one reader (or all of them) and a period
+    #   (first to last day, inclusive; timestamps or ns)
+    #   **************************************************************************************
+    def _select(self, notebook_reader=None, first_day=None, last_day=None):
+        first = 0 if first_day is None else np.searchsorted(self.days, floor_to_day(to_ns(first_day)), side='left')
+        last = len(self.days) if last_day is None else np.searchsorted(self.days, floor_to_day(to_ns(last_day)), side='right')
+
+        counts = self.counts[first:max(first, last)]
+
+        if notebook_reader is None:
+            return counts.sum(axis=1)
+
+        reader = self.readers.get_indexer([notebook_reader])[0]
+        if reader < 0:
+            return np.zeros((0, len(self.reply_codes), len(self.nr_tries)), dtype=COUNTS_DTYPE)
+
+        return counts[:, reader]
+
+    #   **************************************************************************************
+    #   readings per nr_try (the tries that occur), optionally of one reply_code only; the
+    #   same as value_counts().sort_index() over the rows
+    #   **************************************************************************************
+    def get_retry_histogram(self, notebook_reader=None, first_day=None, last_day=None, reply_code=None):
+        counts = self._select(notebook_reader, first_day, last_day)
+
+        if reply_code is not None:
+            code = self.reply_codes.get_indexer([reply_code])[0]
+            counts = counts[:, code:code + 1] if code >= 0 else counts[:, :0]
+
+        counts = counts.sum(axis=(0, 1), dtype=np.int64)
+        present = counts > 0
+
+        return pd.Series(counts[present], index=pd.Index(self.nr_tries[present], name='nr_try'), name='count')
+
+    #   **************************************************************************************
+    #   readings per day and nr_try, one column per try
+    #   **************************************************************************************
+    def get_daily_retries(self, notebook_reader=None, first_day=None, last_day=None):
+        counts = self._select(notebook_reader, first_day, last_day).sum(axis=1, dtype=np.int64)
+
+        first = 0 if first_day is None else np.searchsorted(self.days, floor_to_day(to_ns(first_day)), side='left')
+        days = self.days[first:first + len(counts)]
+
+        return pd.DataFrame(counts, columns=pd.Index(self.nr_tries, name='nr_try'),
+                            index=pd.DatetimeIndex(to_datetime64(days.to_numpy()), name='date'))
+
+    #   **************************************************************************************
+    #   share of the readings that needed more than the first try, per day and overall
+    #   **************************************************************************************
+    def get_retry_rates(self, notebook_reader=None, first_day=None, last_day=None):
+        daily_retries = self.get_daily_retries(notebook_reader, first_day, last_day)
+
+        nr_readings = daily_retries.sum(axis=1)
+        nr_retried = daily_retries.loc[:, daily_retries.columns > FIRST_TRY].sum(axis=1)
+
+        daily_rates = (nr_retried / nr_readings).where(nr_readings > 0)
+        rate = nr_retried.sum() / nr_readings.sum() if nr_readings.sum() > 0 else 0.0
+
+        return daily_rates.rename('retry_rate'), float(rate)
+
+
+#   **************************************************************************************
+def save_retry_histograms(histograms, path):
+    with open(path, 'wb') as f:
+        np.savez(f, days=histograms.days.to_numpy(), readers=histograms.readers.to_numpy(dtype=str),
+                 reply_codes=histograms.reply_codes.to_numpy(), nr_tries=histograms.nr_tries.to_numpy(),
+                 counts=histograms.counts)
+
+
+#   **************************************************************************************
+def load_retry_histograms(path):
+    histograms = RetryHistograms()
+
+    with np.load(path) as arrays:
+        histograms.days = pd.Index(arrays['days'], dtype=np.int64)
+        histograms.readers = pd.Index(arrays['readers'].astype(object), dtype=object)
+        histograms.reply_codes = pd.Index(arrays['reply_codes'], dtype=np.int64)
+        histograms.nr_tries = pd.Index(arrays['nr_tries'], dtype=np.int64)
+        histograms._counts = arrays['counts']
+
+    return histograms
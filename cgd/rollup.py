@@ -0,0 +1,346 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     daily rollup of the readings: count per date x reader x reply_code x nr_try
+#   ------------------------------------------------------------------------------------------------------------
+import copy
+
+import numpy as np
+import pandas as pd
+
+from cgd.aggregate import READ_REPLY_CODE, UNSUCCESSFUL_REPLY_CODE, aggregate_readings, get_codes
+from cgd.arrays import load_arrays, save_arrays
+from cgd.prefix import PrefixCounts
+from cgd.ranges import get_epoch_ns, get_period_positions, to_ns
+from cgd.sketch import DEFAULT_PRECISION, EXACT_MODE, DailySketches, get_sketch_arrays, get_sketches, hash_values
+from cgd.timestamps import NS_PER_DAY, floor_to_day, to_datetime64
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+ROLLUP_KEYS = ['date', 'notebook_reader', 'reply_code', 'nr_try']
+
+# the same keys as codes, in the daily cube
+CELL_KEYS = ['day', 'reader', 'reply_code', 'nr_try']
+
+DAILY_COLUMNS = ['nr_readings', 'nr_unsuccessful_readings', 'nr_notebook_readers']
+
+
+#   **************************************************************************************
+#   counts of one frame of readings, works on raw parsed rows and on the indexed dataset
+#   **************************************************************************************
+def get_rollup(df):
+    rollup = df.groupby(ROLLUP_KEYS, observed=True, sort=False).size()
+    rollup.name = 'nr_readings'
+
+    return rollup
+
+
+#   **************************************************************************************
+#   rollups are plain counts, so any number of them add up into one
+#   **************************************************************************************
+def merge_rollups(rollups):
+    rollups = [rollup for rollup in rollups if len(rollup) > 0]
+
+    if not rollups:
+        return pd.Series([], name='nr_readings', dtype='int64',
+                         index=pd.MultiIndex.from_tuples([], names=ROLLUP_KEYS))
+
+    if len(rollups) == 1:
+        return rollups[0]
+
+    merged = pd.concat(rollups).groupby(level=ROLLUP_KEYS, observed=True).sum()
+    merged.name = 'nr_readings'
+
+    return merged
+
+
+#   **************************************************************************************
+#   readings per day x reader x reply_code x nr_try, as arrays sorted by day
+#   **************************************************************************************
+def _count_cells(days, readers, reply_codes, nr_tries):
+    cells = pd.DataFrame({'day': days, 'reader': readers, 'reply_code': reply_codes, 'nr_try': nr_tries})
+    cells = cells.groupby(CELL_KEYS, sort=True).size().rename('nr_readings').reset_index()
+
+    return {column: cells[column].to_numpy() for column in cells.columns}
+
+
+#   **************************************************************************************
+#   cells plus new ones; cells are sorted by day, only the days from the first new one
+#   on are summed again
+#   **************************************************************************************
+def _merge_cells(cells, new_cells):
+    first = np.searchsorted(cells['day'], new_cells['day'].min())
+
+    tail = pd.DataFrame({column: np.concatenate([values[first:], new_cells[column]]) for column, values in cells.items()})
+    tail = tail.groupby(CELL_KEYS, sort=True)['nr_readings'].sum().reset_index()
+
+    return {column: np.concatenate([values[:first], tail[column].to_numpy()]) for column, values in cells.items()}
+
+
+#   **************************************************************************************
+#   hashes of the rows' codes, for the rows with one
+#   **************************************************************************************
+def _get_hashes(codes, value_hashes):
+    return value_hashes[codes[codes >= 0]]
+
+
+#   **************************************************************************************
+#   codes of a column of new rows against the names of the whole dataset (-1 unknown)
+#   **************************************************************************************
+def _recode(series, names):
+    codes, categories = get_codes(series)
+    mapping = np.append(names.get_indexer(categories), -1)
+
+    return mapping[codes]
+
+
+#   **************************************************************************************
+#   categories that only grow at the end, so the codes the cube holds stay valid
+#   **************************************************************************************
+def _extends_categories(series, names):
+    if not isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+
+    categories = series.cat.categories
+
+    return len(categories) >= len(names) and categories[:len(names)].equals(names)
+
+
+#   **************************************************************************************
+#   daily cube of one dataset snapshot (indexed by date_time, sorted): the counts per
+#   day x reader x reply_code x nr_try and distinct-count sketches of the readers and
+#   notebooks read per day. A period is answered from the cube for the days it fully
+#   covers and from the raw rows for the two partial days at its ends, so the work
+#   follows the number of days, not of readings. The row arrays are views of the
+#   dataset's index and codes, the cube copies none of them
+#   **************************************************************************************
+class DailyCube:
+
+    def __init__(self, dataset, distinct_mode=EXACT_MODE, precision=DEFAULT_PRECISION):
+        self._set_rows(dataset)
+
+        days = floor_to_day(self.index)
+        self.cells = _count_cells(days, self.readers, self.reply_codes, self.nr_tries)
+
+        # per-day series of the whole dataset, coarser buckets are summed from it
+        self.readings_per_day, _ = aggregate_readings(self.cells['day'], self.cells['reader'], self.cells['reply_code'],
+                                                      counts=self.cells['nr_readings'])
+        self.daily_days = self.readings_per_day.index.asi8
+
+        # distinct counts by hash, one value hash per category
+        self.reader_hashes = hash_values(self.reader_names)
+        self.notebook_hashes = hash_values(self.notebook_names)
+
+        known = self.cells['reader'] >= 0
+        self.reader_sketches = DailySketches(self.cells['day'][known], self.reader_hashes[self.cells['reader'][known]],
+                                             mode=distinct_mode, precision=precision)
+
+        read = (self.reply_codes == READ_REPLY_CODE) & (self.notebooks >= 0)
+        self.notebook_sketches = DailySketches(days[read], self.notebook_hashes[self.notebooks[read]],
+                                               mode=distinct_mode, precision=precision)
+
+        # plain range counts, without the cube
+        self.prefix = PrefixCounts(self.index, self.readers, self.reply_codes)
+
+    #   **************************************************************************************
+    #   views of the dataset's index and codes
+    #   **************************************************************************************
+    def _set_rows(self, dataset):
+        self.dataset = dataset
+        self.index = get_epoch_ns(dataset.index)
+
+        self.readers, self.reader_names = get_codes(dataset['notebook_reader'])
+        self.notebooks, self.notebook_names = get_codes(dataset['reply_data'])
+        self.reply_codes = dataset['reply_code'].to_numpy()
+        self.nr_tries = dataset['nr_try'].to_numpy()
+
+    #   **************************************************************************************
+    #   the dataset's rows and what is derived from them, for a cube loaded from arrays
+    #   **************************************************************************************
+    def attach(self, dataset):
+        self._set_rows(dataset)
+        self.prefix = PrefixCounts(self.index, self.readers, self.reply_codes)
+
+    #   **************************************************************************************
+    #   the cube of dataset, which is this cube's dataset merged with new_rows (see
+    #   cgd.tail): the cells and sketches of the days the new rows fall on are updated,
+    #   the rest is shared. This cube is not modified, callbacks can go on reading it.
+    #   Built from scratch when rows were missed or the categories were not only appended to
+    #   **************************************************************************************
+    def extend(self, dataset, new_rows):
+        if not (len(self.index) + len(new_rows) == len(dataset) and
+                _extends_categories(dataset['notebook_reader'], self.reader_names) and
+                _extends_categories(dataset['reply_data'], self.notebook_names)):
+            return DailyCube(dataset, distinct_mode=self.notebook_sketches.mode,
+                             precision=self.notebook_sketches.precision)
+
+        cube = copy.copy(self)
+        cube._set_rows(dataset)
+
+        new_index = get_epoch_ns(new_rows.index)
+
+        # rows newer than all the others are appended, the prefix counts only insert them
+        if len(new_index) > 0 and len(self.index) > 0 and new_index.min() >= self.index[-1]:
+            cube.prefix = self.prefix.extend(cube.index, cube.readers, cube.reply_codes, len(new_index))
+        else:
+            cube.prefix = PrefixCounts(cube.index, cube.readers, cube.reply_codes)
+
+        if len(new_index) == 0:
+            return cube
+
+        cube.reader_hashes = np.append(self.reader_hashes, hash_values(cube.reader_names[len(self.reader_names):]))
+        cube.notebook_hashes = np.append(self.notebook_hashes,
+                                         hash_values(cube.notebook_names[len(self.notebook_names):]))
+
+        days = floor_to_day(new_index)
+        readers = _recode(new_rows['notebook_reader'], cube.reader_names)
+        notebooks = _recode(new_rows['reply_data'], cube.notebook_names)
+        reply_codes = new_rows['reply_code'].to_numpy()
+
+        cube.cells = _merge_cells(self.cells, _count_cells(days, readers, reply_codes, new_rows['nr_try'].to_numpy()))
+
+        # the per-day series again from the first day with new rows
+        first_day = days.min()
+        first_cell = np.searchsorted(cube.cells['day'], first_day)
+        readings_per_day, _ = aggregate_readings(cube.cells['day'][first_cell:], cube.cells['reader'][first_cell:],
+                                                 cube.cells['reply_code'][first_cell:],
+                                                 counts=cube.cells['nr_readings'][first_cell:])
+        cube.readings_per_day = pd.concat([self.readings_per_day.iloc[:np.searchsorted(self.daily_days, first_day)],
+                                           readings_per_day])
+        cube.daily_days = cube.readings_per_day.index.asi8
+
+        known = readers >= 0
+        cube.reader_sketches = self.reader_sketches.extend(days[known], cube.reader_hashes[readers[known]])
+
+        read = (reply_codes == READ_REPLY_CODE) & (notebooks >= 0)
+        cube.notebook_sketches = self.notebook_sketches.extend(days[read], cube.notebook_hashes[notebooks[read]])
+
+        return cube
+
+    #   **************************************************************************************
+    #   notebook codes of the reads in a row range, -1 for the other rows
+    #   **************************************************************************************
+    def get_read_notebooks(self, rows):
+        return np.where(self.reply_codes[rows] == READ_REPLY_CODE, self.notebooks[rows], -1)
+
+    #   **************************************************************************************
+    #   whole days and raw row ranges at the ends of a period between two timestamps or ns
+    #   values, inclusive like the slider
+    #   **************************************************************************************
+    def _split(self, start, end):
+        start = to_ns(start)
+        end = to_ns(end)
+
+        first, last = get_period_positions(self.index, start, end)
+
+        full_start = floor_to_day(start + NS_PER_DAY - 1)
+        full_end = floor_to_day(end + 1)
+
+        if full_start >= full_end:
+            return full_start, full_start, [slice(first, last)]
+
+        return full_start, full_end, [slice(first, np.searchsorted(self.index, full_start, side='left')),
+                                      slice(np.searchsorted(self.index, full_end, side='left'), last)]
+
+    #   **************************************************************************************
+    #   readings, unsuccessful readings and tries per reader code over a period; whole days
+    #   are summed from the cells, rows only at the edges
+    #   **************************************************************************************
+    def count_readers(self, start, end):
+        full_start, full_end, edges = self._split(start, end)
+
+        cells = slice(np.searchsorted(self.cells['day'], full_start), np.searchsorted(self.cells['day'], full_end))
+        readers = [self.cells['reader'][cells]]
+        reply_codes = [self.cells['reply_code'][cells]]
+        nr_tries = [self.cells['nr_try'][cells]]
+        nr_readings = [self.cells['nr_readings'][cells]]
+
+        for rows in edges:
+            readers.append(self.readers[rows])
+            reply_codes.append(self.reply_codes[rows])
+            nr_tries.append(self.nr_tries[rows])
+            nr_readings.append(np.ones(rows.stop - rows.start, dtype=np.int64))
+
+        readers = np.concatenate(readers)
+        known = readers >= 0
+        readers = readers[known]
+        nr_readings = np.concatenate(nr_readings)[known].astype(np.int64)
+        unsuccessful = np.concatenate(reply_codes)[known] == UNSUCCESSFUL_REPLY_CODE
+
+        def count(weights):
+            return np.bincount(readers, weights=weights, minlength=len(self.reader_names)).astype(np.int64)
+
+        return (count(nr_readings), count(nr_readings * unsuccessful),
+                count(nr_readings * np.concatenate(nr_tries)[known].astype(np.int64)))
+
+    #   **************************************************************************************
+    #   per day readings, unsuccessful readings and readers, plus the period totals
+    #   (see cgd.aggregate); whole days come straight from the per-day series
+    #   **************************************************************************************
+    def summarise(self, start, end):
+        full_start, full_end, edges = self._split(start, end)
+
+        full_days = slice(np.searchsorted(self.daily_days, full_start), np.searchsorted(self.daily_days, full_end))
+        frames = [self.readings_per_day.iloc[full_days]]
+
+        # the edge days come before and after the whole days
+        for position, rows in zip([0, len(frames) + 1], edges):
+            if rows.start < rows.stop:
+                edge, _ = aggregate_readings(floor_to_day(self.index[rows]), self.readers[rows], self.reply_codes[rows])
+                frames.insert(position, edge)
+
+        readings_per_day = pd.concat(frames) if len(frames) > 1 else frames[0]
+
+        # distinct readers and notebooks: the sketches of the whole days with the edge rows
+        reader_hashes = np.concatenate([_get_hashes(self.readers[rows], self.reader_hashes) for rows in edges])
+        notebook_hashes = np.concatenate([_get_hashes(self.get_read_notebooks(rows), self.notebook_hashes)
+                                          for rows in edges])
+
+        totals = {'nr_readings': int(readings_per_day['nr_readings'].sum()),
+                  'nr_unsuccessful_readings': int(readings_per_day['nr_unsuccessful_readings'].sum()),
+                  'nr_notebook_readers': self.reader_sketches.count(full_start, full_end, hashes=reader_hashes),
+                  'nr_notebooks': self.notebook_sketches.count(full_start, full_end, hashes=notebook_hashes)}
+
+        return readings_per_day, totals
+
+
+#   **************************************************************************************
+#   the cube without the dataset's rows as named arrays (see cgd.arrays); the loaded
+#   arrays are mapped, load_daily_cube attaches the dataset they were built from
+#   **************************************************************************************
+def save_daily_cube(cube, folder):
+    arrays = {f'cells.{column}': values for column, values in cube.cells.items()}
+    arrays['daily.days'] = cube.daily_days
+    arrays.update({f'daily.{column}': cube.readings_per_day[column].to_numpy() for column in DAILY_COLUMNS})
+    arrays['reader_hashes'] = cube.reader_hashes
+    arrays['notebook_hashes'] = cube.notebook_hashes
+
+    for name, sketches in [('reader_sketches', cube.reader_sketches), ('notebook_sketches', cube.notebook_sketches)]:
+        arrays.update({f'{name}.{key}': values for key, values in get_sketch_arrays(sketches).items()})
+
+    save_arrays(arrays, folder)
+
+
+#   **************************************************************************************
+def load_daily_cube(folder, dataset):
+    arrays = load_arrays(folder)
+
+    def select(prefix):
+        return {name[len(prefix):]: values for name, values in arrays.items() if name.startswith(prefix)}
+
+    cube = DailyCube.__new__(DailyCube)
+    cube.cells = select('cells.')
+
+    daily = select('daily.')
+    cube.readings_per_day = pd.DataFrame({column: daily[column] for column in DAILY_COLUMNS},
+                                         index=pd.DatetimeIndex(to_datetime64(daily['days']), name='date'))
+    cube.daily_days = cube.readings_per_day.index.asi8
+
+    cube.reader_hashes = arrays['reader_hashes']
+    cube.notebook_hashes = arrays['notebook_hashes']
+    cube.reader_sketches = get_sketches(select('reader_sketches.'))
+    cube.notebook_sketches = get_sketches(select('notebook_sketches.'))
+
+    cube.attach(dataset)
+
+    return cube
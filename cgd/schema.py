@@ -0,0 +1,83 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     compact in-memory schema for the dataset
+#   ------------------------------------------------------------------------------------------------------------
+import pandas as pd
+
+from pandas.api.types import union_categoricals
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# repeated strings, stored once per distinct value
+CATEGORY_COLUMNS = ['notebook_reader', 'terminal_id', 'reply_data']
+
+# small counters and codes
+SMALL_INTEGER_COLUMNS = ['nr_try', 'reply_code']
+
+# time is the raw string behind date_time and hour a copy of date_time, both come from the index
+REDUNDANT_COLUMNS = ['time', 'hour']
+
+
+#   **************************************************************************************
+#   returns a copy of the dataset in the compact schema
+#   **************************************************************************************
+def compact_dataset(df):
+    df = df.drop(columns=[column for column in REDUNDANT_COLUMNS if column in df.columns])
+
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+
+    for column in SMALL_INTEGER_COLUMNS:
+        if column in df.columns:
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+
+    return df
+
+
+#   **************************************************************************************
+#   concat that keeps categorical columns categorical when their categories differ
+#   **************************************************************************************
+def concat_datasets(frames):
+    frames = [df for df in frames if len(df) > 0] or frames[:1]
+
+    if len(frames) > 1:
+        for column in frames[0].columns:
+            if all(isinstance(df[column].dtype, pd.CategoricalDtype) for df in frames):
+                categories = union_categoricals([df[column] for df in frames]).categories
+                frames = [df.assign(**{column: df[column].cat.set_categories(categories)}) for df in frames]
+
+    return pd.concat(frames)
+
+
+#   **************************************************************************************
+#   bytes per column, index included, strings counted in full
+#   **************************************************************************************
+def get_memory_usage(df):
+    usage = df.memory_usage(index=True, deep=True)
+    dtypes = df.dtypes.astype(str)
+    dtypes['Index'] = str(df.index.dtype)
+
+    return pd.DataFrame({'dtype': dtypes.reindex(usage.index), 'bytes': usage})
+
+
+#   **************************************************************************************
+#   bytes per column before and after, with the totals and the bytes per row
+#   **************************************************************************************
+def get_memory_report(df_before, df_after):
+    before = get_memory_usage(df_before)
+    after = get_memory_usage(df_after)
+
+    report = before.join(after, how='outer', lsuffix='_before', rsuffix='_after')
+    report[['bytes_before', 'bytes_after']] = report[['bytes_before', 'bytes_after']].fillna(0).astype('int64')
+    report.loc['TOTAL', ['bytes_before', 'bytes_after']] = [report['bytes_before'].sum(),
+                                                           report['bytes_after'].sum()]
+    report.loc['PER ROW', ['bytes_before', 'bytes_after']] = [report.loc['TOTAL', 'bytes_before'] / max(len(df_before), 1),
+                                                             report.loc['TOTAL', 'bytes_after'] / max(len(df_after), 1)]
+
+    # NaN for columns only the compact frame has (nothing before to save on), not -inf
+    bytes_before = report['bytes_before'].where(report['bytes_before'] > 0)
+    report['saved_percent'] = round((1 - report['bytes_after'] / bytes_before) * 100, 1)
+
+    return report
@@ -0,0 +1,146 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     reading sessions
+#   ---     the consecutive attempts of a customer at a reader, e.g. error replies (-31) until the notebook
+#   ---     is read, or the same notebook read again seconds later; built from boundaries found with diffs
+#   ---     over the rows sorted by reader and time, with time-to-success and abandonment per session
+#   ------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+from cgd.aggregate import READ_REPLY_CODE, get_codes
+from cgd.arrays import load_arrays, save_arrays
+from cgd.ranges import get_row_epoch_ns
+from cgd.timestamps import NS_PER_SECOND, to_datetime64
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# attempts further apart than this belong to different sessions
+SESSION_GAP_SECONDS = 120
+
+SESSION_COLUMNS = ['notebook_reader', 'notebook', 'start', 'end', 'nr_attempts', 'nr_tries', 'succeeded',
+                   'time_to_success']
+
+# the dataset columns whose categories the categorical session columns share
+CATEGORY_SOURCES = {'notebook_reader': 'notebook_reader', 'notebook': 'reply_data'}
+
+
+#   **************************************************************************************
+#   row positions by reader, then time; rows already in time order (a sorted index) only
+#   need the stable sort on the reader codes
+#   **************************************************************************************
+def _get_order(readers, epoch_ns):
+    if len(epoch_ns) < 2 or (epoch_ns[1:] >= epoch_ns[:-1]).all():
+        return np.argsort(readers, kind='stable')
+
+    return np.lexsort((epoch_ns, readers))
+
+
+#   **************************************************************************************
+#   one row per session: reader, notebook read (missing when abandoned), first and last
+#   attempt, attempts (rows) and tries (nr_try summed), whether it ended in a read and the
+#   seconds from the first attempt to the first read (NaN when abandoned).
+#   A session starts at a new reader, after a gap of more than max_gap seconds, or after a
+#   read unless the same notebook is read again; errors thus join the read that follows them
+#   **************************************************************************************
+def build_sessions(dataset, max_gap=SESSION_GAP_SECONDS):
+    readers, reader_names = get_codes(dataset['notebook_reader'])
+    notebooks, notebook_names = get_codes(dataset['reply_data'])
+    epoch_ns = get_row_epoch_ns(dataset)
+
+    order = _get_order(readers, epoch_ns)
+
+    readers = readers[order]
+    epoch_ns = epoch_ns[order]
+    nr_tries = dataset['nr_try'].to_numpy()[order].astype(np.int64)
+    is_read = dataset['reply_code'].to_numpy()[order] == READ_REPLY_CODE
+    notebooks = np.where(is_read, notebooks[order], -1)
+
+    nr_rows = len(order)
+    if nr_rows == 0:
+        return pd.DataFrame(columns=SESSION_COLUMNS)
+
+    is_start = np.ones(nr_rows, dtype=bool)
+    is_start[1:] = ((readers[1:] != readers[:-1])
+                    | (np.diff(epoch_ns) > max_gap * NS_PER_SECOND)
+                    | (is_read[:-1] & ~(is_read[1:] & (notebooks[1:] == notebooks[:-1]))))
+
+    starts = np.flatnonzero(is_start)
+    ends = np.append(starts[1:], nr_rows) - 1
+    sessions = np.cumsum(is_start) - 1
+
+    # first read of each session
+    reads = np.flatnonzero(is_read)
+    first_reads = reads[np.append(True, sessions[reads[1:]] != sessions[reads[:-1]])] if len(reads) else reads
+
+    first_read = np.full(len(starts), -1)
+    first_read[sessions[first_reads]] = first_reads
+    succeeded = first_read >= 0
+
+    time_to_success = np.full(len(starts), np.nan)
+    time_to_success[succeeded] = (epoch_ns[first_read[succeeded]] - epoch_ns[starts[succeeded]]) / NS_PER_SECOND
+
+    return pd.DataFrame({'notebook_reader': pd.Categorical.from_codes(readers[starts], categories=reader_names),
+                         'notebook': pd.Categorical.from_codes(np.where(succeeded, notebooks[first_read], -1),
+                                                               categories=notebook_names),
+                         'start': to_datetime64(epoch_ns[starts]),
+                         'end': to_datetime64(epoch_ns[ends]),
+                         'nr_attempts': ends - starts + 1,
+                         'nr_tries': np.add.reduceat(nr_tries, starts),
+                         'succeeded': succeeded,
+                         'time_to_success': time_to_success})
+
+
+#   **************************************************************************************
+#   sessions, abandonment rate, attempts per session and time-to-success (seconds) of a
+#   frame of sessions; None where there is nothing to measure
+#   **************************************************************************************
+def get_session_metrics(sessions):
+    nr_sessions = len(sessions)
+    time_to_success = sessions['time_to_success'].dropna()
+
+    def measure(value, digits=2):
+        return None if pd.isna(value) else round(float(value), digits)
+
+    return {'nr_sessions': nr_sessions,
+            'nr_abandoned_sessions': int(nr_sessions - sessions['succeeded'].sum()),
+            'abandonment_rate': measure(1 - sessions['succeeded'].mean(), digits=4) if nr_sessions else None,
+            'mean_attempts': measure(sessions['nr_attempts'].mean()),
+            'mean_tries': measure(sessions['nr_tries'].mean()),
+            'mean_time_to_success': measure(time_to_success.mean()),
+            # numpy's median: pandas' writes into the values, which may be mapped read-only
+            'median_time_to_success': measure(np.median(time_to_success.to_numpy()))
+            if len(time_to_success) else None,
+            'p90_time_to_success': measure(time_to_success.quantile(0.9)) if len(time_to_success) else None}
+
+
+#   **************************************************************************************
+#   get_session_metrics per reader
+#   **************************************************************************************
+def get_reader_session_metrics(sessions):
+    return {str(notebook_reader): get_session_metrics(reader_sessions)
+            for notebook_reader, reader_sessions in sessions.groupby('notebook_reader', observed=True)}
+
+
+#   **************************************************************************************
+#   sessions as named arrays (see cgd.arrays), the categorical columns as their codes
+#   **************************************************************************************
+def save_sessions(sessions, folder):
+    save_arrays({column: sessions[column].cat.codes.to_numpy() if column in CATEGORY_SOURCES
+                 else sessions[column].to_numpy() for column in SESSION_COLUMNS}, folder)
+
+
+#   **************************************************************************************
+#   the columns are mapped, the categories are those of the dataset the sessions were
+#   built from (not a copy per worker)
+#   **************************************************************************************
+def load_sessions(folder, dataset):
+    arrays = load_arrays(folder)
+
+    columns = {column: arrays[column] for column in SESSION_COLUMNS}
+    for column, source in CATEGORY_SOURCES.items():
+        columns[column] = pd.Categorical.from_codes(columns[column], categories=dataset[source].cat.categories,
+                                                    validate=False)
+
+    return pd.DataFrame(columns, copy=False)
@@ -0,0 +1,256 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     mergeable distinct-count sketches
+#   ---     values are hashed to 64 bits; a sketch is either the exact sorted set of hashes or the
+#   ---     registers of a HyperLogLog, and sketches of different days union into the sketch of a range
+#   ------------------------------------------------------------------------------------------------------------
+import copy
+
+import numpy as np
+import pandas as pd
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+EXACT_MODE = 'exact'
+HLL_MODE = 'hll'
+
+# 2**precision one-byte registers per day, relative standard error about 1.04 / sqrt(2**precision)
+DEFAULT_PRECISION = 14
+
+# the rank is read off the float64 exponent of the 64 - precision remaining bits, which must fit its mantissa
+MIN_PRECISION = 11
+MAX_PRECISION = 18
+
+
+#   **************************************************************************************
+#   64-bit hashes, the same in every process
+#   **************************************************************************************
+def hash_values(values):
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+#   **************************************************************************************
+#   bucket and rank (position of the first 1 bit after the bucket bits) of each hash
+#   **************************************************************************************
+def _get_buckets_and_ranks(hashes, precision):
+    remaining_bits = 64 - precision
+
+    buckets = (hashes >> np.uint64(remaining_bits)).astype(np.int64)
+    rest = hashes & np.uint64((1 << remaining_bits) - 1)
+
+    # frexp's exponent is the bit length of the rest, 0 for 0
+    _, bit_length = np.frexp(rest.astype(np.float64))
+    ranks = (remaining_bits - bit_length + 1).astype(np.uint8)
+
+    return buckets, ranks
+
+
+#   **************************************************************************************
+#   distinct (day, hash) pairs sorted by day then hash: the days, the hashes and each
+#   day's offsets into them
+#   **************************************************************************************
+def _get_distinct_pairs(days, hashes):
+    order = np.lexsort((hashes, days))
+    days = days[order]
+    hashes = hashes[order]
+
+    distinct = np.ones(len(days), dtype=bool)
+    distinct[1:] = (days[1:] != days[:-1]) | (hashes[1:] != hashes[:-1])
+    days = days[distinct]
+
+    day_values, day_starts = np.unique(days, return_index=True)
+
+    return day_values, hashes[distinct], np.append(day_starts, len(days))
+
+
+#   **************************************************************************************
+#   the hashes of one day, empty when the day has none
+#   **************************************************************************************
+def _get_day_hashes(days, day_bounds, hashes, day):
+    position = np.searchsorted(days, day)
+    if position == len(days) or days[position] != day:
+        return hashes[:0]
+
+    return hashes[day_bounds[position]:day_bounds[position + 1]]
+
+
+#   **************************************************************************************
+#   HyperLogLog estimate of one register array, linear counting while registers are empty
+#   **************************************************************************************
+def estimate_registers(registers):
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+
+    estimate = alpha * m * m / np.sum(np.ldexp(1.0, -registers.astype(np.int64)))
+    nr_empty = int(np.count_nonzero(registers == 0))
+
+    if estimate <= 2.5 * m and nr_empty > 0:
+        estimate = m * np.log(m / nr_empty)
+
+    return int(round(estimate))
+
+
+#   **************************************************************************************
+#   registers at a precision nr_bits lower: the dropped low bucket bits come first in the
+#   remaining bits, so a nonzero one sets the rank and zeros add nr_bits to it
+#   **************************************************************************************
+def _fold_registers(registers, nr_bits):
+    low_bits = np.arange(1 << nr_bits)
+    _, bit_length = np.frexp(low_bits.astype(np.float64))
+    low_ranks = (nr_bits - bit_length + 1).astype(np.uint8)
+
+    grouped = registers.reshape(len(registers), -1, 1 << nr_bits)
+    ranks = np.where(low_bits == 0, grouped + np.uint8(nr_bits), low_ranks)
+
+    return np.where(grouped == 0, 0, ranks).max(axis=2, initial=0).astype(np.uint8)
+
+
+#   **************************************************************************************
+#   per-day distinct-count sketches of (day, hash) pairs; days are ns at midnight.
+#   Exact mode keeps the sorted distinct hashes of each day, one flat array with the day
+#   offsets; HyperLogLog mode keeps one row of registers per day
+#   **************************************************************************************
+class DailySketches:
+
+    def __init__(self, days, hashes, mode=EXACT_MODE, precision=DEFAULT_PRECISION):
+        if mode not in (EXACT_MODE, HLL_MODE):
+            raise ValueError(f'Unknown distinct count mode {mode!r}')
+
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f'Precision {precision} is not between {MIN_PRECISION} and {MAX_PRECISION}')
+
+        self.mode = mode
+        self.precision = precision
+
+        days = np.asarray(days, dtype=np.int64)
+        hashes = np.asarray(hashes, dtype=np.uint64)
+
+        if mode == EXACT_MODE:
+            self.days, self.hashes, self.day_bounds = _get_distinct_pairs(days, hashes)
+        else:
+            self.days, day_positions = np.unique(days, return_inverse=True)
+
+            buckets, ranks = _get_buckets_and_ranks(hashes, precision)
+            self.registers = np.zeros((len(self.days), 1 << precision), dtype=np.uint8)
+            np.maximum.at(self.registers, (day_positions, buckets), ranks)
+
+    #   **************************************************************************************
+    #   new sketches with more (day, hash) pairs; the arrays of this one are not modified,
+    #   so it can be read meanwhile. Days before the first new one are shared as they are
+    #   **************************************************************************************
+    def extend(self, days, hashes):
+        sketches = copy.copy(self)
+        if len(days) == 0:
+            return sketches
+
+        days = np.asarray(days, dtype=np.int64)
+        hashes = np.asarray(hashes, dtype=np.uint64)
+
+        if self.mode == EXACT_MODE:
+            new_days, new_hashes, new_bounds = _get_distinct_pairs(days, hashes)
+            first = np.searchsorted(self.days, new_days[0])
+
+            all_days = [self.days[:first]]
+            day_hashes = [self.hashes[:self.day_bounds[first]]]
+            day_sizes = [np.diff(self.day_bounds[:first + 1])]
+
+            for day in np.union1d(self.days[first:], new_days):
+                values = np.union1d(_get_day_hashes(self.days, self.day_bounds, self.hashes, day),
+                                    _get_day_hashes(new_days, new_bounds, new_hashes, day))
+                all_days.append([day])
+                day_hashes.append(values)
+                day_sizes.append([len(values)])
+
+            sketches.days = np.concatenate(all_days).astype(np.int64)
+            sketches.hashes = np.concatenate(day_hashes).astype(np.uint64)
+            sketches.day_bounds = np.append(0, np.cumsum(np.concatenate(day_sizes))).astype(np.int64)
+        else:
+            sketches.days = np.union1d(self.days, days)
+            sketches.registers = np.zeros((len(sketches.days), 1 << self.precision), dtype=np.uint8)
+            sketches.registers[np.searchsorted(sketches.days, self.days)] = self.registers
+
+            buckets, ranks = _get_buckets_and_ranks(hashes, self.precision)
+            np.maximum.at(sketches.registers, (np.searchsorted(sketches.days, days), buckets), ranks)
+
+        return sketches
+
+    #   **************************************************************************************
+    #   one row of HyperLogLog registers per day at the precision given, e.g. to ship fewer
+    #   bytes than the hashes; in HyperLogLog mode at most this one's precision
+    #   **************************************************************************************
+    def get_registers(self, precision):
+        if self.mode == EXACT_MODE:
+            buckets, ranks = _get_buckets_and_ranks(self.hashes, precision)
+            day_positions = np.repeat(np.arange(len(self.days)), np.diff(self.day_bounds))
+
+            registers = np.zeros((len(self.days), 1 << precision), dtype=np.uint8)
+            np.maximum.at(registers, (day_positions, buckets), ranks)
+
+            return registers
+
+        if precision > self.precision:
+            raise ValueError(f'Precision {precision} is above the sketches\' {self.precision}')
+
+        return _fold_registers(self.registers, self.precision - precision)
+
+    #   **************************************************************************************
+    #   memory held by the sketches
+    #   **************************************************************************************
+    @property
+    def nbytes(self):
+        if self.mode == EXACT_MODE:
+            return self.hashes.nbytes + self.day_bounds.nbytes
+
+        return self.registers.nbytes
+
+    #   **************************************************************************************
+    #   distinct values of the days from start_day (inclusive) to end_day (exclusive),
+    #   together with the extra hashes given
+    #   **************************************************************************************
+    def count(self, start_day, end_day, hashes=None):
+        first = np.searchsorted(self.days, start_day, side='left')
+        last = max(first, np.searchsorted(self.days, end_day, side='left'))
+
+        if hashes is None:
+            hashes = np.empty(0, dtype=np.uint64)
+
+        if self.mode == EXACT_MODE:
+            union = self.hashes[self.day_bounds[first]:self.day_bounds[last]]
+            return len(np.unique(np.concatenate([union, hashes])))
+
+        registers = self.registers[first:last].max(axis=0, initial=0)
+
+        buckets, ranks = _get_buckets_and_ranks(hashes, self.precision)
+        np.maximum.at(registers, buckets, ranks)
+
+        return estimate_registers(registers)
+
+
+#   **************************************************************************************
+#   the sketches as named arrays (see cgd.arrays) and back; the mode and precision
+#   follow from which arrays there are
+#   **************************************************************************************
+def get_sketch_arrays(sketches):
+    if sketches.mode == EXACT_MODE:
+        return {'days': sketches.days, 'hashes': sketches.hashes, 'day_bounds': sketches.day_bounds}
+
+    return {'days': sketches.days, 'registers': sketches.registers}
+
+
+#   **************************************************************************************
+def get_sketches(arrays):
+    sketches = DailySketches.__new__(DailySketches)
+    sketches.days = arrays['days']
+
+    if 'registers' in arrays:
+        sketches.mode = HLL_MODE
+        sketches.registers = arrays['registers']
+        sketches.precision = int(arrays['registers'].shape[1]).bit_length() - 1
+    else:
+        sketches.mode = EXACT_MODE
+        sketches.precision = DEFAULT_PRECISION
+        sketches.hashes = arrays['hashes']
+        sketches.day_bounds = arrays['day_bounds']
+
+    return sketches
@@ -0,0 +1,243 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     bounded-memory streaming ingest for archive backfills
+#   ---     files are read in fixed-size chunks that are folded straight into the daily rollup; raw rows
+#   ---     are only kept for the most recent days. The result is saved as a backfill folder: the rollup
+#   ---     and the daily notebook reads as mapped arrays, which answer whole-day periods (dashboard v1.3's
+#   ---     BACKFILL_FOLDER), and the recent rows as an event store (cgd-dashboard's EVENT_STORE_FOLDER)
+#   ------------------------------------------------------------------------------------------------------------
+import json
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from os.path import isdir, join
+
+from cgd.aggregate import aggregate_readings, count_distinct, get_codes
+from cgd.arrays import load_arrays, save_arrays
+from cgd.event_store import EventStoreWriter, load_event_store
+from cgd.files import write_json
+from cgd.ingest import index_dataset, list_files_to_process, parse_lines
+from cgd.ranges import to_ns
+from cgd.rollup import get_rollup, merge_rollups
+from cgd.timestamps import NS_PER_DAY, floor_to_day
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+CHUNK_BYTES = 16 * 2**20
+
+RECENT_DAYS = 7
+
+# a backfill folder
+CELLS_FOLDER_NAME = 'cells'
+NOTEBOOKS_FOLDER_NAME = 'notebooks'
+READERS_FILE_NAME = 'readers.json'
+RECENT_FOLDER_NAME = 'recent'
+
+
+#   **************************************************************************************
+#   parsed frames of at most chunk_bytes of complete lines each
+#   **************************************************************************************
+def iter_file_chunks(folder, file_name, chunk_bytes=CHUNK_BYTES):
+    with open(join(folder, file_name), 'rb') as f:
+        remainder = b''
+
+        while True:
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+
+            data = remainder + block
+            end = data.rfind(b'\n') + 1
+
+            if end == 0:
+                remainder = data
+                continue
+
+            remainder = data[end:]
+            yield parse_lines(data[:end], file_name)
+
+        # last line without a line break
+        if remainder.strip():
+            yield parse_lines(remainder, file_name)
+
+
+#   **************************************************************************************
+#   distinct notebooks read per day, the one count a rollup cannot add up
+#   **************************************************************************************
+def get_daily_notebooks(df):
+    notebooks = df.loc[df['reply_code'] == 0, ['date', 'reply_data']]
+    notebooks = notebooks.assign(reply_data=notebooks['reply_data'].astype(str))
+
+    return notebooks.drop_duplicates()
+
+
+#   **************************************************************************************
+#   parts are folded together once they outgrow the folded part, which keeps the
+#   folding linear in the number of chunks
+#   **************************************************************************************
+def _fold(parts, combine):
+    if len(parts) > 1 and sum(len(part) for part in parts[1:]) > len(parts[0]):
+        return [combine(parts)]
+
+    return parts
+
+
+#   **************************************************************************************
+def _combine_notebooks(parts):
+    return pd.concat(parts).drop_duplicates()
+
+
+#   **************************************************************************************
+#   returns the daily rollup, the distinct (date, reply_data) notebook reads and the raw
+#   rows of the last recent_days days (by date, relative to the newest reading seen)
+#   **************************************************************************************
+def stream_dataset(folder, recent_days=RECENT_DAYS, chunk_bytes=CHUNK_BYTES):
+    started = time.perf_counter()
+
+    rollups = []
+    notebooks = []
+    recent = []
+    cutoff = None
+    nr_rows = 0
+
+    file_names = list_files_to_process(folder)
+
+    for file_name in file_names:
+        for df in iter_file_chunks(folder, file_name, chunk_bytes=chunk_bytes):
+            nr_rows += len(df)
+
+            rollups = _fold(rollups + [get_rollup(df)], merge_rollups)
+            notebooks = _fold(notebooks + [get_daily_notebooks(df)], _combine_notebooks)
+
+            # the window only ever moves forward, rows that fall out of it are dropped
+            chunk_cutoff = df['date'].max() - pd.Timedelta(days=recent_days - 1)
+            if cutoff is None or chunk_cutoff > cutoff:
+                cutoff = chunk_cutoff
+                recent = [frame[frame['date'] >= cutoff] for frame in recent]
+
+            recent.append(df[df['date'] >= cutoff])
+
+        print(f'Streamed file: {file_name} ({nr_rows} rows so far, '
+              f'{sum(len(frame) for frame in recent)} kept)')
+
+    rollup = merge_rollups(rollups)
+    notebooks = _combine_notebooks(notebooks) if notebooks else pd.DataFrame(columns=['date', 'reply_data'])
+    recent = pd.concat(recent) if recent else None
+
+    print(f'Streamed {len(file_names)} files ({nr_rows} rows, {len(rollup)} rollup cells) '
+          f'in {time.perf_counter() - started:.3f}s, peak RSS {get_peak_rss_mb():.0f} MB')
+
+    return rollup, notebooks, recent
+
+
+#   **************************************************************************************
+#   ns at midnight of a column of dates
+#   **************************************************************************************
+def _get_days(dates):
+    return dates.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+
+#   **************************************************************************************
+#   stream_dataset's result into folder: the rollup as day-sorted cells of codes (readers
+#   named in readers.json), the notebook reads as day-sorted (day, code) pairs, the
+#   recent rows indexed as the dashboards load them
+#   **************************************************************************************
+def save_backfill(rollup, notebooks, recent, folder):
+    os.makedirs(folder, exist_ok=True)
+
+    cells = rollup.reset_index()
+    days = _get_days(cells['date'])
+    readers, reader_names = get_codes(cells['notebook_reader'])
+    order = np.argsort(days, kind='stable')
+
+    save_arrays({'day': days[order],
+                 'reader': readers[order],
+                 'reply_code': cells['reply_code'].to_numpy()[order],
+                 'nr_try': cells['nr_try'].to_numpy()[order],
+                 'nr_readings': cells['nr_readings'].to_numpy()[order]}, join(folder, CELLS_FOLDER_NAME))
+
+    days = _get_days(notebooks['date'])
+    codes, _ = get_codes(notebooks['reply_data'])
+    order = np.argsort(days, kind='stable')
+
+    save_arrays({'day': days[order], 'notebook': codes[order]}, join(folder, NOTEBOOKS_FOLDER_NAME))
+
+    if recent is not None:
+        EventStoreWriter(join(folder, RECENT_FOLDER_NAME)).write(index_dataset(recent))
+
+    # last, a folder without it is incomplete
+    write_json(join(folder, READERS_FILE_NAME), [str(name) for name in reader_names])
+
+
+#   **************************************************************************************
+#   a saved backfill, mapped; the history answers whole days only, a period covers every
+#   day it touches. recent is the dataset of the recent rows, None when none were kept
+#   **************************************************************************************
+class Backfill:
+
+    def __init__(self, folder):
+        with open(join(folder, READERS_FILE_NAME)) as f:
+            self.reader_names = pd.Index(json.load(f))
+
+        self.cells = load_arrays(join(folder, CELLS_FOLDER_NAME))
+        self.notebooks = load_arrays(join(folder, NOTEBOOKS_FOLDER_NAME))
+
+        recent_folder = join(folder, RECENT_FOLDER_NAME)
+        self.recent = load_event_store(recent_folder)[0] if isdir(recent_folder) else None
+
+    #   **************************************************************************************
+    #   the days with readings, as a DatetimeIndex
+    #   **************************************************************************************
+    def get_days(self):
+        return pd.DatetimeIndex(np.unique(self.cells['day']).view('datetime64[ns]'), name='date')
+
+    #   **************************************************************************************
+    #   per day readings, unsuccessful readings and readers, plus the period totals (see
+    #   cgd.aggregate), of the days from start's to end's
+    #   **************************************************************************************
+    def summarise(self, start, end):
+        first_day = floor_to_day(to_ns(start))
+        end_day = floor_to_day(to_ns(end)) + NS_PER_DAY
+
+        cells = slice(*np.searchsorted(self.cells['day'], [first_day, end_day]))
+        readings_per_day, totals = aggregate_readings(self.cells['day'][cells], self.cells['reader'][cells],
+                                                      self.cells['reply_code'][cells],
+                                                      counts=self.cells['nr_readings'][cells])
+
+        notebooks = slice(*np.searchsorted(self.notebooks['day'], [first_day, end_day]))
+        totals['nr_notebooks'] = count_distinct(self.notebooks['notebook'][notebooks])
+
+        return readings_per_day, totals
+
+
+#   **************************************************************************************
+def get_peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+#   **************************************************************************************
+#   python -m cgd.streaming FILES_TO_PROCESS [recent_days] [BACKFILL]
+#   **************************************************************************************
+if __name__ == '__main__':
+    folder = sys.argv[1] if len(sys.argv) > 1 else 'FILES_TO_PROCESS'
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else RECENT_DAYS
+    backfill_folder = sys.argv[3] if len(sys.argv) > 3 else None
+
+    daily_rollup, daily_notebooks, recent_rows = stream_dataset(folder, recent_days=days)
+
+    readings_per_day = daily_rollup.groupby(level='date').sum()
+    print(readings_per_day.to_string())
+    print(f'Recent rows kept: {0 if recent_rows is None else len(recent_rows)}')
+
+    if backfill_folder is not None:
+        save_backfill(daily_rollup, daily_notebooks, recent_rows, backfill_folder)
+        print(f'Backfill saved to {backfill_folder}')
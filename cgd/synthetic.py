@@ -0,0 +1,195 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     synthetic reader logs
+#   ---     FILES_TO_PROCESS files in the readers' format (date|time|nr_try|reply_data|reply_code, named
+#   ---     job-terminal-location.txt) at any scale, with the hour, reply and record mix of the sample
+#   ---     logs; lines are laid out as byte matrices, chunk by chunk, so 100M+ rows stay within memory
+#   ------------------------------------------------------------------------------------------------------------
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+# readings per hour of the day in the sample logs
+SAMPLE_HOUR_COUNTS = [35, 3, 2, 0, 1, 13, 80, 451, 2816, 5966, 7707, 6755,
+                      4410, 3420, 4092, 3266, 2425, 1773, 1084, 686, 353, 221, 86, 40]
+
+# nr_try as written, reply_data (None for a notebook record), reply_code and rows in the sample logs
+SAMPLE_REPLIES = [(0, None, 0, 39135), (1, None, 0, 967), (2, None, 0, 11), (3, None, 0, 10),
+                  (3, b'-31', 1, 5535), (3, b'-2', 1, 27)]
+
+# field_1, field_2 and field_4 of the records and rows in the sample logs
+SAMPLE_RECORD_FIELDS = [(b'0', b'00', b'9', 38733), (b'0', b'01', b'9', 555), (b'0', b'00', b'2', 295),
+                        (b'1', b'00', b'2', 211), (b'1', b'01', b'2', 183), (b'2', b'00', b'2', 17)]
+
+# share of the notebooks read at their own branch, the others come from anywhere
+LOCAL_NOTEBOOK_SHARE = 0.63
+
+NR_NOTEBOOK_NUMBERS = 60
+
+MODELS = ['WW01', 'WW01', 'WW01', 'LL25', 'WW02']
+
+FIRST_JOB_ID = 10100000
+
+LOCATION_PREFIX = 'LEITOR-'
+
+FIRST_DAY = '2022-10-17'
+
+NR_DAYS = 28
+
+CHUNK_ROWS = 2**20
+
+MS_PER_HOUR = 3600 * 1000
+
+# a record line; date, time, try, branch, fields, number and code are written over it
+LINE_TEMPLATE = b'0000-00-00|00:00:00.000|0|:0000*********=0=00=0000000000000=9=|0\n'
+
+REPLY_COLUMN = 26
+
+
+#   **************************************************************************************
+def _get_shares(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+
+    return counts / counts.sum()
+
+
+#   **************************************************************************************
+#   values as zero-padded decimal digits into columns column .. column + width - 1
+#   **************************************************************************************
+def _put_digits(lines, column, values, width):
+    for position in range(width):
+        lines[:, column + width - 1 - position] = 48 + values // 10**position % 10
+
+
+#   **************************************************************************************
+#   the bytes of the lines of readings at day positions and ms of the day (in time order)
+#   **************************************************************************************
+def _format_lines(rng, day_texts, day_positions, ms_of_day, branch):
+    nr_lines = len(ms_of_day)
+    width = len(LINE_TEMPLATE)
+
+    lines = np.empty((nr_lines, width), dtype=np.uint8)
+    lines[:] = np.frombuffer(LINE_TEMPLATE, dtype=np.uint8)
+
+    lines[:, :10] = day_texts[day_positions]
+
+    _put_digits(lines, 11, ms_of_day // MS_PER_HOUR, 2)
+    _put_digits(lines, 14, ms_of_day // 60000 % 60, 2)
+    _put_digits(lines, 17, ms_of_day // 1000 % 60, 2)
+    _put_digits(lines, 20, ms_of_day % 1000, 3)
+
+    # notebook records
+    local = rng.random(nr_lines) < LOCAL_NOTEBOOK_SHARE
+    _put_digits(lines, REPLY_COLUMN + 1, np.where(local, branch, rng.integers(1, 1000, nr_lines)), 4)
+    _put_digits(lines, REPLY_COLUMN + 20, rng.integers(1, NR_NOTEBOOK_NUMBERS + 1, nr_lines), 13)
+
+    fields = np.array([np.frombuffer(field_1 + field_2 + field_4, dtype=np.uint8)
+                       for field_1, field_2, field_4, _ in SAMPLE_RECORD_FIELDS])
+    columns = [REPLY_COLUMN + offset for offset in (15, 17, 18, 34)]
+    lines[:, columns] = fields[rng.choice(len(fields), nr_lines, p=_get_shares([c[-1] for c in SAMPLE_RECORD_FIELDS]))]
+
+    # try and reply, the errors written over the record
+    lengths = np.full(nr_lines, width)
+    replies = rng.choice(len(SAMPLE_REPLIES), nr_lines, p=_get_shares([reply[-1] for reply in SAMPLE_REPLIES]))
+
+    for reply, (nr_try, reply_data, reply_code, _) in enumerate(SAMPLE_REPLIES):
+        rows = replies == reply
+        lines[rows, REPLY_COLUMN - 2] = 48 + nr_try
+
+        if reply_data is None:
+            lines[rows, width - 2] = 48 + reply_code
+            continue
+
+        end = REPLY_COLUMN + len(reply_data)
+        lines[np.ix_(rows, range(REPLY_COLUMN, end + 3))] = np.frombuffer(reply_data + b'|%d\n' % reply_code,
+                                                                          dtype=np.uint8)
+        lengths[rows] = end + 3
+
+    return lines[np.arange(width) < lengths[:, None]].tobytes()
+
+
+#   **************************************************************************************
+#   consecutive days grouped into chunks of about CHUNK_ROWS readings
+#   **************************************************************************************
+def _get_day_chunks(day_rows):
+    chunk = []
+    nr_rows = 0
+
+    for day, rows in enumerate(day_rows):
+        if chunk and nr_rows + rows > CHUNK_ROWS:
+            yield chunk
+            chunk = []
+            nr_rows = 0
+
+        chunk.append(day)
+        nr_rows += rows
+
+    if chunk:
+        yield chunk
+
+
+#   **************************************************************************************
+#   writes nr_readers files with nr_rows readings between them into folder; readers get
+#   a skewed share of the rows and start within the first third of the days.
+#   Returns the file names and the bytes written
+#   **************************************************************************************
+def generate_files(folder, nr_readers, nr_rows, first_day=FIRST_DAY, nr_days=NR_DAYS, seed=0):
+    rng = np.random.default_rng(seed)
+    os.makedirs(folder, exist_ok=True)
+
+    days = pd.date_range(first_day, periods=nr_days, freq='D')
+    day_texts = np.frombuffer(''.join(days.strftime('%Y-%m-%d')).encode(), dtype=np.uint8).reshape(nr_days, 10)
+    hour_shares = _get_shares(SAMPLE_HOUR_COUNTS)
+
+    reader_rows = rng.multinomial(nr_rows, _get_shares(rng.lognormal(0, 0.6, nr_readers)))
+    branches = rng.integers(1, 1000, nr_readers)
+
+    file_names = []
+    nr_bytes = 0
+
+    for reader in range(nr_readers):
+        file_name = (f'{FIRST_JOB_ID + reader}-CGD{branches[reader]:04d}MACT{MODELS[reader % len(MODELS)]}-'
+                     f'{LOCATION_PREFIX}{reader + 1:05d}.txt')
+
+        first = rng.integers(0, max(1, nr_days // 3))
+        day_rows = np.zeros(nr_days, dtype=np.int64)
+        day_rows[first:] = rng.multinomial(reader_rows[reader], np.full(nr_days - first, 1 / (nr_days - first)))
+
+        with open(os.path.join(folder, file_name), 'wb') as file:
+            for chunk in _get_day_chunks(day_rows):
+                day_positions = np.repeat(np.array(chunk), day_rows[chunk])
+
+                ms_of_day = (rng.choice(24, len(day_positions), p=hour_shares) * MS_PER_HOUR
+                             + rng.integers(0, MS_PER_HOUR, len(day_positions)))
+                ms_of_day = np.sort(day_positions * 24 * MS_PER_HOUR + ms_of_day) - day_positions * 24 * MS_PER_HOUR
+
+                data = _format_lines(rng, day_texts, day_positions, ms_of_day, branches[reader])
+                file.write(data)
+                nr_bytes += len(data)
+
+        file_names.append(file_name)
+
+    return file_names, nr_bytes
+
+
+#   **************************************************************************************
+#   python -m cgd.synthetic FOLDER nr_readers nr_rows [nr_days] [seed]
+#   **************************************************************************************
+if __name__ == '__main__':
+    folder = sys.argv[1]
+    readers = int(sys.argv[2])
+    rows = int(float(sys.argv[3]))
+    nr_days = int(sys.argv[4]) if len(sys.argv) > 4 else NR_DAYS
+    seed = int(sys.argv[5]) if len(sys.argv) > 5 else 0
+
+    started = time.perf_counter()
+    names, written = generate_files(folder, readers, rows, nr_days=nr_days, seed=seed)
+    seconds = time.perf_counter() - started
+
+    print(f'Generated {len(names)} files ({rows} rows, {written / 2**20:.0f} MB) in {seconds:.3f}s')
@@ -0,0 +1,127 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     live tailing of the reader files
+#   ---     keeps a byte offset per file, parses only what was appended and swaps in the merged dataset
+#   ------------------------------------------------------------------------------------------------------------
+import os
+import threading
+import time
+
+import pandas as pd
+
+from os.path import join
+
+from cgd.ingest import list_files_to_process, parse_appended_lines
+from cgd.schema import concat_datasets
+
+
+#   **************************************************************************************
+#   prepare turns raw parsed rows into the dashboard's indexed form (set_index, sort, ...)
+#   listeners are called with the prepared new rows after each swap
+#   the dataset attribute is only ever replaced, never modified, so a callback that
+#   reads it once works on a consistent snapshot
+#   **************************************************************************************
+class DatasetWatcher:
+
+    def __init__(self, folder, dataset, timings, prepare, interval=60, listeners=None):
+        self.folder = folder
+        self.prepare = prepare
+        self.interval = interval
+        self.listeners = list(listeners or [])
+
+        self.dataset = dataset
+        self.version = 0
+        self.offsets = {timing['file_name']: timing['bytes'] for timing in timings}
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    #   **************************************************************************************
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='dataset-watcher', daemon=True)
+            self._thread.start()
+
+    #   **************************************************************************************
+    def stop(self):
+        self._stop.set()
+
+    #   **************************************************************************************
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # a bad line must not kill the watcher; it is retried on the next pass
+                print(f'Dataset watcher failed: {e!r}')
+
+    #   **************************************************************************************
+    #   parse the appended lines and new files, returns the number of new rows; a file
+    #   that fails is left at its offset and retried on the next pass, the others go on
+    #   **************************************************************************************
+    def poll(self):
+        with self._lock:
+            started = time.perf_counter()
+            frames = []
+            merged_offsets = {}
+
+            for file_name in list_files_to_process(self.folder):
+                offset = self.offsets.get(file_name, 0)
+
+                try:
+                    size = os.path.getsize(join(self.folder, file_name))
+
+                    if size == offset:
+                        continue
+
+                    if size < offset:
+                        # rows already merged cannot be taken back here, a restart reloads the file
+                        print(f'Dataset watcher: {file_name} shrank from {offset} to {size} bytes, skipped')
+                        self.offsets[file_name] = size
+                        continue
+
+                    df, new_offset = parse_appended_lines(self.folder, file_name, offset)
+
+                except Exception as e:
+                    print(f'Dataset watcher: {file_name} failed: {e!r}')
+                    continue
+
+                if df is None:
+                    # nothing but blank or malformed lines
+                    self.offsets[file_name] = new_offset
+                else:
+                    frames.append(df)
+                    merged_offsets[file_name] = new_offset
+
+            if frames:
+                new_rows = self.prepare(pd.concat(frames))
+                self.dataset = merge_sorted(self.dataset, new_rows)
+                self.version += 1
+
+            # committed as soon as the rows are in, a failing listener must not merge them twice
+            self.offsets.update(merged_offsets)
+
+            if frames:
+                for listener in self.listeners:
+                    try:
+                        listener(new_rows)
+                    except Exception as e:
+                        print(f'Dataset watcher: listener {listener!r} failed: {e!r}')
+
+                print(f'Dataset watcher: merged {len(new_rows)} rows from {len(frames)} files '
+                      f'in {time.perf_counter() - started:.3f}s')
+
+            return sum(len(df) for df in frames)
+
+
+#   **************************************************************************************
+#   both frames are sorted by index; appended rows are normally the newest, which only
+#   needs a concat, otherwise a stable sort merges the two sorted runs
+#   **************************************************************************************
+def merge_sorted(dataset, new_rows):
+    merged = concat_datasets([dataset, new_rows])
+
+    if len(dataset) > 0 and len(new_rows) > 0 and new_rows.index[0] < dataset.index[-1]:
+        merged = merged.sort_index(kind='stable')
+
+    return merged
@@ -0,0 +1,152 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     fast timestamp parsing for the reader logs
+#   ---     the readers always write YYYY-MM-DD|HH:MM:SS.mmm, so the fields are read straight out of the
+#   ---     fixed-width characters into int64 epoch nanoseconds
+#   ------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+NS_PER_MS = 10**6
+NS_PER_SECOND = 10**9
+NS_PER_MINUTE = 60 * NS_PER_SECOND
+NS_PER_HOUR = 60 * NS_PER_MINUTE
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+DATE_FORMAT = 'YYYY-MM-DD'
+TIME_FORMAT = 'HH:MM:SS.mmm'
+
+
+#   **************************************************************************************
+#   days since 1970-01-01 for a proleptic gregorian date (H. Hinnant's days_from_civil)
+#   **************************************************************************************
+def days_from_civil(year, month, day):
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+
+    return era * 146097 + day_of_era - 719468
+
+
+#   **************************************************************************************
+#   one row of ascii digits per value, None when any value does not match the layout
+#   **************************************************************************************
+def _get_digits(values, layout):
+    width = len(layout)
+
+    # one spare byte shows up any value longer than the layout
+    try:
+        values = np.asarray(values).astype(f'S{width + 1}')
+    except (TypeError, ValueError, UnicodeEncodeError):
+        return None
+
+    characters = np.frombuffer(values.tobytes(), dtype=np.uint8).reshape(len(values), width + 1)
+
+    if characters[:, width].any():
+        return None
+
+    # every digit position holds a digit and every separator is the expected one
+    for position, symbol in enumerate(layout):
+        column = characters[:, position]
+
+        if symbol.isalpha():
+            if not ((column >= 48) & (column <= 57)).all():
+                return None
+
+        elif not (column == ord(symbol)).all():
+            return None
+
+    return characters
+
+
+#   **************************************************************************************
+def _get_number(digits, start, end):
+    number = np.zeros(len(digits), dtype=np.int64)
+
+    for position in range(start, end):
+        number = number * 10 + (digits[:, position] - 48)
+
+    return number
+
+
+#   **************************************************************************************
+#   returns the epoch day of each date, None when any value is not a valid YYYY-MM-DD
+#   **************************************************************************************
+def parse_dates(dates):
+    digits = _get_digits(dates, DATE_FORMAT)
+
+    if digits is None:
+        return None
+
+    year = _get_number(digits, 0, 4)
+    month = _get_number(digits, 5, 7)
+    day = _get_number(digits, 8, 10)
+
+    if not (((month >= 1) & (month <= 12)) & (day >= 1)).all():
+        return None
+
+    days = days_from_civil(year, month, day)
+
+    # the day must fall before the first of the next month
+    next_month_year = year + (month == 12)
+    next_month = np.where(month == 12, 1, month + 1)
+    if not (days < days_from_civil(next_month_year, next_month, 1)).all():
+        return None
+
+    return days
+
+
+#   **************************************************************************************
+#   returns nanoseconds since midnight, None when any value is not a valid HH:MM:SS.mmm
+#   **************************************************************************************
+def parse_times(times):
+    digits = _get_digits(times, TIME_FORMAT)
+
+    if digits is None:
+        return None
+
+    hours = _get_number(digits, 0, 2)
+    minutes = _get_number(digits, 3, 5)
+    seconds = _get_number(digits, 6, 8)
+    milliseconds = _get_number(digits, 9, 12)
+
+    if not ((hours < 24) & (minutes < 60) & (seconds < 60)).all():
+        return None
+
+    return hours * NS_PER_HOUR + minutes * NS_PER_MINUTE + seconds * NS_PER_SECOND + milliseconds * NS_PER_MS
+
+
+#   **************************************************************************************
+#   returns the int64 epoch nanoseconds of each reading and of the start of its day
+#   anything off the fixed format goes through pandas' own parser instead
+#   **************************************************************************************
+def parse_timestamps(dates, times):
+    days = parse_dates(dates)
+    time_of_day = parse_times(times) if days is not None else None
+
+    if time_of_day is None:
+        date_time = pd.to_datetime(pd.Series(dates) + ' ' + pd.Series(times)).to_numpy().astype('datetime64[ns]')
+        date_time = date_time.view(np.int64)
+
+        return date_time, floor_to_day(date_time)
+
+    day = days * NS_PER_DAY
+
+    return day + time_of_day, day
+
+
+#   **************************************************************************************
+#   day buckets straight from the epoch nanoseconds
+#   **************************************************************************************
+def floor_to_day(epoch_ns):
+    return epoch_ns - epoch_ns % NS_PER_DAY
+
+
+#   **************************************************************************************
+def to_datetime64(epoch_ns):
+    return np.asarray(epoch_ns, dtype=np.int64).view('datetime64[ns]')
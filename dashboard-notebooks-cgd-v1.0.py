@@ -14,8 +14,10 @@ import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 
 
-from os import listdir, path
-from os.path import isfile, join
+from cgd.artifacts import load_artifacts
+from cgd.ingest import read_dataset
+from cgd.reader_index import ReaderIndex
+from cgd.retries import RetryHistograms
 
 month_mapping = {1: 'Janeiro', 2: 'Fevereiro', 3: 'Março', 4: 'Abril',
                  5: 'Maio', 6: 'Junho', 7: 'Julho', 8: 'Agosto',
@@ -34,61 +36,41 @@ app = Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP],
 server = app.server
 
 FILES_TO_PROCESS_FOLDER = 'FILES_TO_PROCESS'
+DATASET_CACHE_FOLDER = 'DATASET_CACHE'
 
-
-def split_file_name(file_name):
-    first_file_token = file_name[:file_name.find('-')]
-    rest_of_str = file_name[file_name.find('-') + 1:]
-
-    second_file_token = rest_of_str[:rest_of_str.find('-')]
-    third_file_token = rest_of_str[rest_of_str.find('-') + 1:]
-    third_file_token = third_file_token[:-4]
-
-    return first_file_token, second_file_token, third_file_token
+# folder of the artifacts built by python -m cgd.artifacts; when set, the dataset and the retry
+# histograms are loaded from it instead of computed at boot
+ARTIFACTS_FOLDER = None
 
 
 # processes all files, returns a dataframe
 def get_dataset():
-    onlyfiles = [f for f in listdir(FILES_TO_PROCESS_FOLDER) if isfile(join(FILES_TO_PROCESS_FOLDER, f))]
-
-    dataset = None
+    dataset, timings = read_dataset(FILES_TO_PROCESS_FOLDER, cache_folder=DATASET_CACHE_FOLDER)
 
-    for file_name in onlyfiles:
-        first_file_token, second_file_token, third_file_token = split_file_name(file_name)
+    # this dashboard keeps the calendar date and the hour of day
+    dataset['date'] = dataset['date'].dt.date
+    dataset['hour'] = dataset['date_time'].dt.hour
 
-        print(f'File name: {file_name}')
-        # print(f'First file token: {first_file_token}')
-        # print(f'Second file token: {second_file_token}')
-        # print(f'Third file token: {third_file_token}')
-
-        # read file
-        df = pd.read_csv(join(FILES_TO_PROCESS_FOLDER, file_name), sep='|', header=None)
-        df.columns = ['date', 'time', 'nr_try', 'reply_data', 'reply_code']
+    return dataset
 
-        # set new column for notebook reader id
-        notebook_reader = third_file_token
-        df['notebook_reader'] = notebook_reader
 
-        # make nr_try start at 1
-        df['nr_try'] = df['nr_try'] + 1
+# the artifacts' dataset in this dashboard's form
+def get_artifacts_dataset(artifacts):
+    dataset = artifacts.dataset.reset_index()
 
-        # datetime features
-        df['date_time'] = pd.to_datetime(df['date'] + ' ' + df['time'])
-        df['date'] = pd.to_datetime(df['date']).dt.date
-        df['hour'] = pd.to_datetime(df['date_time']).dt.hour
+    dataset['notebook_reader'] = dataset['notebook_reader'].astype(str)
+    dataset['date'] = dataset['date_time'].dt.date
+    dataset['hour'] = dataset['date_time'].dt.hour
 
-        # reorder columns
-        df = df[['date_time', 'date', 'time', 'hour', 'notebook_reader', 'nr_try', 'reply_data', 'reply_code']]
+    return dataset
 
-        if dataset is None:
-            # print('dataset created')
-            dataset = df
 
-        else:
-            # print('appending to dataset')
-            dataset = pd.concat([dataset, df])
+# the picked days as the first and last instant of the period, None for an end not picked
+def get_selected_period(start_date, end_date):
+    start = pd.Timestamp(start_date) if start_date is not None else None
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns') if end_date is not None else None
 
-    return dataset
+    return start, end
 
 
 #   -----------------------------------------------------------------------------------------
@@ -96,8 +78,7 @@ def get_dataset():
 def plot_track_readings():
     x_labels_mapping = {'1': '1 Tentativa', '2': '2 Tentativas', '3': '3 Tentativas', '4': '4 Tentativas'}
 
-    df_track_readings = pd.DataFrame(df['nr_try'].value_counts().sort_index())
-    df_track_readings = df_track_readings.reset_index()
+    df_track_readings = retry_histograms.get_retry_histogram().reset_index()
     df_track_readings.columns = ['nr_try', 'count']
     df_track_readings['nr_try'] = df_track_readings['nr_try'].astype(str)
 
@@ -117,23 +98,24 @@ def plot_track_readings():
 
     return fig
 
-def plot_notebook_readings(notebook_reader):
+def plot_notebook_readings(notebook_reader, start=None, end=None):
 
-    df_notebook_reader = df[df['notebook_reader'] == notebook_reader]
+    # lookups in the per-reader index instead of filtering every row
+    reader_period = reader_index.get_period(notebook_reader, start, end)
 
-    min_date = df_notebook_reader['date'].min()
-    max_date = df_notebook_reader['date'].max()
+    min_date = reader_period[0].date() if reader_period is not None else None
+    max_date = reader_period[1].date() if reader_period is not None else None
 
     print(f'Notebook Reader: {notebook_reader}')
     print(f'Min Date: {min_date}')
     print(f'Max Date: {max_date}')
 
-    df_track_readings = pd.DataFrame(df_notebook_reader['nr_try'].value_counts().sort_index())
-    df_track_readings = df_track_readings.reset_index()
+    df_track_readings = retry_histograms.get_retry_histogram(notebook_reader, start, end).reset_index()
     df_track_readings.columns = ['nr_try', 'count']
     df_track_readings['nr_try'] = df_track_readings['nr_try'].astype(str)
 
-    y_limit = int(df_track_readings['count'].max() * 1.10)
+    # a period without readings of the reader plots no bars
+    y_limit = int(df_track_readings['count'].max() * 1.10) if len(df_track_readings) else 1
     fig = px.bar(data_frame=df_track_readings, x='nr_try', y='count', range_y=[0, y_limit], text_auto=True)
     fig.layout.title = "<b><span style='font-size:1.0em;color:#2767F1';'text-align':'center'>Leituras Efetuadas</span></b>"
     fig.layout.xaxis.title = "<b><span style='font-size:0.9em;color:#2767F1'>Tentativas</span></b>"
@@ -176,19 +158,36 @@ def plot_track_readings_per_day():
 
 
 
-def info_track_readings():
-    df_track_readings = pd.DataFrame(df['nr_try'].value_counts().sort_index())
-    df_track_readings = df_track_readings.reset_index()
-    df_track_readings.columns = ['nr_try', 'count']
-    df_track_readings['nr_try'] = df_track_readings['nr_try'].astype(str)
+# share of the reader's readings that needed more than the first try
+def info_retry_rate(notebook_reader, start=None, end=None):
+    _, retry_rate = retry_histograms.get_retry_rates(notebook_reader, start, end)
+
+    return f'Leituras com mais de 1 tentativa: {retry_rate:.1%}'
 
-    try_2 = df_track_readings.iloc[2]['count']
+
+def info_track_readings():
+    # the third nr_try present in the histogram, as before
+    try_2 = retry_histograms.get_retry_histogram().iloc[2]
 
     return try_2
 
 
 # read full dataset
-df = get_dataset()
+if ARTIFACTS_FOLDER is not None:
+    artifacts = load_artifacts(ARTIFACTS_FOLDER)
+    df = get_artifacts_dataset(artifacts)
+else:
+    df = get_dataset()
+
+# rows of each reader, for the reader drilldown's period
+reader_index = ReaderIndex(df)
+
+# readings per day, reader, reply code and nr_try; rows appended later go through retry_histograms.add
+if ARTIFACTS_FOLDER is not None:
+    retry_histograms = artifacts.retry_histograms
+else:
+    retry_histograms = RetryHistograms()
+    retry_histograms.add(df)
 
 
 
@@ -216,13 +215,21 @@ app.layout = dbc.Container([
             dcc.Dropdown(id='selected_notebook_reader',
                          options=[{'label': notebook_reader, 'value': notebook_reader} for notebook_reader in df['notebook_reader'].sort_values().unique()]),
 
+            dcc.DatePickerRange(id='selected_period',
+                                min_date_allowed=df['date_time'].min().date(),
+                                max_date_allowed=df['date_time'].max().date(),
+                                display_format='YYYY-MM-DD',
+                                clearable=True),
+
             dcc.Graph(id='track_readings_plot',
                       config={'displayModeBar': False},
                       style={'width': '20rem', 'height': '30rem'},
                       figure={'layout': go.Layout(xaxis={'showgrid': False, 'visible': False},
                                                   yaxis={'showgrid': False, 'visible': False})
                               }
-                      )
+                      ),
+
+            html.Label(id='retry_rate', style={'color': '#2767F1', 'font-weight': 'bold'})
         ], width=3),
 
         dbc.Col([], width=1),
@@ -237,17 +244,33 @@ app.layout = dbc.Container([
 
 @app.callback(
     Output('track_readings_plot', 'figure'),
-    Input('selected_notebook_reader', 'value')
+    Input('selected_notebook_reader', 'value'),
+    Input('selected_period', 'start_date'),
+    Input('selected_period', 'end_date')
 )
-def get_notebook_reader_stats(notebook_reader):
+def get_notebook_reader_stats(notebook_reader, start_date=None, end_date=None):
 
     if notebook_reader is None:
         raise PreventUpdate
 
-    fig = plot_notebook_readings(notebook_reader)
+    fig = plot_notebook_readings(notebook_reader, *get_selected_period(start_date, end_date))
 
     return fig
 
 
+@app.callback(
+    Output('retry_rate', 'children'),
+    Input('selected_notebook_reader', 'value'),
+    Input('selected_period', 'start_date'),
+    Input('selected_period', 'end_date')
+)
+def get_notebook_reader_retry_rate(notebook_reader, start_date=None, end_date=None):
+
+    if notebook_reader is None:
+        raise PreventUpdate
+
+    return info_retry_rate(notebook_reader, *get_selected_period(start_date, end_date))
+
+
 if __name__ == '__main__':
     app.run_server(debug=True, port=8057)
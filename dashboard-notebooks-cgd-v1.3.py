@@ -22,8 +22,11 @@ import plotly.express as px
 import plotly.graph_objects as go
 import matplotlib.pyplot as plt
 
-from os import listdir, path
-from os.path import isfile, join
+from cgd.aggregate import aggregate_dataset, get_adaptive_readings
+from cgd.artifacts import load_artifacts
+from cgd.ingest import read_dataset
+from cgd.ranges import slice_period, to_wall_clock_ns
+from cgd.streaming import Backfill
 from dateutil.relativedelta import relativedelta
 
 
@@ -46,62 +49,23 @@ app = Dash(__name__,
 server = app.server
 
 FILES_TO_PROCESS_FOLDER = 'FILES_TO_PROCESS'
+DATASET_CACHE_FOLDER = 'DATASET_CACHE'
+
+# folder of the artifacts built by python -m cgd.artifacts; when set, the dataset, whole-dataset
+# figure, KPIs and slider marks are loaded from it instead of computed at boot
+ARTIFACTS_FOLDER = None
+
+# folder of a backfill saved by python -m cgd.streaming FILES_TO_PROCESS recent_days BACKFILL; when set,
+# the figure and KPIs come from its daily rollup, a period then covers every day it touches
+BACKFILL_FOLDER = None
 
 #   ------------------------------------------------------------------------------------------------------------
 #   ---     types, constants & variables
 #   ------------------------------------------------------------------------------------------------------------
 
-#   **************************************************************************************
-#   split file name
-#   **************************************************************************************
-def split_file_name(file_name):
-    first_file_token = file_name[:file_name.find('-')]
-    rest_of_str = file_name[file_name.find('-') + 1:]
-
-    second_file_token = rest_of_str[:rest_of_str.find('-')]
-    third_file_token = rest_of_str[rest_of_str.find('-') + 1:]
-    third_file_token = third_file_token[:-4]
-
-    return first_file_token, second_file_token, third_file_token
-
-
 #   **************************************************************************************
 def get_dataset():
-    onlyfiles = [f for f in listdir(FILES_TO_PROCESS_FOLDER) if isfile(join(FILES_TO_PROCESS_FOLDER, f))]
-
-    dataset = None
-
-    for file_name in onlyfiles:
-        first_file_token, second_file_token, third_file_token = split_file_name(file_name)
-
-        print(f'Processing file: {file_name}')
-
-        # read file
-        df = pd.read_csv(join(FILES_TO_PROCESS_FOLDER, file_name), sep='|', header=None)
-        df.columns = ['date', 'time', 'nr_try', 'reply_data', 'reply_code']
-
-        # set new column for notebook reader id
-        notebook_reader = third_file_token
-        df['notebook_reader'] = notebook_reader
-
-        # make nr_try start at 1
-        df['nr_try'] = df['nr_try'] + 1
-
-        # datetime features
-        df['date_time'] = pd.to_datetime(df['date'] + ' ' + df['time'])
-        df['date'] = df['date'].astype('datetime64[ns]')
-        df['hour'] = df['date_time'].astype('datetime64[ns]')
-
-        # reorder columns
-        df = df[['date_time', 'date', 'time', 'hour', 'notebook_reader', 'nr_try', 'reply_data', 'reply_code']]
-
-        if dataset is None:
-            # print('dataset created')
-            dataset = df
-
-        else:
-            # print('appending to dataset')
-            dataset = pd.concat([dataset, df])
+    dataset, timings = read_dataset(FILES_TO_PROCESS_FOLDER, cache_folder=DATASET_CACHE_FOLDER)
 
     dataset = dataset.set_index('date_time')
 
@@ -161,37 +125,13 @@ def get_msg_initial_period():
 
 
 #   **************************************************************************************
-def get_notebook_readers_per_day(df_in):
-    notebook_readers_per_day = pd.DataFrame(df_in.groupby(by='date').agg('notebook_reader').unique().sort_index())
-    notebook_readers_per_day.index = notebook_readers_per_day.index.astype('datetime64[ns]')
-
-    notebook_readers_per_day['nr_notebook_readers'] = [len(notebook_reader) for notebook_reader in notebook_readers_per_day['notebook_reader']]
-
-    return notebook_readers_per_day
-
-
-#   **************************************************************************************
-def get_readings_per_day(df_in):
-    readings_per_day = df_in.groupby(by='date').agg(nr_readings=('notebook_reader', 'count'))
-
-    return readings_per_day
-
-
-def get_unsuccessful_readings_per_day(df_in):
-    unsuccessful_readings_per_day = df_in[df_in['reply_code'] == 1]
-    unsuccessful_readings_per_day = unsuccessful_readings_per_day.groupby(by='date').agg(nr_unsuccessful_readings=('notebook_reader', 'count'))
-
-    return unsuccessful_readings_per_day
-
-
-#   **************************************************************************************
-def get_plot_readings_per_period(df_in):
-    notebook_readers_per_day = get_notebook_readers_per_day(df_in)
-    readings_per_day = get_readings_per_day(df_in)
-    unsuccessful_readings_per_day = get_unsuccessful_readings_per_day(df_in)
+def get_plot_readings_per_period(readings_per_day):
+    # week or month bars over long ranges, summed from the per-day series
+    readings_per_day = get_adaptive_readings(readings_per_day)
 
-    readings_per_day = readings_per_day.join(notebook_readers_per_day['nr_notebook_readers'])
-    readings_per_day = readings_per_day.join(unsuccessful_readings_per_day['nr_unsuccessful_readings'])
+    # days without errors get no error bar
+    readings_per_day = readings_per_day.assign(
+        nr_unsuccessful_readings=readings_per_day['nr_unsuccessful_readings'].where(readings_per_day['nr_unsuccessful_readings'] > 0))
 
     readings_per_day['average_readings_per_day'] = round(readings_per_day['nr_readings'] / readings_per_day['nr_notebook_readers'], 2)
     readings_per_day['average_unsuccessful_readings_per_day'] = round(readings_per_day['nr_unsuccessful_readings'] / readings_per_day['nr_notebook_readers'], 2)
@@ -244,15 +184,10 @@ def get_plot_readings_per_period(df_in):
 
 
 #   **************************************************************************************
-def count_total_notebook_readers(df_in):
-    return df_in['notebook_reader'].nunique()
-
-
-#   **************************************************************************************
-def get_kpi_nr_notebook_readers(df_in):
+def get_kpi_nr_notebook_readers(nr_notebook_readers):
 
     kpi = html.Div([
-        html.Div(html.P(count_total_notebook_readers(df_in), style={'font-size':'5.0em','color':'#5CAEDF', 'text-align':'center',
+        html.Div(html.P(nr_notebook_readers, style={'font-size':'5.0em','color':'#5CAEDF', 'text-align':'center',
                                                       'font-weight':'750', 'padding':0, 'margin-top':-10})),
         html.Div('LEITORES', style={'font-size':'1.5em','color':'#2067DC', 'text-align':'center', 'font-weight':'750',
                                    'padding':0, 'margin-top':-40, 'width':'100%'})
@@ -261,15 +196,10 @@ def get_kpi_nr_notebook_readers(df_in):
 
 
 #   **************************************************************************************
-def count_total_readings(df_in):
-    return len(df_in)
-
-
-#   **************************************************************************************
-def get_kpi_total_readings(df_in):
+def get_kpi_total_readings(total_readings):
 
     kpi = html.Div([
-        html.Div(html.P(count_total_readings(df_in), style={'font-size':'5.0em','color':'#5CAEDF', 'align':'center',
+        html.Div(html.P(total_readings, style={'font-size':'5.0em','color':'#5CAEDF', 'align':'center',
                                                       'font-weight':'750', 'padding':0, 'margin-top':-10})),
         html.Div('LEITURAS', style={'font-size':'1.5em','color':'#2067DC', 'align':'center', 'font-weight':'750',
                                    'padding':0, 'margin-top':-40, 'width':'100%'})
@@ -278,15 +208,7 @@ def get_kpi_total_readings(df_in):
 
 
 #   **************************************************************************************
-def count_unsuccessful_readings(df_in):
-    return len(df_in[df_in['reply_code'] == 1])
-
-
-#   **************************************************************************************
-def get_kpi_percent_reading_errors(df_in):
-    total_readings = count_total_readings(df_in)
-    total_unsuccessful_readings = count_unsuccessful_readings(df_in)
-
+def get_kpi_percent_reading_errors(total_readings, total_unsuccessful_readings):
     if total_readings > 0:
         kpi_percent_reading_errors = str(round(((total_unsuccessful_readings / total_readings) * 100), 1))
 
@@ -306,14 +228,9 @@ def get_kpi_percent_reading_errors(df_in):
 
 
 #   **************************************************************************************
-def count_unique_notebooks(df_in):
-    return df_in[df_in['reply_code'] == 0]['reply_data'].nunique()
-
-
-#   **************************************************************************************
-def get_kpi_unique_notebooks(df_in):
+def get_kpi_unique_notebooks(nr_notebooks):
     kpi = html.Div([
-        html.Div(html.P(count_unique_notebooks(df_in), style={'font-size':'5.0em','color':'#5CAEDF', 'align':'center',
+        html.Div(html.P(nr_notebooks, style={'font-size':'5.0em','color':'#5CAEDF', 'align':'center',
                                                       'font-weight':'750', 'padding':0, 'margin-top':-10})),
         html.Div('CADERNETAS', style={'font-size':'1.5em','color':'#2067DC', 'align':'center', 'font-weight':'750',
                                    'padding':0, 'margin-top':-40, 'width':'100%'})
@@ -333,11 +250,40 @@ def get_kpi_unique_notebooks(df_in):
 #   ++++++++++++++++++++++++++++++++++++++++++++++++++++
 #   get data
 #   ++++++++++++++++++++++++++++++++++++++++++++++++++++
-df = get_dataset()
-# print(df.info())
+backfill = None
+
+if ARTIFACTS_FOLDER is not None:
+    artifacts = load_artifacts(ARTIFACTS_FOLDER)
+    df = artifacts.dataset
+
+    dataset_min_date = df.index.min().date()
+    dataset_max_date = df.index.max().date()
+
+    # figure series and KPIs of the whole dataset from the daily cube the batch built
+    readings_per_day, totals = artifacts.daily_cube.summarise(df.index[0], df.index[-1])
+    monthly_marks = artifacts.monthly_marks
+elif BACKFILL_FOLDER is not None:
+    backfill = Backfill(BACKFILL_FOLDER)
+    days = backfill.get_days()
+
+    # no rows: the slider spans the whole days of the history
+    df = pd.DataFrame(index=pd.DatetimeIndex([days[0], days[-1] + pd.Timedelta(days=1, seconds=-1)]))
+
+    dataset_min_date = days[0].date()
+    dataset_max_date = days[-1].date()
 
-dataset_min_date = df['date'].min()
-dataset_max_date = df['date'].max()
+    readings_per_day, totals = backfill.summarise(days[0], days[-1])
+    monthly_marks = get_monthly_marks(pd.DataFrame(index=days))
+else:
+    df = get_dataset()
+    # print(df.info())
+
+    dataset_min_date = df['date'].min()
+    dataset_max_date = df['date'].max()
+
+    # figure series and KPIs of the whole dataset in one pass
+    readings_per_day, totals = aggregate_dataset(df)
+    monthly_marks = get_monthly_marks(df)
 
 start_date = pd.Timestamp(dataset_min_date)
 end_date = pd.Timestamp(dataset_max_date)
@@ -362,21 +308,22 @@ app.layout = html.Div([
 
         # KPIs
         html.Div([
-            html.Div(id='kpi_nr_notebook_readers', children=get_kpi_nr_notebook_readers(df),
+            html.Div(id='kpi_nr_notebook_readers', children=get_kpi_nr_notebook_readers(totals['nr_notebook_readers']),
                      style={'float':'left', 'width':'20%', 'margin-left':100, 'text-align':'right'}),
 
-            html.Div(id='kpi_total_readings', children=get_kpi_total_readings(df),
+            html.Div(id='kpi_total_readings', children=get_kpi_total_readings(totals['nr_readings']),
                      style={'float':'left', 'width':'20%', 'margin-left':50}),
 
-            html.Div(id='kpi_percent_reading_errors', children=get_kpi_percent_reading_errors(df),
+            html.Div(id='kpi_percent_reading_errors', children=get_kpi_percent_reading_errors(totals['nr_readings'],
+                                                                                 totals['nr_unsuccessful_readings']),
                      style={'float': 'left', 'width': '20%', 'margin-left': 50, 'text-align':'right'}),
 
-            html.Div(id='kpi_unique_notebooks', children=get_kpi_unique_notebooks(df),
+            html.Div(id='kpi_unique_notebooks', children=get_kpi_unique_notebooks(totals['nr_notebooks']),
                      style={'float': 'left', 'width': '20%', 'margin-left': 50})
         ], style={'margin-top':10}),
 
         html.Div([
-            dcc.Graph(id='plot_readings_per_period', figure=get_plot_readings_per_period(df))
+            dcc.Graph(id='plot_readings_per_period', figure=get_plot_readings_per_period(readings_per_day))
         ], style={'margin-top':165, 'margin-left':10, 'padding':-10, 'float':'top'}),
 
         html.Div([
@@ -389,7 +336,7 @@ app.layout = html.Div([
                 id="date_slider",
                 min=pd.Timestamp(df.index.min()).timestamp(),
                 max=pd.Timestamp(df.index.max()).timestamp(),
-                marks = get_monthly_marks(df),
+                marks = monthly_marks,
                 # tooltip={"placement": "bottom", "always_visible": True}
             )
 
@@ -422,18 +369,26 @@ def show_info(date_slider_value):
 
     # msg_selected_period = f'de {interval_start_date} a {interval_end_date}'
 
-    df_selected_period = df[(df.index >= interval_start_date) & (df.index <= interval_end_date)]
-    # print(f'Readings: {len(df_selected_period)}')
+    if backfill is not None:
+        # whole days from the backfill's rollup
+        readings_per_day, totals = backfill.summarise(to_wall_clock_ns(date_slider_value[0]),
+                                                      to_wall_clock_ns(date_slider_value[1]))
+    else:
+        df_selected_period = slice_period(df, to_wall_clock_ns(date_slider_value[0]), to_wall_clock_ns(date_slider_value[1]))
+        # print(f'Readings: {len(df_selected_period)}')
+
+        # figure series and all four KPIs from a single pass over the period
+        readings_per_day, totals = aggregate_dataset(df_selected_period)
 
-    if len(df_selected_period) > 0:
-        fig = get_plot_readings_per_period(df_selected_period)
+    if totals['nr_readings'] > 0:
+        fig = get_plot_readings_per_period(readings_per_day)
     else:
         fig = dash.no_update
 
-    kpi_nr_notebooks = get_kpi_nr_notebook_readers(df_selected_period)
-    kpi_total_readings = get_kpi_total_readings(df_selected_period)
-    kpi_percent_reading_errors = get_kpi_percent_reading_errors(df_selected_period)
-    kpi_unique_notebooks = get_kpi_unique_notebooks(df_selected_period)
+    kpi_nr_notebooks = get_kpi_nr_notebook_readers(totals['nr_notebook_readers'])
+    kpi_total_readings = get_kpi_total_readings(totals['nr_readings'])
+    kpi_percent_reading_errors = get_kpi_percent_reading_errors(totals['nr_readings'], totals['nr_unsuccessful_readings'])
+    kpi_unique_notebooks = get_kpi_unique_notebooks(totals['nr_notebooks'])
 
     # return msg_selected_period, fig, kpi_nr_notebooks, kpi_total_readings, kpi_percent_reading_errors
     return fig, kpi_nr_notebooks, kpi_total_readings, kpi_percent_reading_errors, kpi_unique_notebooks
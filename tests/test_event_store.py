@@ -0,0 +1,189 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     cgd.event_store: written and mapped back, appends in order and late, codes widened past the
+#   ---     narrow dtype, and a writer recovering from an append that never committed
+#   ------------------------------------------------------------------------------------------------------------
+import os
+
+import numpy as np
+import pandas as pd
+
+from os.path import join
+
+from cgd.event_store import (INDEX_COLUMN, EventStoreReader, EventStoreWriter, _get_column_path, load_event_store,
+                             read_meta)
+
+
+#   **************************************************************************************
+#   nr_rows readings from start, one a minute, over nr_readers readers
+#   **************************************************************************************
+def get_dataset(start, nr_rows, nr_readers=3, first_reader=0):
+    index = pd.date_range(start, periods=nr_rows, freq='min', name=INDEX_COLUMN)
+
+    return pd.DataFrame({'notebook_reader': [f'reader-{first_reader + row % nr_readers}' for row in range(nr_rows)],
+                         'reply_code': np.arange(nr_rows, dtype=np.int64) % 4},
+                        index=index)
+
+
+#   **************************************************************************************
+#   the loaded store holds the rows of expected (categoricals as their labels)
+#   **************************************************************************************
+def assert_same(folder, expected):
+    dataset, meta = load_event_store(folder)
+
+    assert meta['nr_rows'] == len(expected)
+    assert (dataset.index == expected.index).all()
+    assert dataset['notebook_reader'].astype(str).tolist() == expected['notebook_reader'].tolist()
+    assert dataset['reply_code'].tolist() == expected['reply_code'].tolist()
+
+    return dataset, meta
+
+
+#   **************************************************************************************
+def test_round_trip(tmp_path):
+    folder = str(tmp_path)
+    expected = get_dataset('2024-02-28 23:00', 200)
+
+    EventStoreWriter(folder).write(expected)
+
+    dataset, meta = assert_same(folder, expected)
+
+    assert meta['sorted']
+    assert meta['last'] == expected.index[-1].value
+    assert isinstance(dataset['notebook_reader'].dtype, pd.CategoricalDtype)
+    assert isinstance(dataset['reply_code'].to_numpy().base, np.memmap)
+
+
+#   **************************************************************************************
+#   shuffled rows are written sorted
+#   **************************************************************************************
+def test_write_sorts(tmp_path):
+    folder = str(tmp_path)
+    expected = get_dataset('2024-01-01', 50)
+
+    EventStoreWriter(folder).write(expected.sample(frac=1, random_state=0))
+
+    assert_same(folder, expected)
+
+
+#   **************************************************************************************
+def test_append(tmp_path):
+    folder = str(tmp_path)
+    first = get_dataset('2024-01-01', 100)
+    second = get_dataset('2024-01-02', 30, first_reader=2)
+
+    writer = EventStoreWriter(folder)
+    writer.write(first)
+
+    reader = EventStoreReader(folder)
+    new_rows = []
+    reader.listeners.append(new_rows.append)
+
+    writer.append(second)
+
+    _, meta = assert_same(folder, pd.concat([first, second]))
+    assert meta['generation'] == 0
+
+    # the reader hands its listeners only the new rows
+    assert reader.poll() == len(second)
+    assert (new_rows[0].index == second.index).all()
+    assert reader.poll() == 0
+
+
+#   **************************************************************************************
+#   rows older than the last stored one are merged into a new generation, after stored
+#   rows of the same time; the files of the old one go with the next commit
+#   **************************************************************************************
+def test_append_late_rows(tmp_path):
+    folder = str(tmp_path)
+    stored = get_dataset('2024-01-01', 100)
+    late = get_dataset('2024-01-01 00:30', 10, first_reader=5)
+
+    writer = EventStoreWriter(folder)
+    writer.write(stored)
+    old_files = {os.path.basename(_get_column_path(folder, column)) for column in writer.meta['columns']}
+
+    reader = EventStoreReader(folder)
+    new_rows = []
+    reader.listeners.append(new_rows.append)
+
+    writer.append(late)
+
+    _, meta = assert_same(folder, pd.concat([stored, late]).sort_index(kind='stable'))
+    assert meta['generation'] == 1
+    assert meta['sorted']
+
+    # a new generation is not a set of new rows
+    assert reader.poll() == len(late)
+    assert new_rows == [None]
+
+    assert old_files <= set(os.listdir(folder))
+    writer.append(get_dataset('2024-01-03', 1))
+    assert not old_files & set(os.listdir(folder))
+
+
+#   **************************************************************************************
+#   more readers than int8 codes hold: the column is rewritten as int16 under a new file
+#   name, the old codes still decode to the same labels
+#   **************************************************************************************
+def test_widen(tmp_path):
+    folder = str(tmp_path)
+    first = get_dataset('2024-01-01', 100, nr_readers=100)
+    second = get_dataset('2024-01-02', 100, nr_readers=100, first_reader=100)
+
+    writer = EventStoreWriter(folder)
+    writer.write(first)
+
+    column = next(column for column in writer.meta['columns'] if column['name'] == 'notebook_reader')
+    assert column['dtype'] == 'int8'
+    old_file = column['file']
+
+    # mapped before the widen, under the old dtype
+    before, _ = load_event_store(folder)
+
+    writer.append(second)
+
+    _, meta = assert_same(folder, pd.concat([first, second]))
+
+    column = next(column for column in meta['columns'] if column['name'] == 'notebook_reader')
+    assert column['dtype'] == 'int16'
+    assert column['file'] != old_file
+
+    # the old file stays for workers still mapping it, until the next commit
+    assert before['notebook_reader'].astype(str).tolist() == first['notebook_reader'].tolist()
+    assert os.path.isfile(join(folder, old_file))
+
+    writer.append(get_dataset('2024-01-03', 1))
+    assert not os.path.isfile(join(folder, old_file))
+
+
+#   **************************************************************************************
+#   an append that died before its commit: bytes past the committed rows and a file
+#   meta.json does not name; a new writer cuts both away and carries on
+#   **************************************************************************************
+def test_truncate_recovery(tmp_path):
+    folder = str(tmp_path)
+    first = get_dataset('2024-01-01', 100)
+    second = get_dataset('2024-01-02', 20)
+
+    EventStoreWriter(folder).write(first)
+
+    meta = read_meta(folder)
+    for column in meta['columns']:
+        with open(_get_column_path(folder, column), 'ab') as f:
+            f.write(b'\x01' * 7 * np.dtype(column['dtype']).itemsize)
+
+    stray_file = join(folder, 'notebook_reader.9.i16.bin')
+    with open(stray_file, 'wb') as f:
+        f.write(b'\x00' * 16)
+
+    writer = EventStoreWriter(folder)
+
+    for column in meta['columns']:
+        assert os.path.getsize(_get_column_path(folder, column)) == 100 * np.dtype(column['dtype']).itemsize
+    assert not os.path.isfile(stray_file)
+
+    assert_same(folder, first)
+
+    writer.append(second)
+
+    assert_same(folder, pd.concat([first, second]))
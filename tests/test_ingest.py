@@ -0,0 +1,64 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     cgd.ingest: a reader file read while its last line is being written, at boot and from the cache,
+#   ---     then finished and picked up by the watcher
+#   ------------------------------------------------------------------------------------------------------------
+import os
+
+import pytest
+
+from os.path import join
+
+from cgd.ingest import index_dataset, read_dataset
+from cgd.tail import DatasetWatcher
+
+
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     types, constants & variables
+#   ------------------------------------------------------------------------------------------------------------
+FILE_NAME = '10098783-CGD0557MACTLL25-OLIVAIS-LX.txt'
+
+LINES = [b'2024-02-29|23:59:58.125|3|-31|1\r\n',
+         b'2024-02-29|23:59:59.500|0|:0557*********=0=00=0000000000009=9=|0\r\n',
+         b'2024-03-01|00:00:01.000|0|:0557*********=0=00=0000000000007=9=|0\r\n']
+
+
+#   **************************************************************************************
+#   the file with its last line cut at cut bytes
+#   **************************************************************************************
+@pytest.fixture(params=[0, 10, 25, 62])
+def files(tmp_path, request):
+    folder = join(tmp_path, 'files')
+    os.makedirs(folder)
+
+    with open(join(folder, FILE_NAME), 'wb') as f:
+        f.write(b''.join(LINES[:-1]) + LINES[-1][:request.param])
+
+    return folder, request.param
+
+
+#   **************************************************************************************
+@pytest.mark.parametrize('cached', [False, True])
+def test_partial_last_line(tmp_path, files, cached):
+    folder, cut = files
+    cache_folder = join(tmp_path, 'cache') if cached else None
+
+    if cached:
+        read_dataset(folder, cache_folder=cache_folder)
+
+    dataset, timings = read_dataset(folder, cache_folder=cache_folder)
+
+    assert timings[0]['cached'] == cached
+    assert timings[0]['bytes'] == len(b''.join(LINES[:-1]))
+    assert len(dataset) == 2
+    assert dataset['date_time'].notna().all()
+    assert dataset['reply_code'].tolist() == [1, 0]
+
+    # the rest of the line, written later, is the watcher's
+    watcher = DatasetWatcher(folder, index_dataset(dataset), timings, index_dataset)
+
+    with open(join(folder, FILE_NAME), 'ab') as f:
+        f.write(LINES[-1][cut:])
+
+    assert watcher.poll() == 1
+    assert watcher.dataset.index[-1].strftime('%Y-%m-%d %H:%M:%S') == '2024-03-01 00:00:01'
+    assert watcher.dataset['reply_code'].tolist() == [1, 0, 0]
@@ -0,0 +1,85 @@
+#   ------------------------------------------------------------------------------------------------------------
+#   ---     cgd.timestamps: the fixed-format parser against numpy / pandas, leap days, and the values
+#   ---     that must fall back to pandas' parser
+#   ------------------------------------------------------------------------------------------------------------
+import numpy as np
+import pandas as pd
+import pytest
+
+from cgd.timestamps import NS_PER_DAY, days_from_civil, parse_dates, parse_times, parse_timestamps
+
+
+#   **************************************************************************************
+#   every day from 1899 to 2101 (three centuries, 1900 and 2100 not leap, 2000 leap)
+#   **************************************************************************************
+def test_days_from_civil_matches_numpy():
+    days = np.arange(np.datetime64('1899-01-01'), np.datetime64('2101-01-01'))
+    dates = pd.DatetimeIndex(days)
+
+    expected = days.astype(np.int64)
+
+    assert (days_from_civil(dates.year.to_numpy(), dates.month.to_numpy(), dates.day.to_numpy()) == expected).all()
+
+
+#   **************************************************************************************
+@pytest.mark.parametrize('date', ['1970-01-01', '2000-02-29', '2024-02-29', '2024-03-01', '2023-12-31', '1900-03-01'])
+def test_parse_dates(date):
+    assert parse_dates([date])[0] == np.datetime64(date, 'D').astype(np.int64)
+
+
+#   **************************************************************************************
+#   not a date, or not YYYY-MM-DD: None, so the caller falls back to pandas
+#   **************************************************************************************
+@pytest.mark.parametrize('date', ['2023-02-29', '1900-02-29', '2100-02-29', '2024-02-30', '2024-04-31',
+                                  '2024-13-01', '2024-00-10', '2024-01-00', '2024/01/01', '2024-1-01',
+                                  '2024-01-011', '2024-01-0x', ''])
+def test_parse_dates_falls_back(date):
+    assert parse_dates(['2024-01-01', date]) is None
+
+
+#   **************************************************************************************
+def test_parse_times():
+    times = parse_times(['00:00:00.000', '12:34:56.789', '23:59:59.999'])
+
+    assert times.tolist() == [0, pd.Timedelta('12:34:56.789').value, NS_PER_DAY - 10**6]
+
+
+#   **************************************************************************************
+@pytest.mark.parametrize('time', ['24:00:00.000', '12:60:00.000', '12:00:60.000', '12:00:00', '12:00:00.0000',
+                                  '12-00-00.000', '1a:00:00.000'])
+def test_parse_times_falls_back(time):
+    assert parse_times(['12:00:00.000', time]) is None
+
+
+#   **************************************************************************************
+def test_parse_timestamps_matches_pandas():
+    dates = ['2024-02-28', '2024-02-29', '2024-03-01', '2023-12-31']
+    times = ['23:59:59.999', '00:00:00.000', '12:00:00.500', '06:07:08.009']
+
+    epoch_ns, day_ns = parse_timestamps(dates, times)
+
+    expected = pd.to_datetime(pd.Series(dates) + ' ' + pd.Series(times))
+
+    assert epoch_ns.tolist() == expected.astype(np.int64).tolist()
+    assert day_ns.tolist() == expected.dt.floor('D').astype(np.int64).tolist()
+
+
+#   **************************************************************************************
+#   off the fixed format (no milliseconds), the values go through pandas
+#   **************************************************************************************
+def test_parse_timestamps_falls_back_to_pandas():
+    dates = ['2024-02-29', '2024-03-01']
+    times = ['23:59:59', '00:00:01']
+
+    epoch_ns, day_ns = parse_timestamps(dates, times)
+
+    assert epoch_ns.tolist() == [pd.Timestamp('2024-02-29 23:59:59').value, pd.Timestamp('2024-03-01 00:00:01').value]
+    assert day_ns.tolist() == [pd.Timestamp('2024-02-29').value, pd.Timestamp('2024-03-01').value]
+
+
+#   **************************************************************************************
+#   an impossible date is no more valid to pandas
+#   **************************************************************************************
+def test_parse_timestamps_invalid_date_raises():
+    with pytest.raises(ValueError):
+        parse_timestamps(['2023-02-29'], ['00:00:00.000'])